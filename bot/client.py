@@ -0,0 +1,47 @@
+"""Общий клиент Telegram Bot API для всего процесса"""
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums import ParseMode
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_bot: Bot | None = None
+
+
+def create_bot() -> Bot:
+    """Создать единственный Bot процесса.
+
+    Все обработчики и сервисы работают через него: одна HTTP-сессия
+    aiohttp держит тёплые соединения к api.telegram.org, а адрес
+    кэшируется, так что запросы не платят за DNS и TLS каждый раз.
+    """
+    global _bot
+    session = AiohttpSession()
+    # AiohttpSession передаёт эти параметры в TCPConnector при создании сессии
+    session._connector_init.update(
+        limit=settings.TELEGRAM_HTTP_CONNECTIONS,
+        keepalive_timeout=settings.TELEGRAM_HTTP_KEEPALIVE,
+        ttl_dns_cache=settings.TELEGRAM_DNS_CACHE_TTL
+    )
+    _bot = Bot(
+        token=settings.BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    return _bot
+
+
+def get_bot() -> Bot:
+    """Общий Bot процесса (после create_bot)"""
+    if _bot is None:
+        raise RuntimeError("Bot ещё не создан: вызовите create_bot() при запуске")
+    return _bot
+
+
+async def close_bot():
+    """Закрыть HTTP-сессию общего Bot"""
+    if _bot is not None:
+        await _bot.session.close()
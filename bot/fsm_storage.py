@@ -0,0 +1,243 @@
+"""Хранилище FSM в Postgres с кэшем в памяти процесса"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select, delete, func, or_, and_, case, literal, literal_column, Text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert as pg_insert
+from database.connection import async_session_maker
+from database.models.fsm_state import FsmState
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять устаревшие и пустые записи (сек)
+_PURGE_INTERVAL = 60 * 60
+
+_EMPTY_DATA = literal_column("'{}'::jsonb")
+_EMPTY_LIST = literal_column("'[]'::jsonb")
+
+
+class PostgresStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states.
+
+    Запись идёт сразу в БД (write-through), а прочитанные и записанные
+    значения могут жить в небольшом LRU-кэше cache_ttl секунд. Кэш
+    допустим, только если все апдейты пользователя попадают в один
+    процесс: иначе другой процесс отдаст устаревшее состояние, поэтому
+    по умолчанию он выключен (0). update_data и append_to_list сливают
+    данные в самом запросе, так что параллельные апдейты не затирают
+    друг друга. Состояния старше state_ttl считаются брошенными и не
+    возвращаются.
+    """
+
+    def __init__(self, cache_ttl: float, cache_size: int, state_ttl: float):
+        self._cache_ttl = cache_ttl
+        self._cache_size = cache_size
+        self._state_ttl = timedelta(seconds=state_ttl)
+        # StorageKey -> (истекает в time.monotonic, state, data)
+        self._cache: OrderedDict[StorageKey, tuple[float, Optional[str], Dict[str, Any]]] = OrderedDict()
+        self._purge_task: asyncio.Task | None = None
+
+    def start(self):
+        """Запустить периодическую очистку устаревших записей"""
+        self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def close(self) -> None:
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+        self._cache.clear()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        stmt = pg_insert(FsmState).values(**self._key_values(key), state=state)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=self._key_columns(),
+            set_={
+                "state": stmt.excluded.state,
+                # Данные брошенного диалога не должны ожить вместе с новым состоянием
+                "data": case((self._is_expired(), _EMPTY_DATA), else_=FsmState.data),
+                "updated_at": func.now()
+            }
+        ).returning(FsmState.state, FsmState.data)
+        await self._write(key, stmt)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        stmt = pg_insert(FsmState).values(**self._key_values(key), data=data)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=self._key_columns(),
+            set_={
+                "data": stmt.excluded.data,
+                "state": case((self._is_expired(), None), else_=FsmState.state),
+                "updated_at": func.now()
+            }
+        ).returning(FsmState.state, FsmState.data)
+        await self._write(key, stmt)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._read(key)
+        return data.copy()
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Слияние ключей верхнего уровня в БД (jsonb ||), без чтения перед записью
+        stmt = pg_insert(FsmState).values(**self._key_values(key), data=data)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=self._key_columns(),
+            set_={
+                "data": case(
+                    (self._is_expired(), stmt.excluded.data),
+                    else_=FsmState.data.op("||", return_type=JSONB)(stmt.excluded.data)
+                ),
+                "state": case((self._is_expired(), None), else_=FsmState.state),
+                "updated_at": func.now()
+            }
+        ).returning(FsmState.state, FsmState.data)
+        row = await self._write(key, stmt)
+        return dict(row.data)
+
+    async def append_to_list(self, key: StorageKey, field: str, value: Any, limit: int) -> list | None:
+        """Добавить value в список data[field] одним запросом (None, если в нём уже limit)"""
+        current = func.coalesce(FsmState.data[field], _EMPTY_LIST)
+        stmt = pg_insert(FsmState).values(**self._key_values(key), data={field: [value]})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=self._key_columns(),
+            set_={
+                "data": case(
+                    (self._is_expired(), stmt.excluded.data),
+                    else_=func.jsonb_set(
+                        FsmState.data,
+                        literal([field], ARRAY(Text)),
+                        current.op("||", return_type=JSONB)(literal([value], JSONB))
+                    )
+                ),
+                "state": case((self._is_expired(), None), else_=FsmState.state),
+                "updated_at": func.now()
+            },
+            # Полный список не трогаем: конфликт без обновления не возвращает строку
+            where=or_(self._is_expired(), func.jsonb_array_length(current) < limit)
+        ).returning(FsmState.state, FsmState.data)
+        row = await self._write(key, stmt)
+        if row is None:
+            return None
+        return list(row.data[field])
+
+    async def purge_expired(self) -> int:
+        """Удалить брошенные и пустые состояния"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                delete(FsmState).where(
+                    or_(
+                        self._is_expired(),
+                        and_(FsmState.state.is_(None), FsmState.data == _EMPTY_DATA)
+                    )
+                )
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def _read(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            return cached[1], cached[2]
+
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(FsmState.state, FsmState.data).where(
+                    *self._key_filter(key),
+                    ~self._is_expired()
+                )
+            )
+            row = result.first()
+        state, data = (row.state, row.data) if row else (None, {})
+        self._remember(key, state, data)
+        return state, data
+
+    async def _write(self, key: StorageKey, stmt):
+        async with async_session_maker() as session:
+            result = await session.execute(stmt)
+            row = result.first()
+            await session.commit()
+        if row is not None:
+            self._remember(key, row.state, row.data)
+        return row
+
+    def _remember(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        if self._cache_ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self._cache_ttl, state, dict(data))
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    async def _purge_loop(self):
+        while True:
+            try:
+                removed = await self.purge_expired()
+                if removed:
+                    logger.info(f"Удалено устаревших состояний FSM: {removed}")
+            except Exception as e:
+                logger.error(f"Ошибка очистки состояний FSM: {e}")
+            await asyncio.sleep(_PURGE_INTERVAL)
+
+    def _is_expired(self):
+        return FsmState.updated_at < datetime.now(timezone.utc) - self._state_ttl
+
+    @staticmethod
+    def _key_values(key: StorageKey) -> dict:
+        return {
+            "bot_id": key.bot_id,
+            "chat_id": key.chat_id,
+            "user_id": key.user_id,
+            "thread_id": key.thread_id or 0,
+            "destiny": key.destiny,
+        }
+
+    @staticmethod
+    def _key_columns() -> list:
+        return [FsmState.bot_id, FsmState.chat_id, FsmState.user_id, FsmState.thread_id, FsmState.destiny]
+
+    @classmethod
+    def _key_filter(cls, key: StorageKey) -> list:
+        return [column == value for column, value in zip(cls._key_columns(), cls._key_values(key).values())]
+
+
+async def append_to_state_list(state: FSMContext, field: str, value: Any, limit: int) -> list | None:
+    """Добавить value в список data[field], если в нём меньше limit элементов.
+
+    Возвращает новый список или None, если список уже полон. В Postgres
+    это один запрос; у MemoryStorage чтение и запись не переключают
+    задачи, поэтому обычное чтение-изменение-запись там тоже атомарно.
+    """
+    if isinstance(state.storage, PostgresStorage):
+        return await state.storage.append_to_list(state.key, field, value, limit)
+    items = (await state.get_data()).get(field, [])
+    if len(items) >= limit:
+        return None
+    items = [*items, value]
+    await state.update_data({field: items})
+    return items
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE"""
+    if settings.FSM_STORAGE == "postgres":
+        storage = PostgresStorage(
+            cache_ttl=settings.FSM_CACHE_TTL,
+            cache_size=settings.FSM_CACHE_SIZE,
+            state_ttl=settings.FSM_STATE_TTL
+        )
+        storage.start()
+        logger.info("Состояния FSM хранятся в Postgres")
+        return storage
+    return MemoryStorage()
@@ -9,6 +9,8 @@ from database.models.moderation import ModerationQueue, ModerationStatus
 from database.models.product import Product
 from database.models.user import User
 from services.moderation import get_pending_moderations
+from services.user import invalidate_user
+from services.roles import get_role_registry, set_moderator_role
 from bot.keyboards.moderation import get_moderation_keyboard
 from config import settings
 from aiogram import Bot
@@ -27,22 +29,21 @@ class ModeratorManagementStates(StatesGroup):
 
 async def is_admin_or_moderator(user_id: int, session: AsyncSession) -> bool:
     """Проверить, является ли пользователь админом или модератором"""
-    from config import settings
+    registry = get_role_registry()
+    if registry is not None:
+        return registry.is_admin_or_moderator(user_id)
     
-    # Проверяем, является ли админом из .env
+    # Реестр ещё не запущен - проверяем по настройкам и БД
     if user_id in settings.admin_ids_list:
         return True
     
-    # Проверяем, является ли модератором из БД
     result = await session.execute(
-        select(User).where(
+        select(User.id).where(
             User.telegram_id == user_id,
             User.is_moderator == True
         )
     )
-    user = result.scalar_one_or_none()
-    
-    return user is not None
+    return result.first() is not None
 
 
 @router.message(F.text == "👮 Модерация")
@@ -114,26 +115,6 @@ async def cmd_admin(message: Message, session: AsyncSession):
     await message.answer(text, reply_markup=builder.as_markup())
 
 
-async def is_admin_or_moderator(user_id: int, session: AsyncSession) -> bool:
-    """Проверить, является ли пользователь админом или модератором"""
-    from config import settings
-    
-    # Проверяем, является ли админом из .env
-    if user_id in settings.admin_ids_list:
-        return True
-    
-    # Проверяем, является ли модератором из БД
-    result = await session.execute(
-        select(User).where(
-            User.telegram_id == user_id,
-            User.is_moderator == True
-        )
-    )
-    user = result.scalar_one_or_none()
-    
-    return user is not None
-
-
 @router.callback_query(F.data == "admin:add_moderator")
 async def add_moderator_start(callback: CallbackQuery, session: AsyncSession, state: FSMContext):
     """Начать процесс добавления модератора"""
@@ -187,6 +168,8 @@ async def process_add_moderator(message: Message, session: AsyncSession, state:
         # Делаем модератором
         user.is_moderator = True
         await session.commit()
+        invalidate_user(user.telegram_id)
+        set_moderator_role(user.telegram_id, True)
         
         await message.answer(
             f"✅ Пользователь {telegram_id} теперь модератор!\n"
@@ -196,16 +179,13 @@ async def process_add_moderator(message: Message, session: AsyncSession, state:
         
         # Уведомляем нового модератора
         try:
-            from aiogram import Bot
             from bot.keyboards.admin import get_moderator_keyboard
-            bot_instance = Bot(token=settings.BOT_TOKEN)
-            await bot_instance.send_message(
+            await message.bot.send_message(
                 telegram_id,
                 "🎉 Поздравляем! Вам выданы права модератора.\n"
                 "Теперь вы можете модерировать товары через кнопку '👮 Модерация'",
                 reply_markup=get_moderator_keyboard()
             )
-            await bot_instance.session.close()
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -296,6 +276,8 @@ async def process_remove_moderator(message: Message, session: AsyncSession, stat
         # Убираем права модератора
         user.is_moderator = False
         await session.commit()
+        invalidate_user(user.telegram_id)
+        set_moderator_role(user.telegram_id, False)
         
         await message.answer(
             f"✅ Права модератора у пользователя {telegram_id} удалены"
@@ -8,10 +8,10 @@ from sqlalchemy import select
 from database.models.auction import Auction, AuctionStatus
 from database.models.bid import Bid
 from database.models.product import Product
-from database.models.user import User
-from services.auction import place_bid, get_active_auctions
+from services.auction import try_place_bid, get_active_auctions, QUICK_BID_INCREMENTS, REASON_TOO_LOW
+from services.bid_pipeline import BidOutcomePipeline
 from bot.keyboards.auction import get_auction_keyboard, get_bid_keyboard
-from services.user import get_or_create_user
+from services.user import get_or_create_user, set_user_phone, UserSnapshot
 import json
 
 router = Router()
@@ -45,19 +45,6 @@ async def _parse_product_description(description: str) -> dict:
     return result
 
 
-async def _get_bids_count_and_top(session: AsyncSession, auction_id: int) -> tuple[int, int]:
-    """Получить количество ставок и топовую ставку"""
-    result = await session.execute(
-        select(Bid)
-        .where(Bid.auction_id == auction_id)
-        .order_by(Bid.amount.desc())
-    )
-    bids = list(result.scalars().all())
-    count = len(bids)
-    top_bid = bids[0].amount if bids else 0
-    return count, top_bid
-
-
 async def _send_product_to_user(
     bot,
     user_id: int,
@@ -69,8 +56,9 @@ async def _send_product_to_user(
     # Парсим описание
     desc_data = await _parse_product_description(product.description or "")
     
-    # Получаем количество ставок и топовую ставку
-    bids_count, top_bid = await _get_bids_count_and_top(session, auction.id)
+    # Количество ставок и топовая ставка хранятся в самом аукционе
+    bids_count = auction.bids_count or 0
+    top_bid = auction.top_bid_amount or 0
     
     # Формируем текст в новом формате
     text_parts = []
@@ -219,6 +207,18 @@ async def start_auction_participation(callback: CallbackQuery, session: AsyncSes
     await callback.answer()
 
 
+async def _get_reply_keyboard(session: AsyncSession, telegram_id: int, user: UserSnapshot):
+    """Reply-клавиатура участника по уже загруженному пользователю"""
+    from bot.keyboards.main import get_user_keyboard
+    from config import settings
+    from services.roles import get_role_registry
+
+    is_admin = telegram_id in settings.admin_ids_list
+    registry = get_role_registry()
+    is_moderator = registry.is_moderator(telegram_id) if registry is not None else user.is_moderator
+    return await get_user_keyboard(telegram_id, session, is_admin, is_admin or is_moderator)
+
+
 @router.callback_query(F.data.startswith("bid:quick:"))
 async def place_bid_quick(callback: CallbackQuery, session: AsyncSession):
     """Сделать ставку через быструю кнопку (50 000 или 100 000)"""
@@ -226,19 +226,11 @@ async def place_bid_quick(callback: CallbackQuery, session: AsyncSession):
     auction_id = int(parts[2])
     increment = int(parts[3])
     
-    # Получаем аукцион для проверки текущей цены
-    result = await session.execute(
-        select(Auction).where(Auction.id == auction_id)
-    )
-    auction = result.scalar_one_or_none()
-    
-    if not auction:
-        await callback.answer("Аукцион не найден", show_alert=True)
+    # Шаг приходит из callback_data - принимаем только шаги быстрых кнопок
+    if increment not in QUICK_BID_INCREMENTS:
+        await callback.answer("Недопустимый шаг ставки", show_alert=True)
         return
     
-    # Новая ставка = текущая цена + приращение
-    amount = auction.current_price + increment
-    
     user = await get_or_create_user(
         session,
         callback.from_user.id,
@@ -248,90 +240,24 @@ async def place_bid_quick(callback: CallbackQuery, session: AsyncSession):
     )
     
     try:
-        bid = await place_bid(session, auction_id, user.id, amount)
-
-        result = await session.execute(
-            select(Auction).where(Auction.id == auction_id)
-        )
-        auction = result.scalar_one()
-
-        # Обновляем статус сообщения в канале (кол-во ставок и время до конца)
-        from services.channel import get_auction_status_text
-        from config import settings
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        try:
-            status_text = await get_auction_status_text(session, auction.id)
-            if auction.channel_message_id:
-                # Создаем клавиатуру только если аукцион активен
-                keyboard = None
-                if auction.status == AuctionStatus.ACTIVE.value:
-                    bot_info = await callback.bot.get_me()
-                    bot_username = bot_info.username
-                    deep_link_url = f"https://t.me/{bot_username}?start=auction_{auction.id}"
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [
-                            InlineKeyboardButton(
-                                text="Участвовать в аукционе",
-                                url=deep_link_url
-                            )
-                        ]
-                    ])
-                
-                await callback.bot.edit_message_text(
-                    chat_id=settings.CHANNEL_ID,
-                    message_id=auction.channel_message_id,
-                    text=status_text,
-                    reply_markup=keyboard,
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            print(
-                f"[DEBUG] failed to update channel message after quick bid, "
-                f"auction_id={auction.id}, msg_id={auction.channel_message_id}, error={e!r}"
-            )
-
-        # Получаем продавца лота
-        product_result = await session.execute(
-            select(Product, User)
-            .join(User, Product.user_id == User.id)
-            .where(Product.id == auction.product_id)
-        )
-        product_data = product_result.first()
+        # Новая ставка = текущая цена + приращение, считается атомарно в БД
+        outcome = await try_place_bid(session, auction_id, user.id, increment=increment)
+        if not outcome.accepted:
+            await callback.answer(outcome.reason, show_alert=True)
+            return
 
-        await callback.answer(f"Ставка {amount:,} сум принята! ✅")
-        # Отправляем явное сообщение пользователю с reply-клавиатурой
-        from bot.keyboards.main import get_user_keyboard
-        from bot.handlers.admin import is_admin_or_moderator
-        from config import settings
-        
-        user_id = callback.from_user.id
-        is_admin = user_id in settings.admin_ids_list
-        is_moderator = await is_admin_or_moderator(user_id, session)
-        reply_keyboard = await get_user_keyboard(user_id, session, is_admin, is_moderator)
-        
-        await callback.bot.send_message(
-            chat_id=callback.from_user.id,
-            text=(
+        amount = outcome.current_price
+        reply_keyboard = await _get_reply_keyboard(session, callback.from_user.id, user)
+        await BidOutcomePipeline(callback.bot).run(
+            outcome,
+            callback.from_user.id,
+            (
                 f"✅ Ваша ставка {amount:,} сум принята.\n"
-                f"Текущая цена лота: {auction.current_price:,} сум."
+                f"Текущая цена лота: {outcome.current_price:,} сум."
             ),
-            reply_markup=reply_keyboard
+            reply_markup=reply_keyboard,
+            acknowledge=callback.answer(f"Ставка {amount:,} сум принята! ✅")
         )
-
-        if product_data:
-            product, seller = product_data
-            if seller.telegram_id:
-                await callback.bot.send_message(
-                    chat_id=seller.telegram_id,
-                    text=(
-                        "🔔 Новая ставка по вашему лоту!\n\n"
-                        f"Товар: {product.title}\n"
-                        f"Сумма ставки: {amount:,} сум\n"
-                        f"Текущая цена: {auction.current_price:,} сум"
-                    ),
-                )
-    except ValueError as e:
-        await callback.answer(str(e), show_alert=True)
     except Exception as e:
         await callback.answer(f"Ошибка: {str(e)}", show_alert=True)
 
@@ -352,90 +278,22 @@ async def place_bid_amount(callback: CallbackQuery, session: AsyncSession):
     )
     
     try:
-        bid = await place_bid(session, auction_id, user.id, amount)
-
-        result = await session.execute(
-            select(Auction).where(Auction.id == auction_id)
-        )
-        auction = result.scalar_one()
-
-        # Обновляем статус сообщения в канале (кол-во ставок и время до конца)
-        from services.channel import get_auction_status_text
-        from config import settings
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        try:
-            status_text = await get_auction_status_text(session, auction.id)
-            if auction.channel_message_id:
-                # Создаем клавиатуру только если аукцион активен
-                keyboard = None
-                if auction.status == AuctionStatus.ACTIVE.value:
-                    bot_info = await callback.bot.get_me()
-                    bot_username = bot_info.username
-                    deep_link_url = f"https://t.me/{bot_username}?start=auction_{auction.id}"
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [
-                            InlineKeyboardButton(
-                                text="Участвовать в аукционе",
-                                url=deep_link_url
-                            )
-                        ]
-                    ])
-                
-                await callback.bot.edit_message_text(
-                    chat_id=settings.CHANNEL_ID,
-                    message_id=auction.channel_message_id,
-                    text=status_text,
-                    reply_markup=keyboard,
-                    parse_mode="HTML",
-                )
-        except Exception as e:
-            print(
-                f"[DEBUG] failed to update channel message after amount bid, "
-                f"auction_id={auction.id}, msg_id={auction.channel_message_id}, error={e!r}"
-            )
-
-        # Получаем продавца лота
-        product_result = await session.execute(
-            select(Product, User)
-            .join(User, Product.user_id == User.id)
-            .where(Product.id == auction.product_id)
-        )
-        product_data = product_result.first()
+        outcome = await try_place_bid(session, auction_id, user.id, amount=amount)
+        if not outcome.accepted:
+            await callback.answer(outcome.reason, show_alert=True)
+            return
 
-        await callback.answer(f"Ставка {amount:,} сум принята! ✅")
-        # Отправляем явное сообщение пользователю с reply-клавиатурой
-        from bot.keyboards.main import get_user_keyboard
-        from bot.handlers.admin import is_admin_or_moderator
-        from config import settings
-        
-        user_id = callback.from_user.id
-        is_admin = user_id in settings.admin_ids_list
-        is_moderator = await is_admin_or_moderator(user_id, session)
-        reply_keyboard = await get_user_keyboard(user_id, session, is_admin, is_moderator)
-        
-        await callback.bot.send_message(
-            chat_id=callback.from_user.id,
-            text=(
+        reply_keyboard = await _get_reply_keyboard(session, callback.from_user.id, user)
+        await BidOutcomePipeline(callback.bot).run(
+            outcome,
+            callback.from_user.id,
+            (
                 f"✅ Ваша ставка {amount:,} сум принята.\n"
-                f"Текущая цена лота: {auction.current_price:,} сум."
+                f"Текущая цена лота: {outcome.current_price:,} сум."
             ),
-            reply_markup=reply_keyboard
+            reply_markup=reply_keyboard,
+            acknowledge=callback.answer(f"Ставка {amount:,} сум принята! ✅")
         )
-
-        if product_data:
-            product, seller = product_data
-            if seller.telegram_id:
-                await callback.bot.send_message(
-                    chat_id=seller.telegram_id,
-                    text=(
-                        "🔔 Новая ставка по вашему лоту!\n\n"
-                        f"Товар: {product.title}\n"
-                        f"Сумма ставки: {amount:,} сум\n"
-                        f"Текущая цена: {auction.current_price:,} сум"
-                    ),
-                )
-    except ValueError as e:
-        await callback.answer(str(e), show_alert=True)
     except Exception as e:
         await callback.answer(f"Ошибка: {str(e)}", show_alert=True)
 
@@ -462,7 +320,7 @@ async def process_contact_registration(message: Message, session: AsyncSession,
     contact = message.contact
     
     # Получаем или создаем пользователя
-    user = await get_or_create_user(
+    await get_or_create_user(
         session,
         message.from_user.id,
         message.from_user.username,
@@ -472,8 +330,7 @@ async def process_contact_registration(message: Message, session: AsyncSession,
     
     # Сохраняем телефон
     if contact.phone_number:
-        user.phone = contact.phone_number
-        await session.commit()
+        await set_user_phone(session, message.from_user.id, contact.phone_number)
     
     # Убираем клавиатуру
     from aiogram.types import ReplyKeyboardRemove
@@ -527,25 +384,6 @@ async def process_bid_amount(message: Message, session: AsyncSession, state: FSM
             await state.clear()
             return
         
-        # Получаем аукцион для проверки текущей цены
-        result = await session.execute(
-            select(Auction).where(Auction.id == auction_id)
-        )
-        auction = result.scalar_one_or_none()
-        
-        if not auction:
-            await message.answer("Аукцион не найден")
-            await state.clear()
-            return
-        
-        # Проверяем, что ставка выше текущей цены
-        if amount <= auction.current_price:
-            await message.answer(
-                f"Ставка не принята ☹️\n\n"
-                f"Ваша ставка должна быть выше текущей цены: {auction.current_price:,} сум"
-            )
-            return
-        
         user = await get_or_create_user(
             session,
             message.from_user.id,
@@ -555,87 +393,30 @@ async def process_bid_amount(message: Message, session: AsyncSession, state: FSM
         )
 
         try:
-            bid = await place_bid(session, auction_id, user.id, amount)
-
-            # Обновляем аукцион после ставки
-            result = await session.execute(
-                select(Auction).where(Auction.id == auction_id)
-            )
-            auction = result.scalar_one()
-
-            # Обновляем статус сообщения в канале (кол-во ставок и время до конца)
-            from services.channel import get_auction_status_text
-            from config import settings
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-            try:
-                status_text = await get_auction_status_text(session, auction.id)
-                if auction.channel_message_id:
-                    # Создаем клавиатуру только если аукцион активен
-                    keyboard = None
-                    if auction.status == AuctionStatus.ACTIVE.value:
-                        bot_info = await message.bot.get_me()
-                        bot_username = bot_info.username
-                        deep_link_url = f"https://t.me/{bot_username}?start=auction_{auction.id}"
-                        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                            [
-                                InlineKeyboardButton(
-                                    text="Участвовать в аукционе",
-                                    url=deep_link_url
-                                )
-                            ]
-                        ])
-                    
-                    await message.bot.edit_message_text(
-                        chat_id=settings.CHANNEL_ID,
-                        message_id=auction.channel_message_id,
-                        text=status_text,
-                        reply_markup=keyboard,
-                        parse_mode="HTML",
-                    )
-            except Exception as e:
-                print(
-                    f"[DEBUG] failed to update channel message after text bid, "
-                    f"auction_id={auction.id}, msg_id={auction.channel_message_id}, error={e!r}"
+            outcome = await try_place_bid(session, auction_id, user.id, amount=amount)
+
+            if not outcome.accepted:
+                if outcome.reason != REASON_TOO_LOW:
+                    await message.answer("Аукцион не найден")
+                    await state.clear()
+                    return
+                # Ставка не выше текущей цены - даём ввести другую сумму
+                await message.answer(
+                    f"Ставка не принята ☹️\n\n"
+                    f"Ваша ставка должна быть выше текущей цены: {outcome.current_price:,} сум"
                 )
-
-            # Получаем продавца лота
-            product_result = await session.execute(
-                select(Product, User)
-                .join(User, Product.user_id == User.id)
-                .where(Product.id == auction.product_id)
-            )
-            product_data = product_result.first()
-
-            # Получаем reply-клавиатуру для пользователя
-            from bot.keyboards.main import get_user_keyboard
-            from bot.handlers.admin import is_admin_or_moderator
-            from config import settings
-            
-            user_id = message.from_user.id
-            is_admin = user_id in settings.admin_ids_list
-            is_moderator = await is_admin_or_moderator(user_id, session)
-            reply_keyboard = await get_user_keyboard(user_id, session, is_admin, is_moderator)
-
-            await message.answer(
-                f"✅ Ваша ставка {amount:,} сум принята.\n"
-                "Вы пока в лидерах.",
+                return
+
+            reply_keyboard = await _get_reply_keyboard(session, message.from_user.id, user)
+            await BidOutcomePipeline(message.bot).run(
+                outcome,
+                message.chat.id,
+                (
+                    f"✅ Ваша ставка {amount:,} сум принята.\n"
+                    "Вы пока в лидерах."
+                ),
                 reply_markup=reply_keyboard
             )
-
-            if product_data:
-                product, seller = product_data
-                if seller.telegram_id:
-                    await message.bot.send_message(
-                        chat_id=seller.telegram_id,
-                        text=(
-                            "🔔 Новая ставка по вашему лоту!\n\n"
-                            f"Товар: {product.title}\n"
-                            f"Сумма ставки: {amount:,} сум\n"
-                            f"Текущая цена: {auction.current_price:,} сум"
-                        ),
-                    )
-        except ValueError as e:
-            await message.answer(str(e))
         except Exception as e:
             await message.answer(f"Ошибка: {str(e)}")
         
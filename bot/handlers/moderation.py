@@ -1,9 +1,12 @@
 """Обработчики модерации"""
+import asyncio
+from datetime import datetime
 from math import ceil
 import json
+import logging
 
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -15,13 +18,30 @@ from database.models.auction import Auction
 from database.models.regular_sale import RegularSale
 from database.models.user import User
 from database.models.payment import Payment, PaymentStatus, PaymentType
-from services.moderation import approve_product, reject_product, get_pending_moderations
+from services.moderation import (
+    approve_product,
+    reject_product,
+    get_pending_moderation_page,
+    moderation_cursor,
+    parse_moderation_cursor,
+)
+from database.connection import async_session_maker, db_phase
 from bot.keyboards.moderation import get_moderation_keyboard
+from services.telegram_queue import dispatch, broadcast, Priority
+from services.roles import get_role_registry
+from services.user import invalidate_user
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 router = Router()
 
 ITEMS_PER_PAGE = 3
+MEDIA_GROUP_LIMIT = 10  # Фото в одном альбоме Telegram
+CAPTION_LIMIT = 1024  # Длина подписи к фото
+
+# Фоновые рассылки на модерацию (ссылки держим, чтобы задачи не собрал GC)
+_background_tasks: set[asyncio.Task] = set()
 
 
 class RejectReasonStates(StatesGroup):
@@ -44,7 +64,11 @@ async def _build_product_text(
         return "Товар не найден"
 
     product, user = data
+    return _render_product_text(product, user, status_text)
+
 
+def _render_product_text(product: Product, user: User, status_text: str) -> str:
+    """Текст описания товара по уже загруженным товару и продавцу"""
     product_type_names = {
         "flowers": "🌹 Цветы",
         "gift": "🎁 Подарок",
@@ -74,87 +98,53 @@ async def send_moderation_page(
     message: Message,
     session: AsyncSession,
     page: int = 1,
+    after: tuple[datetime, int] | None = None,
+    before: tuple[datetime, int] | None = None,
 ) -> None:
-    """Отправить модератору страницу товаров (по 3 шт.)"""
-    moderations = await get_pending_moderations(session)
+    """Отправить модератору страницу товаров (по 3 шт.).
+
+    after/before - позиция последней/первой заявки соседней страницы;
+    без них показывается начало очереди.
+    """
+    async with db_phase(session):
+        moderation_page = await get_pending_moderation_page(
+            session, ITEMS_PER_PAGE, after=after, before=before
+        )
 
-    if not moderations:
+    if not moderation_page.items:
         await message.answer("✅ Нет товаров на модерации")
         return
 
-    total = len(moderations)
-    total_pages = max(1, ceil(total / ITEMS_PER_PAGE))
-    page = max(1, min(page, total_pages))
-
-    start_idx = (page - 1) * ITEMS_PER_PAGE
-    end_idx = start_idx + ITEMS_PER_PAGE
-    page_items = moderations[start_idx:end_idx]
-
-    for mod in page_items:
-        product_id = mod.product_id
-        text = await _build_product_text(session, product_id, status_text="На модерации")
-
-        # Пытаемся отправить фото, если есть
-        result = await session.execute(select(Product).where(Product.id == product_id))
-        product = result.scalar_one_or_none()
-
-        kb = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text="✅ Одобрить",
-                        callback_data=f"moderation:approve:{product_id}",
-                    ),
-                    InlineKeyboardButton(
-                        text="❌ Отклонить",
-                        callback_data=f"moderation:reject:{product_id}",
-                    ),
-                ]
-            ]
+    total_pages = max(1, ceil(moderation_page.total / ITEMS_PER_PAGE))
+    page = 1 if not moderation_page.has_prev else max(1, min(page, total_pages))
+
+    # Карточки идут по порядку: очередь отправки сохраняет порядок в чате
+    for mod, product, user in moderation_page.items:
+        await _send_moderation_card(
+            message.bot,
+            message.chat.id,
+            _product_photos(product),
+            _render_product_text(product, user, status_text="На модерации"),
+            _moderation_keyboard(mod.product_id),
+            Priority.HIGH,
         )
 
-        if product and product.photos:
-            try:
-                photos = json.loads(product.photos)
-            except Exception:
-                photos = []
-
-            if photos:
-                # Сначала отправляем все фото без подписи,
-                # под последней картинкой — полное описание товара с кнопками
-                last_index = len(photos) - 1
-                for idx, photo_id in enumerate(photos):
-                    if idx == last_index:
-                        await message.bot.send_photo(
-                            chat_id=message.chat.id,
-                            photo=photo_id,
-                            caption=text,
-                            reply_markup=kb,
-                        )
-                    else:
-                        await message.bot.send_photo(
-                            chat_id=message.chat.id,
-                            photo=photo_id,
-                        )
-                continue
-
-        # Если фото нет или ошибка парсинга
-        await message.answer(text, reply_markup=kb)
-
-    # Кнопки пагинации
+    # Кнопки пагинации: moderation_page:<номер>:<a|b>:<позиция>
+    first_mod = moderation_page.items[0][0]
+    last_mod = moderation_page.items[-1][0]
     nav_buttons = []
-    if page > 1:
+    if moderation_page.has_prev:
         nav_buttons.append(
             InlineKeyboardButton(
                 text="⬅️ Предыдущие",
-                callback_data=f"moderation_page:{page-1}",
+                callback_data=f"moderation_page:{max(1, page - 1)}:b:{moderation_cursor(first_mod)}",
             )
         )
-    if page < total_pages:
+    if moderation_page.has_next:
         nav_buttons.append(
             InlineKeyboardButton(
                 text="➡️ Следующие",
-                callback_data=f"moderation_page:{page+1}",
+                callback_data=f"moderation_page:{page + 1}:a:{moderation_cursor(last_mod)}",
             )
         )
 
@@ -176,8 +166,19 @@ async def handle_moderation_page(callback: CallbackQuery, session: AsyncSession)
 
     parts = callback.data.split(":")
     page = int(parts[1]) if len(parts) > 1 else 1
-
-    await send_moderation_page(callback.message, session, page)
+    after = before = None
+    # Кнопки старого формата (только номер страницы) открывают начало очереди
+    if len(parts) == 4:
+        try:
+            cursor = parse_moderation_cursor(parts[3])
+        except ValueError:
+            cursor = None
+        if parts[2] == "a":
+            after = cursor
+        elif parts[2] == "b":
+            before = cursor
+
+    await send_moderation_page(callback.message, session, page, after=after, before=before)
     await callback.answer()
 
 
@@ -215,34 +216,33 @@ async def handle_moderation(
 
             # Публикуем в канал
             from services.channel import publish_auction_to_channel, publish_sale_to_channel
-            from aiogram import Bot
 
-            bot_instance = Bot(token=settings.BOT_TOKEN)
+            bot_instance = callback.bot
 
-            # Проверяем, есть ли аукцион
-            result = await session.execute(
-                select(Auction).where(Auction.product_id == product_id)
-            )
-            auction = result.scalar_one_or_none()
+            # Проверяем тип публикации до запросов к Telegram
+            async with db_phase(session):
+                result = await session.execute(
+                    select(Auction.id).where(Auction.product_id == product_id)
+                )
+                auction_id = result.scalar_one_or_none()
+                sale_id = None
+                if auction_id is None:
+                    result = await session.execute(
+                        select(RegularSale.id).where(RegularSale.product_id == product_id)
+                    )
+                    sale_id = result.scalar_one_or_none()
 
-            if auction:
+            if auction_id is not None:
                 channel_message_id = await publish_auction_to_channel(
                     bot_instance,
                     session,
                     product_id,
                 )
             else:
-                # Проверяем обычную продажу
-                result = await session.execute(
-                    select(RegularSale).where(RegularSale.product_id == product_id)
-                )
-                sale = result.scalar_one_or_none()
-
-                if not sale:
+                if sale_id is None:
                     await callback.answer(
                         "Товар одобрен, но не найден тип публикации", show_alert=True
                     )
-                    await bot_instance.session.close()
                     return
 
                 channel_message_id = await publish_sale_to_channel(
@@ -251,13 +251,12 @@ async def handle_moderation(
                     product_id,
                 )
 
-            await bot_instance.session.close()
-
             # DEBUG
             print(f"[DEBUG] moderation approve OK, product_id={product_id}, channel_message_id={channel_message_id}")
 
             # Обновляем статус в карточке: Одобрен, убираем кнопки
-            new_text = await _build_product_text(session, product_id, status_text="Одобрен")
+            async with db_phase(session):
+                new_text = await _build_product_text(session, product_id, status_text="Одобрен")
             try:
                 if callback.message.photo:
                     await callback.message.edit_caption(new_text)
@@ -325,7 +324,8 @@ async def process_reject_reason(message: Message, session: AsyncSession, state:
         )
         print(f"[DEBUG] reject_product OK, product_id={product_id}, reason={reason!r}")
         # Обновляем статус в карточке: Отклонён, убираем кнопки
-        new_text = await _build_product_text(session, product_id, status_text="Отклонён")
+        async with db_phase(session):
+            new_text = await _build_product_text(session, product_id, status_text="Отклонён")
         try:
             if origin_chat_id and origin_message_id:
                 # Пытаемся обновить исходное сообщение модерации
@@ -405,6 +405,7 @@ async def handle_payment_moderation(
         payment.status = PaymentStatus.COMPLETED.value
         user.publication_credits = (user.publication_credits or 0) + credits
         await session.commit()
+        invalidate_user(user.telegram_id)
 
         try:
             await callback.message.edit_reply_markup(reply_markup=None)
@@ -414,12 +415,15 @@ async def handle_payment_moderation(
         await callback.answer("Оплата подтверждена ✅", show_alert=True)
 
         # Уведомляем пользователя
-        await callback.bot.send_message(
-            chat_id=user.telegram_id,
-            text=(
-                "✅ Оплата за публикации подтверждена.\n"
-                f"Теперь у вас доступно {user.publication_credits} публикаций."
-            ),
+        await dispatch(
+            user.telegram_id,
+            lambda: callback.bot.send_message(
+                chat_id=user.telegram_id,
+                text=(
+                    "✅ Оплата за публикации подтверждена.\n"
+                    f"Теперь у вас доступно {user.publication_credits} публикаций."
+                ),
+            )
         )
 
     elif action == "reject" and len(parts) >= 3:
@@ -462,12 +466,15 @@ async def handle_payment_moderation(
 
         await callback.answer("Платёж отклонён ❌", show_alert=True)
 
-        await callback.bot.send_message(
-            chat_id=user.telegram_id,
-            text=(
-                "❌ Оплата за публикации не подтверждена.\n"
-                "Если вы уверены, что всё оплатили верно, свяжитесь, пожалуйста, с поддержкой."
-            ),
+        await dispatch(
+            user.telegram_id,
+            lambda: callback.bot.send_message(
+                chat_id=user.telegram_id,
+                text=(
+                    "❌ Оплата за публикации не подтверждена.\n"
+                    "Если вы уверены, что всё оплатили верно, свяжитесь, пожалуйста, с поддержкой."
+                ),
+            )
         )
 
 
@@ -539,21 +546,61 @@ async def send_moderation_notification(
     product_id: int,
 ):
     """Отправить уведомление о новом товаре на модерацию с кнопками подтверждения/отклонения"""
+    # Всё нужное читаем заранее: рассылка идёт уже без соединения с БД
+    async with db_phase(session):
+        result = await session.execute(
+            select(Product, User).join(User, Product.user_id == User.id).where(Product.id == product_id)
+        )
+        data = result.first()
+
+        if not data:
+            return
+
+        product, user = data
+        recipients = list(settings.admin_ids_list) + await _moderator_ids(session)
+
+    text = _render_product_text(product, user, status_text="На модерации")
+    photos = _product_photos(product)
+    kb = _moderation_keyboard(product_id)
+
+    # Админам и модераторам - параллельно, частоту ограничивает очередь отправки
+    delivered = await broadcast(
+        recipients,
+        lambda chat_id: _send_moderation_card(bot, chat_id, photos, text, kb),
+        settings.MODERATION_FANOUT_CONCURRENCY,
+    )
+    logger.info(f"Товар {product_id} отправлен на модерацию: {delivered} из {len(set(recipients))} получателей")
+
+
+def schedule_moderation_notification(bot, product_id: int):
+    """Разослать карточку товара в фоне, не задерживая ответ пользователю"""
+    task = asyncio.create_task(_notify_moderators(bot, product_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _notify_moderators(bot, product_id: int):
+    try:
+        async with async_session_maker() as session:
+            await send_moderation_notification(bot, session, product_id)
+    except Exception as e:
+        logger.error(f"Ошибка рассылки товара {product_id} на модерацию: {e}")
+
+
+async def _moderator_ids(session: AsyncSession) -> list[int]:
+    """Модераторы из реестра ролей (или из БД, если он не запущен)"""
+    registry = get_role_registry()
+    if registry is not None:
+        return list(registry.moderator_ids())
     result = await session.execute(
-        select(Product, User).join(User, Product.user_id == User.id).where(Product.id == product_id)
+        select(User.telegram_id).where(User.is_moderator == True)
     )
-    data = result.first()
+    return list(result.scalars().all())
 
-    if not data:
-        return
 
-    product, user = data
-    
-    # Формируем полный текст товара
-    text = await _build_product_text(session, product_id, status_text="На модерации")
-    
-    # Создаем кнопки подтверждения/отклонения
-    kb = InlineKeyboardMarkup(
+def _moderation_keyboard(product_id: int) -> InlineKeyboardMarkup:
+    """Кнопки подтверждения/отклонения товара"""
+    return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
@@ -568,43 +615,69 @@ async def send_moderation_notification(
         ]
     )
 
-    # Отправляем всем администраторам
-    for admin_id in settings.admin_ids_list:
-        try:
-            # Пытаемся отправить фото, если есть
-            if product.photos:
-                try:
-                    photos = json.loads(product.photos)
-                except Exception:
-                    photos = []
-
-                if photos:
-                    # Сначала отправляем все фото без подписи,
-                    # под последней картинкой — полное описание товара с кнопками
-                    last_index = len(photos) - 1
-                    for idx, photo_id in enumerate(photos):
-                        if idx == last_index:
-                            await bot.send_photo(
-                                chat_id=admin_id,
-                                photo=photo_id,
-                                caption=text,
-                                reply_markup=kb,
-                                parse_mode="HTML",
-                            )
-                        else:
-                            await bot.send_photo(
-                                chat_id=admin_id,
-                                photo=photo_id,
-                            )
-                    continue
-
-            # Если фото нет или ошибка парсинга
-            await bot.send_message(
-                admin_id,
-                text,
+
+def _product_photos(product: Product) -> list[str]:
+    if not product.photos:
+        return []
+    try:
+        return json.loads(product.photos)
+    except Exception:
+        return []
+
+
+async def _send_moderation_card(
+    bot,
+    chat_id: int,
+    photos: list[str],
+    text: str,
+    kb: InlineKeyboardMarkup,
+    priority: Priority = Priority.NORMAL,
+):
+    """Отправить карточку товара: фото альбомом, под ним текст с кнопками.
+
+    У альбома не бывает кнопок, поэтому описание идёт отдельным
+    сообщением. Единственное фото отправляется с описанием в подписи,
+    если оно помещается.
+    """
+    if len(photos) == 1 and len(text) <= CAPTION_LIMIT:
+        await dispatch(
+            chat_id,
+            lambda: bot.send_photo(
+                chat_id=chat_id,
+                photo=photos[0],
+                caption=text,
                 reply_markup=kb,
                 parse_mode="HTML",
+            ),
+            priority
+        )
+        return
+
+    for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+        chunk = photos[start:start + MEDIA_GROUP_LIMIT]
+        if len(chunk) == 1:
+            await dispatch(
+                chat_id,
+                lambda: bot.send_photo(chat_id=chat_id, photo=chunk[0]),
+                priority
+            )
+        else:
+            await dispatch(
+                chat_id,
+                lambda: bot.send_media_group(
+                    chat_id=chat_id,
+                    media=[InputMediaPhoto(media=photo_id) for photo_id in chunk],
+                ),
+                priority
             )
-        except Exception as e:
-            print(f"Ошибка отправки админу {admin_id}: {e}")
 
+    await dispatch(
+        chat_id,
+        lambda: bot.send_message(
+            chat_id,
+            text,
+            reply_markup=kb,
+            parse_mode="HTML",
+        ),
+        priority
+    )
@@ -276,6 +276,7 @@ async def handle_payment_screenshot(
 
     from config import settings
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+    from services.telegram_queue import dispatch, broadcast
 
     caption = (
         "🧾 Новый платёж за публикации\n\n"
@@ -302,17 +303,21 @@ async def handle_payment_screenshot(
         ]
     )
 
-    # Отправляем всем администраторам, как и уведомления о модерации
-    for admin_id in settings.admin_ids_list:
-        try:
-            await message.bot.send_photo(
+    # Отправляем всем администраторам параллельно, как и уведомления о модерации
+    bot = message.bot
+    await broadcast(
+        settings.admin_ids_list,
+        lambda admin_id: dispatch(
+            admin_id,
+            lambda: bot.send_photo(
                 chat_id=admin_id,
                 photo=photo_id,
                 caption=caption,
                 reply_markup=kb,
             )
-        except Exception:
-            continue
+        ),
+        settings.MODERATION_FANOUT_CONCURRENCY,
+    )
 
     await message.answer(
         "Ваш платёж отправлен на проверку модератору. Ожидайте подтверждения."
@@ -9,9 +9,11 @@ from database.models.product import Product, ProductType
 from database.models.auction import Auction
 from database.models.regular_sale import RegularSale
 from database.models.user import User
-from services.user import get_or_create_user
+from services.user import get_or_create_user, consume_publication_credit
 from services.moderation import add_to_moderation
 from services.auction import create_auction
+from bot.fsm_storage import append_to_state_list
+from database.connection import db_phase
 import json
 
 router = Router()
@@ -157,19 +159,16 @@ async def process_photo(message: Message, state: FSMContext):
         await state.set_state(PublicationStates.waiting_product_type)
         return
     
-    photos = data.get("photos", [])
+    # Сохраняем file_id самого большого фото. Фото альбома приходят отдельными
+    # апдейтами одновременно, поэтому добавляем атомарно, а не перезаписью списка
+    largest_photo = max(message.photo, key=lambda p: p.file_size)
+    photos = await append_to_state_list(state, "photos", largest_photo.file_id, limit=3)
     
-    if len(photos) >= 3:
+    if photos is None:
         await message.answer("Максимум 3 фото. Переходим к следующему шагу...")
         await finish_photos_auto(message, state)
         return
     
-    # Сохраняем file_id самого большого фото
-    largest_photo = max(message.photo, key=lambda p: p.file_size)
-    photos.append(largest_photo.file_id)
-    
-    await state.update_data(photos=photos)
-    
     # Если загружено 3 фото, автоматически переходим дальше
     if len(photos) >= 3:
         await message.answer("✅ Загружено максимальное количество фото (3/3). Переходим дальше...")
@@ -439,88 +438,68 @@ async def show_confirmation(message: Message, state: FSMContext, session: AsyncS
 async def confirm_publication(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтверждение и сохранение публикации"""
     data = await state.get_data()
-    
-    # Получаем или создаем пользователя
-    user = await get_or_create_user(
-        session,
-        callback.from_user.id,
-        callback.from_user.username,
-        callback.from_user.first_name,
-        callback.from_user.last_name
-    )
 
-    # Списываем одну доступную публикацию, если есть
-    if user.publication_credits <= 0:
+    # Вся работа с БД - в одной фазе: соединение возвращается в пул
+    # до ответа пользователю и рассылки модераторам
+    async with db_phase(session):
+        # Получаем или создаем пользователя
+        user = await get_or_create_user(
+            session,
+            callback.from_user.id,
+            callback.from_user.username,
+            callback.from_user.first_name,
+            callback.from_user.last_name
+        )
+
+        # Списываем одну доступную публикацию, если есть (атомарно, без гонки двойного нажатия)
+        credited = await consume_publication_credit(session, user.id) is not None
+        if credited:
+            # Создаем товар
+            condition = data.get("condition")
+            description = None
+            if condition:
+                description = f"Свежесть: {condition}"
+
+            product = Product(
+                user_id=user.id,
+                title=data['title'],
+                product_type=data['product_type'],
+                description=description,
+                photos=json.dumps(data.get('photos', [])),
+                video=data.get('video'),
+                price=data['price'],
+                contact_info=data.get('contact_info', '')
+            )
+            session.add(product)
+            await session.commit()
+            await session.refresh(product)
+
+            # Создаем аукцион или обычную продажу
+            if data['publication_type'] == 'auction':
+                await create_auction(session, product.id, data['price'])
+            else:
+                from database.models.regular_sale import SaleStatus
+                session.add(RegularSale(
+                    product_id=product.id,
+                    price=data['price'],
+                    status=SaleStatus.PENDING.value
+                ))
+            await add_to_moderation(session, product.id, user.id)
+
+    if not credited:
         await callback.answer(
             "У вас больше нет доступных публикаций. Пополните баланс.", show_alert=True
         )
         return
 
-    user.publication_credits -= 1
-    await session.commit()
-    
-    # Создаем товар
-    condition = data.get("condition")
-    description = None
-    if condition:
-        description = f"Свежесть: {condition}"
-    
-    product = Product(
-        user_id=user.id,
-        title=data['title'],
-        product_type=data['product_type'],
-        description=description,
-        photos=json.dumps(data.get('photos', [])),
-        video=data.get('video'),
-        price=data['price'],
-        contact_info=data.get('contact_info', '')
+    # Рассылка админам и модераторам идёт в фоне, пользователь её не ждёт
+    from bot.handlers.moderation import schedule_moderation_notification
+    schedule_moderation_notification(callback.bot, product.id)
+
+    await callback.message.edit_text(
+        "✅ Товар создан и отправлен на модерацию!\n\n"
+        "После одобрения модератором ваш товар будет опубликован в канале."
     )
-    session.add(product)
-    await session.commit()
-    await session.refresh(product)
-    
-    # Создаем аукцион или обычную продажу
-    if data['publication_type'] == 'auction':
-        auction = await create_auction(session, product.id, data['price'])
-        await add_to_moderation(session, product.id, user.id)
-        
-        # Отправляем уведомление админам
-        from bot.handlers.moderation import send_moderation_notification
-        from aiogram import Bot
-        from config import settings
-        bot_instance = Bot(token=settings.BOT_TOKEN)
-        await send_moderation_notification(bot_instance, session, product.id)
-        await bot_instance.session.close()
-        
-        await callback.message.edit_text(
-            "✅ Товар создан и отправлен на модерацию!\n\n"
-            "После одобрения модератором ваш товар будет опубликован в канале."
-        )
-    else:
-        # Обычная продажа
-        from database.models.regular_sale import RegularSale, SaleStatus
-        sale = RegularSale(
-            product_id=product.id,
-            price=data['price'],
-            status=SaleStatus.PENDING.value
-        )
-        session.add(sale)
-        await add_to_moderation(session, product.id, user.id)
-        await session.commit()
-        
-        # Отправляем уведомление админам
-        from bot.handlers.moderation import send_moderation_notification
-        from aiogram import Bot
-        from config import settings
-        bot_instance = Bot(token=settings.BOT_TOKEN)
-        await send_moderation_notification(bot_instance, session, product.id)
-        await bot_instance.session.close()
-        
-        await callback.message.edit_text(
-            "✅ Товар создан и отправлен на модерацию!\n\n"
-            "После одобрения модератором ваш товар будет опубликован в канале."
-        )
-    
     await state.clear()
     await callback.answer()
 
@@ -1,7 +1,7 @@
 """Обработчики обычных продаж"""
 import logging
 from datetime import datetime, timezone
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
@@ -10,6 +10,7 @@ from database.models.product import Product
 from database.models.user import User
 from database.models.sale_interest import SaleInterest
 from services.user import get_or_create_user
+from services.telegram_queue import dispatch
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -88,13 +89,16 @@ async def handle_buy_interest(callback: CallbackQuery, session: AsyncSession):
     ])
     
     try:
-        bot = Bot(token=settings.BOT_TOKEN)
-        await bot.send_message(
-            chat_id=seller.telegram_id,
-            text=buyer_info,
-            reply_markup=sold_keyboard
+        bot = callback.bot
+        await dispatch(
+            seller.telegram_id,
+            lambda: bot.send_message(
+                chat_id=seller.telegram_id,
+                text=buyer_info,
+                reply_markup=sold_keyboard,
+                parse_mode=None
+            )
         )
-        await bot.session.close()
         await callback.answer("Ваш запрос отправлен продавцу ✅", show_alert=True)
     except Exception as e:
         logger.error(f"Ошибка при отправке уведомления продавцу: {e}")
@@ -144,7 +148,7 @@ async def handle_mark_as_sold(callback: CallbackQuery, session: AsyncSession):
     # Обновляем сообщение в канале - убираем кнопку и добавляем текст "ПРОДАНО"
     if sale.channel_message_id:
         try:
-            bot = Bot(token=settings.BOT_TOKEN)
+            bot = callback.bot
             # Редактируем reply_markup - убираем кнопку "Хочу купить"
             await bot.edit_message_reply_markup(
                 chat_id=settings.CHANNEL_ID,
@@ -172,7 +176,6 @@ async def handle_mark_as_sold(callback: CallbackQuery, session: AsyncSession):
                 caption=sold_text,
                 parse_mode="HTML"
             )
-            await bot.session.close()
         except Exception as e:
             logger.error(f"Ошибка при обновлении сообщения в канале: {e}")
     
@@ -178,23 +178,22 @@ async def _handle_auction_deeplink(
 @router.message(StartState.waiting_contact, F.contact)
 async def process_start_contact(message: Message, session: AsyncSession, state: FSMContext):
     """Обработка контакта при команде /start"""
+    from services.user import set_user_phone
+    
     contact = message.contact
     
     # Получаем пользователя
     result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
+        select(User.id).where(User.telegram_id == message.from_user.id)
     )
-    user = result.scalar_one_or_none()
-    
-    if not user:
+    if result.scalar_one_or_none() is None:
         await message.answer("Ошибка: пользователь не найден")
         await state.clear()
         return
     
     # Сохраняем телефон
     if contact.phone_number:
-        user.phone = contact.phone_number
-        await session.commit()
+        await set_user_phone(session, message.from_user.id, contact.phone_number)
     
     # Убираем клавиатуру
     await message.answer("✅ Регистрация завершена!", reply_markup=ReplyKeyboardRemove())
@@ -1,6 +1,6 @@
 """Клавиатуры бота"""
 from .main import get_main_keyboard, get_publication_type_keyboard
-from .auction import get_auction_keyboard, get_bid_keyboard
+from .auction import get_auction_keyboard, get_bid_keyboard, get_auction_channel_keyboard
 from .moderation import get_moderation_keyboard
 
 __all__ = [
@@ -8,6 +8,7 @@ __all__ = [
     "get_publication_type_keyboard",
     "get_auction_keyboard",
     "get_bid_keyboard",
+    "get_auction_channel_keyboard",
     "get_moderation_keyboard",
 ]
 
@@ -48,3 +48,16 @@ def get_bid_keyboard(auction_id: int, current_price: int) -> InlineKeyboardMarku
     # Каждая кнопка в своей строке
     builder.adjust(1)
     return builder.as_markup()
+
+
+def get_auction_channel_keyboard(bot_username: str, auction_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура поста аукциона в канале (deep-link в бота)"""
+    deep_link_url = f"https://t.me/{bot_username}?start=auction_{auction_id}"
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text="Участвовать в аукционе",
+                url=deep_link_url
+            )
+        ]
+    ])
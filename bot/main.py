@@ -1,12 +1,13 @@
 """Главный файл бота"""
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from config import settings
 from bot.handlers import start, main_menu, callbacks
 from bot.middlewares.database import DatabaseMiddleware
+from bot.fsm_storage import create_fsm_storage
+from bot.client import create_bot, close_bot
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,18 +17,28 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Запуск бота"""
-    # Создаем бот и диспетчер
-    bot = Bot(
-        token=settings.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher()
+def create_dispatcher(storage: BaseStorage | None = None) -> Dispatcher:
+    """Диспетчер со всеми middleware и роутерами бота.
+
+    Роутеры - объекты модулей и подключаются только к одному диспетчеру,
+    поэтому создавать его можно один раз на процесс. storage по умолчанию
+    берётся из настроек (create_fsm_storage).
+    """
+    dp = Dispatcher(storage=storage if storage is not None else create_fsm_storage())
+    
+    # Регистрируем middleware (один экземпляр, чтобы счётчики были общими)
+    database_middleware = DatabaseMiddleware()
+    dp.message.middleware(database_middleware)
+    dp.callback_query.middleware(database_middleware)
     
-    # Регистрируем middleware
-    dp.message.middleware(DatabaseMiddleware())
-    dp.callback_query.middleware(DatabaseMiddleware())
+    # Метрики: внешний middleware регистрируется после FSM и видит состояние
+    if settings.METRICS_ENABLED:
+        from bot.middlewares.metrics import MetricsMiddleware, HandlerLabelMiddleware
+        from services.metrics import track_database_middleware
+        track_database_middleware(database_middleware)
+        dp.update.outer_middleware(MetricsMiddleware())
+        dp.message.middleware(HandlerLabelMiddleware())
+        dp.callback_query.middleware(HandlerLabelMiddleware())
     
     # Регистрируем роутеры
     # Важно: publication.router должен быть ПЕРЕД callbacks.router,
@@ -42,19 +53,83 @@ async def main():
     dp.include_router(sale.router)
     dp.include_router(moderation.router)
     dp.include_router(payments.router)
+    return dp
+
+
+async def main():
+    """Запуск бота"""
+    # Создаем общий для процесса бот и диспетчер
+    bot = create_bot()
+    dp = create_dispatcher()
+    
+    # Запись входящих обновлений для tools.replay_updates
+    if settings.UPDATE_RECORD_PATH:
+        from bot.middlewares.update_recorder import UpdateRecorderMiddleware, start_update_recorder
+        dp.update.outer_middleware(UpdateRecorderMiddleware(start_update_recorder()))
+    
+    # Метрики запросов к Bot API и к БД и эндпоинт /metrics
+    metrics_runner = None
+    if settings.METRICS_ENABLED:
+        from services.metrics import TelegramRequestMetrics, install_db_metrics, start_metrics_server
+        from database.connection import engine
+        bot.session.middleware(TelegramRequestMetrics())
+        install_db_metrics(engine)
+        metrics_runner = await start_metrics_server()
+    
+    # Загружаем роли до приёма обновлений: проверки прав идут без запросов к БД
+    from services.roles import start_role_registry
+    await start_role_registry()
+    
+    # Кэш пользователей сбрасывается по изменениям из других процессов
+    from services.user import start_user_cache_sync
+    start_user_cache_sync()
+    
+    # Запускаем очередь отправки в Telegram
+    from services.telegram_queue import start_send_queue
+    start_send_queue()
+    
+    # Запускаем движок ставок в памяти, если он включен
+    if settings.BID_ENGINE_MODE == "memory":
+        from services.bid_engine import start_bid_engine
+        await start_bid_engine()
+    
+    # Запускаем сервис обновления карточек аукционов в канале
+    from services.card_updater import start_card_updater
+    start_card_updater(bot)
     
     # Запускаем планировщик для завершения аукционов
     from services.scheduler import start_scheduler
-    start_scheduler(bot)
+    await start_scheduler(bot)
     
     # Запускаем планировщик напоминаний о модерации
     from services.notifications import start_notification_scheduler
     start_notification_scheduler(bot)
     
+    # Слушатель NOTIFY запускается последним, когда все подписчики зарегистрированы
+    if settings.PG_EVENTS_ENABLED:
+        from services.pg_events import start_pg_listener
+        start_pg_listener()
+    
     logger.info("Бот запущен")
     
-    # Запускаем polling
-    await dp.start_polling(bot)
+    try:
+        if settings.BOT_MODE == "webhook":
+            from bot.webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            # Запускаем polling
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if settings.UPDATE_RECORD_PATH:
+            from bot.middlewares.update_recorder import close_update_recorder
+            close_update_recorder()
+        # Ставки из буфера движка в памяти дописываем до выхода
+        if settings.BID_ENGINE_MODE == "memory":
+            from services.bid_engine import stop_bid_engine
+            await stop_bid_engine()
+        await close_bot()
 
 
 if __name__ == "__main__":
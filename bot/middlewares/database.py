@@ -2,19 +2,75 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.connection import async_session_maker
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LazySession:
+    """Сессия БД, которая создаётся при первом обращении к ней.
+
+    Для обработчика выглядит как AsyncSession: все атрибуты передаются
+    настоящей сессии. Соединение из пула берётся только при первом
+    запросе, touched показывает, был ли он.
+    """
+
+    __slots__ = ("_session", "touched")
+
+    def __init__(self):
+        self._session: AsyncSession | None = None
+        self.touched = False
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = async_session_maker()
+            event.listen(self._session.sync_session, "after_begin", self._on_begin)
+        return self._session
+
+    def _on_begin(self, session, transaction, connection):
+        self.touched = True
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    async def close(self):
+        """Закрыть сессию, если она создавалась"""
+        if self._session is not None:
+            await self._session.close()
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    """Middleware для создания сессии БД"""
-    
+    """Middleware, передающее обработчику ленивую сессию БД.
+
+    Один экземпляр можно подключить к нескольким типам событий: счётчики
+    показывают, какая доля обновлений на самом деле ходит в БД, и
+    отдаются в /metrics (services.metrics.track_database_middleware).
+    """
+
+    def __init__(self):
+        self.updates = 0
+        self.db_updates = 0
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with async_session_maker() as session:
-            data["session"] = session
+        session = LazySession()
+        data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
+            self.updates += 1
+            if session.touched:
+                self.db_updates += 1
+            logger.debug(f"{type(event).__name__}: БД {'использована' if session.touched else 'не использована'}")
 
+    def stats(self) -> dict:
+        """Сколько обновлений обработано и сколько из них обращались к БД"""
+        return {"updates": self.updates, "db_updates": self.db_updates}
@@ -0,0 +1,70 @@
+"""Middleware для сбора метрик обработки обновлений"""
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from services.metrics import UpdateStats, begin_update, end_update, current_update
+
+
+def _fallback_label(update: Update, data: Dict[str, Any]) -> str:
+    """Метка обновления, пока обработчик не известен.
+
+    Остаётся только у обновлений, которые не дошли до обработчика, поэтому
+    текст команды и callback_data в метку не попадают: их присылает
+    пользователь, и каждое новое значение заводило бы новый ряд в Prometheus.
+    """
+    if update.callback_query is not None:
+        return "callback:other"
+    state = data.get("raw_state")
+    if state:
+        return f"state:{state}"
+    if update.message is not None:
+        if (update.message.text or "").startswith("/"):
+            return "command:other"
+        return "message"
+    return update.event_type
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Внешний middleware для dp.update: время, запросы к БД и к Bot API.
+
+    Регистрируется после FSM-middleware диспетчера, поэтому видит
+    состояние пользователя. Счётчики запросов собираются в UpdateStats
+    через contextvar, точную метку ставит HandlerLabelMiddleware.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = UpdateStats(handler=_fallback_label(event, data))
+        token = begin_update(stats)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            end_update(token, stats, time.perf_counter() - started, failed)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Внутренний middleware: подписывает обновление роутером и обработчиком"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = current_update()
+        handler_object = data.get("handler")
+        if stats is not None and handler_object is not None:
+            callback = handler_object.callback
+            router = callback.__module__.rsplit(".", 1)[-1]
+            stats.handler = f"{router}.{callback.__name__}"
+        return await handler(event, data)
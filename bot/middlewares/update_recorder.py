@@ -0,0 +1,172 @@
+"""Middleware записи входящих обновлений для последующего воспроизведения"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Числа (суммы ставок) оставляем как есть
+_AMOUNT_RE = re.compile(r"[\d\s,.]+")
+_NON_SPACE_RE = re.compile(r"\S")
+
+
+def _keyboard_texts() -> frozenset[str]:
+    """Надписи reply-кнопок бота: по ним обработчики узнают команды меню"""
+    from bot.keyboards.admin import get_admin_keyboard, get_moderator_keyboard
+    from bot.keyboards.main import get_main_keyboard
+
+    return frozenset(
+        button.text
+        for keyboard in (get_main_keyboard(), get_moderator_keyboard(), get_admin_keyboard())
+        for row in keyboard.keyboard
+        for button in row
+    )
+
+
+class UpdateRecorder:
+    """Пишет обновления в gzip JSONL, убирая персональные данные.
+
+    Строка файла - {"ts": время получения, "update": обновление}.
+    ID пользователей и чатов заменяются псевдонимами (HMAC с солью),
+    одинаковыми в пределах соли, поэтому диалоги и состояния FSM при
+    воспроизведении сохраняются. ID канала и админов остаются как есть.
+    Имена, телефоны, vCard контактов и координаты затираются; из текста
+    остаются только команды, надписи кнопок и числа, остальное заменяется
+    на "x" той же длины. Файл открывается на дозапись: gzip из нескольких
+    частей читается как один.
+    """
+
+    # Через сколько обновлений сбрасывать сжатые данные на диск
+    FLUSH_EVERY = 100
+
+    def __init__(self, path: str, salt: bytes, keep_ids: frozenset[int]):
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._salt = salt
+        self._keep_ids = keep_ids
+        self._keyboard_texts = _keyboard_texts()
+        self._unflushed = 0
+        self.recorded = 0
+
+    def record(self, update: Update):
+        data = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        line = json.dumps({"ts": time.time(), "update": self.scrub(data)}, ensure_ascii=False)
+        self._file.write(line + "\n")
+        self.recorded += 1
+        self._unflushed += 1
+        if self._unflushed >= self.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        # Сброс с Z_SYNC_FLUSH: записанное читается, даже если процесс упадёт
+        self._file.flush()
+        self._unflushed = 0
+
+    def close(self):
+        self._file.close()
+
+    def pseudonym(self, value: int) -> int:
+        """Псевдоним ID; знак сохраняется, чтобы группы и каналы оставались группами"""
+        if value in self._keep_ids:
+            return value
+        digest = hmac.new(self._salt, str(value).encode(), hashlib.sha256).digest()
+        number = int.from_bytes(digest[:6], "big") % 10**12
+        return -(10**12 + number) if value < 0 else 1 + number
+
+    def scrub(self, value: Any) -> Any:
+        """Копия объекта Bot API без персональных данных"""
+        if isinstance(value, list):
+            return [self.scrub(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        # User, Chat и Contact: у них id - это ID в Telegram
+        is_account = "is_bot" in value or "type" in value or "phone_number" in value
+        result = {}
+        for key, item in value.items():
+            if key in ("id", "user_id") and isinstance(item, int) and (is_account or key == "user_id"):
+                result[key] = self.pseudonym(item)
+            elif key in ("text", "caption") and isinstance(item, str):
+                result[key] = self._scrub_text(item)
+            elif key == "first_name":
+                result[key] = "User"
+            elif key in ("last_name", "vcard"):
+                # vCard контакта повторяет имя и телефон и может содержать почту и адрес
+                continue
+            elif key == "username":
+                result[key] = f"user{self.pseudonym(value['id'])}" if isinstance(value.get("id"), int) else "user"
+            elif key == "phone_number":
+                result[key] = "+000000000000"
+            elif key in ("latitude", "longitude"):
+                result[key] = 0.0
+            elif key == "chat_instance":
+                result[key] = hmac.new(self._salt, item.encode(), hashlib.sha256).hexdigest()[:16]
+            else:
+                result[key] = self.scrub(item)
+        return result
+
+    def _scrub_text(self, text: str) -> str:
+        if text in self._keyboard_texts or _AMOUNT_RE.fullmatch(text):
+            return text
+        if text.startswith("/"):
+            # Аргументы команды (deep link, ID) могут быть личными
+            command, _, args = text.partition(" ")
+            return f"{command} {_NON_SPACE_RE.sub('x', args)}" if args else command
+        return _NON_SPACE_RE.sub("x", text)
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """Внешний middleware для dp.update: записывает каждое обновление до обработки"""
+
+    def __init__(self, recorder: UpdateRecorder):
+        self.recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            self.recorder.record(event)
+        except Exception as e:
+            logger.warning(f"Не удалось записать обновление {getattr(event, 'update_id', '?')}: {e}")
+        return await handler(event, data)
+
+
+_update_recorder: UpdateRecorder | None = None
+
+
+def get_update_recorder() -> UpdateRecorder | None:
+    """Запись обновлений (None, если выключена)"""
+    return _update_recorder
+
+
+def start_update_recorder() -> UpdateRecorder:
+    """Начать запись обновлений в UPDATE_RECORD_PATH"""
+    global _update_recorder
+    # Без заданной соли псевдонимы стабильны только в пределах запуска
+    salt = settings.UPDATE_RECORD_SALT.encode() or os.urandom(16)
+    keep_ids = set(settings.admin_ids_list)
+    if settings.CHANNEL_ID.lstrip("-").isdigit():
+        keep_ids.add(int(settings.CHANNEL_ID))
+    _update_recorder = UpdateRecorder(settings.UPDATE_RECORD_PATH, salt, frozenset(keep_ids))
+    logger.info(f"Входящие обновления записываются в {settings.UPDATE_RECORD_PATH}")
+    return _update_recorder
+
+
+def close_update_recorder():
+    """Дописать и закрыть файл записи"""
+    global _update_recorder
+    if _update_recorder is not None:
+        _update_recorder.close()
+        logger.info(f"Записано обновлений: {_update_recorder.recorded}")
+        _update_recorder = None
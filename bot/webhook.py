@@ -0,0 +1,109 @@
+"""Приём обновлений Telegram через webhook"""
+import asyncio
+import hmac
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from pydantic import ValidationError
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """Принимает обновление, сразу отвечает 200 и обрабатывает его в фоне.
+
+    Одновременно обрабатывается не больше max_concurrency обновлений,
+    остальные ждут своей очереди в фоне, не задерживая ответ Telegram.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str, max_concurrency: int):
+        self._dp = dp
+        self._bot = bot
+        self._secret = secret
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._secret and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self._secret
+        ):
+            logger.warning(f"Webhook: неверный секрет от {request.remote}")
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self._bot})
+        except (ValueError, ValidationError) as e:
+            logger.warning(f"Webhook: некорректное обновление: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self._dp.feed_update(self._bot, update)
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+
+    @property
+    def pending(self) -> int:
+        """Обновлений в обработке и в ожидании"""
+        return len(self._tasks)
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """Приложение aiohttp с обработчиком webhook"""
+    handler = WebhookHandler(
+        dp,
+        bot,
+        secret=settings.WEBHOOK_SECRET,
+        max_concurrency=settings.WEBHOOK_MAX_CONCURRENCY
+    )
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "pending_updates": handler.pending})
+
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, handler.handle)
+    app.router.add_get("/healthz", health)
+    app["webhook_handler"] = handler
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Запустить сервер webhook и зарегистрировать его в Telegram.
+
+    Без WEBHOOK_URL сервер только слушает порт: так можно локально
+    отправлять записанные обновления POST-запросами.
+    """
+    app = create_webhook_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(
+        f"Webhook слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}"
+    )
+
+    if settings.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(100, settings.WEBHOOK_MAX_CONCURRENCY)
+        )
+        logger.info("Webhook зарегистрирован в Telegram")
+    else:
+        logger.info("WEBHOOK_URL не указан: webhook в Telegram не регистрируется")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -1,4 +1,5 @@
 """Конфигурация приложения"""
+from functools import cached_property
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -17,6 +18,17 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = ""
     DB_NAME: str = ""
     
+    # Пул соединений SQLAlchemy (на процесс)
+    DB_POOL_SIZE: int = 10  # Постоянных соединений
+    DB_POOL_MAX_OVERFLOW: int = 10  # Дополнительных соединений сверх DB_POOL_SIZE
+    DB_POOL_TIMEOUT: float = 30.0  # Сколько ждать свободное соединение (сек)
+    DB_POOL_PRE_PING: bool = False  # Проверять соединение перед выдачей
+    DB_POOL_RECYCLE: int = 1800  # Пересоздавать соединения старше (сек); -1 - никогда
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Кэш подготовленных запросов asyncpg на соединение
+    # Работа через PgBouncer в режиме transaction: без кэша подготовленных
+    # запросов и с уникальными именами запросов
+    DB_PGBOUNCER: bool = False
+    
     # Payment Systems
     PAYME_MERCHANT_ID: str = ""
     PAYME_SECRET_KEY: str = ""
@@ -28,6 +40,15 @@ class Settings(BaseSettings):
     ADMIN_USER_IDS: str = ""
     PUBLICATION_PRICE: int = 30000
     
+    # Приём обновлений: "polling" - long polling, "webhook" - сервер aiohttp
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: str = ""  # Внешний адрес, например https://bot.example.com
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""  # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_MAX_CONCURRENCY: int = 100  # Одновременно обрабатываемых обновлений
+    
     # FastAPI
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
@@ -37,9 +58,73 @@ class Settings(BaseSettings):
     # Можно переопределить через переменную окружения AUCTION_DURATION_HOURS
     AUCTION_DURATION_HOURS: float = 2.0
     
-    @property
+    # Движок ставок: "database" - атомарный запрос в БД на каждую ставку,
+    # "memory" - актор на аукцион в памяти и пакетная запись ставок в БД.
+    # Режим "memory" допустим только при одном процессе бота.
+    BID_ENGINE_MODE: str = "database"
+    BID_ENGINE_FLUSH_INTERVAL: float = 0.2  # Пауза между пакетными записями (сек)
+    BID_ENGINE_FLUSH_BATCH: int = 500  # Размер пакета, при котором запись идёт сразу
+    
+    # Минимальный интервал между правками одного поста аукциона в канале (сек)
+    CHANNEL_CARD_EDIT_INTERVAL: float = 3.0
+    # За сколько секунд распределять правки при периодическом обновлении карточек
+    CHANNEL_CARD_REFRESH_WINDOW: float = 600.0
+    
+    # Как часто таймер завершения аукционов сверяется с БД (сек)
+    AUCTION_DEADLINE_RESYNC_INTERVAL: float = 600.0
+    # Через сколько секунд повторить завершение, если оно упало с ошибкой
+    AUCTION_DEADLINE_RETRY_DELAY: float = 10.0
+    AUCTION_FINISH_BATCH: int = 500  # Сколько аукционов завершать одним запросом
+    AUCTION_FINISH_CONCURRENCY: int = 10  # Одновременных рассылок контактов после завершения
+    SALE_EXPIRE_BATCH: int = 500  # Сколько истекших продаж переводить в expired одним запросом
+    
+    # Кэш снимков пользователей в services.user (по telegram_id)
+    USER_CACHE_SIZE: int = 10000
+    # Сек; 0 - без кэша. Изменения из других процессов сбрасывают кэш через
+    # NOTIFY (миграция 014), без PG_EVENTS_ENABLED снимок живёт до конца TTL
+    USER_CACHE_TTL: float = 60.0
+    
+    # Хранилище FSM: "memory" - в памяти процесса (только один процесс бота),
+    # "postgres" - таблица fsm_states (миграция 010), общая для всех процессов
+    FSM_STORAGE: str = "memory"
+    # Сколько секунд доверять кэшу состояния в процессе. Больше 0 - только если
+    # все апдейты пользователя приходят в один процесс (один бот или sticky-маршрутизация)
+    FSM_CACHE_TTL: float = 0.0
+    FSM_CACHE_SIZE: int = 10000  # Сколько состояний держать в кэше
+    FSM_STATE_TTL: float = 7 * 24 * 60 * 60  # Через сколько секунд брошенный диалог забывается
+    
+    # Слушать события NOTIFY из БД (нужны миграции 009, 011 и 014)
+    PG_EVENTS_ENABLED: bool = True
+    
+    # Как часто реестр ролей перечитывает модераторов из БД (сек)
+    ROLES_RESYNC_INTERVAL: float = 300.0
+    
+    # Очередь отправки в Telegram (лимиты в сообщениях в секунду)
+    TELEGRAM_GLOBAL_RATE: float = 30.0  # Общий лимит бота
+    TELEGRAM_PRIVATE_CHAT_RATE: float = 1.0  # Лимит на личный чат
+    TELEGRAM_GROUP_CHAT_RATE: float = 20 / 60  # Лимит на группу или канал
+    TELEGRAM_CHAT_BURST: int = 3  # Сколько сообщений в чат можно отправить подряд
+    TELEGRAM_SEND_WORKERS: int = 16  # Одновременных запросов к Telegram
+    TELEGRAM_SEND_MAX_RETRIES: int = 5  # Повторов после TelegramRetryAfter
+    MODERATION_FANOUT_CONCURRENCY: int = 10  # Одновременных рассылок карточки на модерацию
+    
+    # HTTP-клиент общего Bot (bot.client)
+    TELEGRAM_HTTP_CONNECTIONS: int = 100  # Одновременных соединений к Bot API
+    TELEGRAM_HTTP_KEEPALIVE: float = 60.0  # Сколько держать простаивающее соединение (сек)
+    TELEGRAM_DNS_CACHE_TTL: int = 3600  # Сколько кэшировать адрес api.telegram.org (сек)
+    
+    # Метрики Prometheus (services.metrics)
+    METRICS_ENABLED: bool = False  # Собирать метрики и отдавать их по HTTP
+    METRICS_HOST: str = "127.0.0.1"  # Адрес эндпоинта /metrics
+    METRICS_PORT: int = 9100  # Порт эндпоинта /metrics
+    
+    # Запись входящих обновлений для воспроизведения (tools.replay_updates)
+    UPDATE_RECORD_PATH: str = ""  # Файл gzip JSONL (пусто - не записывать)
+    UPDATE_RECORD_SALT: str = ""  # Соль псевдонимов ID (пусто - своя на каждый запуск)
+    
+    @cached_property
     def admin_ids_list(self) -> List[int]:
-        """Список ID администраторов"""
+        """Список ID администраторов (разбирается один раз)"""
         if not self.ADMIN_USER_IDS:
             return []
         return [int(uid.strip()) for uid in self.ADMIN_USER_IDS.split(",") if uid.strip()]
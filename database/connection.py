@@ -1,13 +1,37 @@
 """Подключение к базе данных"""
+from contextlib import asynccontextmanager
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from database.pool_metrics import InstrumentedPool
 from config import settings
 
+
+def _connect_args() -> dict:
+    """Параметры asyncpg для подключения"""
+    if settings.DB_PGBOUNCER:
+        # PgBouncer в режиме transaction не держит подготовленные запросы
+        # между транзакциями: кэш выключен, имена уникальны
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+
+
 # Создаем движок для асинхронной работы
 engine = create_async_engine(
     settings.database_url,
     echo=False,
-    future=True
+    future=True,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    connect_args=_connect_args()
 )
 
 # Создаем фабрику сессий
@@ -26,3 +50,20 @@ async def get_session() -> AsyncSession:
     async with async_session_maker() as session:
         yield session
 
+
+
+@asynccontextmanager
+async def db_phase(session: AsyncSession):
+    """Короткая фаза работы с БД перед запросами к Telegram.
+
+    На выходе транзакция фиксируется (при ошибке - откатывается), и
+    соединение возвращается в пул, не дожидаясь сетевых вызовов.
+    Загруженные объекты остаются доступны: expire_on_commit=False.
+    """
+    try:
+        yield session
+    except BaseException:
+        await session.rollback()
+        raise
+    else:
+        await session.commit()
@@ -0,0 +1,11 @@
+-- Миграция 007: Одна строка ставки на пользователя в аукционе
+-- Нужна для атомарного upsert ставки (INSERT ... ON CONFLICT) в services.auction.place_bid
+
+-- Удаляем дубликаты, оставляя максимальную ставку пользователя
+DELETE FROM bids b
+USING bids d
+WHERE b.auction_id = d.auction_id
+  AND b.user_id = d.user_id
+  AND (b.amount < d.amount OR (b.amount = d.amount AND b.id > d.id));
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_bids_auction_user ON bids(auction_id, user_id);
@@ -0,0 +1,25 @@
+-- Миграция 008: Денормализованные счётчики ставок в auctions
+-- Карточка аукциона и просмотр товара больше не обращаются к таблице bids
+
+ALTER TABLE auctions
+    ADD COLUMN IF NOT EXISTS bids_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE auctions
+    ADD COLUMN IF NOT EXISTS top_bid_amount INTEGER;
+ALTER TABLE auctions
+    ADD COLUMN IF NOT EXISTS top_bidder_id BIGINT REFERENCES users(id) ON DELETE SET NULL;
+
+-- Заполняем счётчики по существующим ставкам
+UPDATE auctions a
+SET bids_count = s.bids_count,
+    top_bid_amount = s.top_bid_amount,
+    top_bidder_id = s.top_bidder_id
+FROM (
+    SELECT DISTINCT ON (auction_id)
+        auction_id,
+        COUNT(*) OVER (PARTITION BY auction_id) AS bids_count,
+        amount AS top_bid_amount,
+        user_id AS top_bidder_id
+    FROM bids
+    ORDER BY auction_id, amount DESC, created_at ASC
+) s
+WHERE a.id = s.auction_id;
@@ -0,0 +1,45 @@
+-- Миграция 009: События NOTIFY для фоновых задач бота
+-- Бот слушает каналы auction_started, auction_extended и moderation_enqueued
+-- (services.pg_events) и сразу будит нужный обработчик вместо опроса таблиц.
+-- Триггеры срабатывают на любой путь записи: ставку одним запросом,
+-- пакетную запись движка ставок, запуск аукциона и постановку на модерацию.
+-- Уведомление доставляется слушателям только после COMMIT.
+
+CREATE OR REPLACE FUNCTION notify_auction_event() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status = 'active' AND NEW.ends_at IS NOT NULL THEN
+        IF TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status THEN
+            PERFORM pg_notify(
+                'auction_started',
+                json_build_object('auction_id', NEW.id, 'ends_at', extract(epoch FROM NEW.ends_at))::text
+            );
+        ELSIF OLD.ends_at IS DISTINCT FROM NEW.ends_at THEN
+            PERFORM pg_notify(
+                'auction_extended',
+                json_build_object('auction_id', NEW.id, 'ends_at', extract(epoch FROM NEW.ends_at))::text
+            );
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_auctions_notify ON auctions;
+CREATE TRIGGER trg_auctions_notify
+    AFTER INSERT OR UPDATE OF status, ends_at ON auctions
+    FOR EACH ROW EXECUTE FUNCTION notify_auction_event();
+
+CREATE OR REPLACE FUNCTION notify_moderation_enqueued() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'moderation_enqueued',
+        json_build_object('moderation_id', NEW.id, 'product_id', NEW.product_id)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_moderation_queue_notify ON moderation_queue;
+CREATE TRIGGER trg_moderation_queue_notify
+    AFTER INSERT ON moderation_queue
+    FOR EACH ROW EXECUTE FUNCTION notify_moderation_enqueued();
@@ -0,0 +1,18 @@
+-- Миграция 010: Хранилище FSM в Postgres
+-- Состояния диалогов (публикация, ставка, оплата) общие для всех процессов бота
+-- и переживают перезапуск. Включается настройкой FSM_STORAGE=postgres.
+
+CREATE TABLE IF NOT EXISTS fsm_states (
+    bot_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    thread_id BIGINT NOT NULL DEFAULT 0,
+    destiny VARCHAR(100) NOT NULL DEFAULT 'default',
+    state VARCHAR(255),
+    data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, destiny)
+);
+
+-- Индекс для удаления устаревших состояний
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at);
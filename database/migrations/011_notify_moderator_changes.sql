@@ -0,0 +1,20 @@
+-- Миграция 011: Событие NOTIFY при смене роли модератора
+-- Реестр ролей (services.roles) держит модераторов в памяти процесса;
+-- канал moderator_changed сообщает об изменении всем процессам бота.
+
+CREATE OR REPLACE FUNCTION notify_moderator_changed() RETURNS trigger AS $$
+BEGIN
+    IF OLD.is_moderator IS DISTINCT FROM NEW.is_moderator THEN
+        PERFORM pg_notify(
+            'moderator_changed',
+            json_build_object('telegram_id', NEW.telegram_id, 'is_moderator', NEW.is_moderator)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_moderator_notify ON users;
+CREATE TRIGGER trg_users_moderator_notify
+    AFTER UPDATE OF is_moderator ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_moderator_changed();
@@ -0,0 +1,8 @@
+-- Миграция 012: Индекс для постраничного просмотра очереди модерации
+-- Страницы читаются по ключу (created_at, id) только среди заявок в статусе
+-- pending (services.moderation.get_pending_moderation_page); частичный
+-- индекс остаётся маленьким и обслуживает и страницу, и подсчёт заявок.
+
+CREATE INDEX IF NOT EXISTS idx_moderation_queue_pending_created_at_id
+    ON moderation_queue(created_at, id)
+    WHERE status = 'pending';
@@ -0,0 +1,18 @@
+-- Миграция 013: Статус expired для обычных продаж
+-- Планировщик переводит истекшие продажи из active в expired тем же запросом,
+-- которым их находит (services.sale.expire_due_sales), поэтому каждая продажа
+-- обрабатывается один раз, а не каждую минуту.
+
+ALTER TABLE regular_sales DROP CONSTRAINT IF EXISTS regular_sales_status_check;
+ALTER TABLE regular_sales ADD CONSTRAINT regular_sales_status_check
+    CHECK (status IN ('pending', 'active', 'sold', 'cancelled', 'expired'));
+
+-- Продажи, которые уже истекли до миграции, больше не трогаем
+UPDATE regular_sales
+SET status = 'expired'
+WHERE status = 'active' AND expires_at <= NOW();
+
+-- Поиск истекающих продаж смотрит только на активные
+CREATE INDEX IF NOT EXISTS idx_regular_sales_active_expires_at
+    ON regular_sales(expires_at)
+    WHERE status = 'active';
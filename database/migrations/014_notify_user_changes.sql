@@ -0,0 +1,25 @@
+-- Миграция 014: Событие NOTIFY при изменении пользователя
+-- Снимки пользователей кэшируются в памяти процесса (services.user);
+-- канал user_changed сообщает всем процессам бота, чей снимок устарел.
+-- Имя и username не отслеживаются: get_or_create_user сверяет их
+-- с каждым обновлением Telegram и сам обновляет снимок.
+
+CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+BEGIN
+    IF (OLD.phone, OLD.contact_info, OLD.publication_credits, OLD.is_moderator, OLD.is_active)
+        IS DISTINCT FROM
+        (NEW.phone, NEW.contact_info, NEW.publication_credits, NEW.is_moderator, NEW.is_active)
+    THEN
+        PERFORM pg_notify(
+            'user_changed',
+            json_build_object('telegram_id', NEW.telegram_id)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_changed_notify ON users;
+CREATE TRIGGER trg_users_changed_notify
+    AFTER UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_changed();
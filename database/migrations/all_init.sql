@@ -188,3 +188,194 @@ ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP WITH TIME ZONE;
 CREATE INDEX IF NOT EXISTS idx_regular_sales_expires_at ON regular_sales(expires_at) WHERE expires_at IS NOT NULL;
 
 
+
+
+-- ============================
+-- 007_unique_bid_per_user.sql
+-- ============================
+
+-- Миграция 007: Одна строка ставки на пользователя в аукционе
+CREATE UNIQUE INDEX IF NOT EXISTS uq_bids_auction_user ON bids(auction_id, user_id);
+
+
+-- ============================
+-- 008_add_auction_bid_counters.sql
+-- ============================
+
+-- Миграция 008: Денормализованные счётчики ставок в auctions
+ALTER TABLE auctions
+    ADD COLUMN IF NOT EXISTS bids_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE auctions
+    ADD COLUMN IF NOT EXISTS top_bid_amount INTEGER;
+ALTER TABLE auctions
+    ADD COLUMN IF NOT EXISTS top_bidder_id BIGINT REFERENCES users(id) ON DELETE SET NULL;
+
+
+-- ============================
+-- 009_pg_notify_events.sql
+-- ============================
+
+-- Миграция 009: События NOTIFY для фоновых задач бота
+-- Бот слушает каналы auction_started, auction_extended и moderation_enqueued
+-- (services.pg_events) и сразу будит нужный обработчик вместо опроса таблиц.
+-- Триггеры срабатывают на любой путь записи: ставку одним запросом,
+-- пакетную запись движка ставок, запуск аукциона и постановку на модерацию.
+-- Уведомление доставляется слушателям только после COMMIT.
+
+CREATE OR REPLACE FUNCTION notify_auction_event() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status = 'active' AND NEW.ends_at IS NOT NULL THEN
+        IF TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status THEN
+            PERFORM pg_notify(
+                'auction_started',
+                json_build_object('auction_id', NEW.id, 'ends_at', extract(epoch FROM NEW.ends_at))::text
+            );
+        ELSIF OLD.ends_at IS DISTINCT FROM NEW.ends_at THEN
+            PERFORM pg_notify(
+                'auction_extended',
+                json_build_object('auction_id', NEW.id, 'ends_at', extract(epoch FROM NEW.ends_at))::text
+            );
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_auctions_notify ON auctions;
+CREATE TRIGGER trg_auctions_notify
+    AFTER INSERT OR UPDATE OF status, ends_at ON auctions
+    FOR EACH ROW EXECUTE FUNCTION notify_auction_event();
+
+CREATE OR REPLACE FUNCTION notify_moderation_enqueued() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'moderation_enqueued',
+        json_build_object('moderation_id', NEW.id, 'product_id', NEW.product_id)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_moderation_queue_notify ON moderation_queue;
+CREATE TRIGGER trg_moderation_queue_notify
+    AFTER INSERT ON moderation_queue
+    FOR EACH ROW EXECUTE FUNCTION notify_moderation_enqueued();
+
+
+-- ============================
+-- 010_create_fsm_states.sql
+-- ============================
+
+-- Миграция 010: Хранилище FSM в Postgres
+-- Состояния диалогов (публикация, ставка, оплата) общие для всех процессов бота
+-- и переживают перезапуск. Включается настройкой FSM_STORAGE=postgres.
+
+CREATE TABLE IF NOT EXISTS fsm_states (
+    bot_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    thread_id BIGINT NOT NULL DEFAULT 0,
+    destiny VARCHAR(100) NOT NULL DEFAULT 'default',
+    state VARCHAR(255),
+    data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, destiny)
+);
+
+-- Индекс для удаления устаревших состояний
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at);
+
+
+-- ============================
+-- 011_notify_moderator_changes.sql
+-- ============================
+
+-- Миграция 011: Событие NOTIFY при смене роли модератора
+-- Реестр ролей (services.roles) держит модераторов в памяти процесса;
+-- канал moderator_changed сообщает об изменении всем процессам бота.
+
+CREATE OR REPLACE FUNCTION notify_moderator_changed() RETURNS trigger AS $$
+BEGIN
+    IF OLD.is_moderator IS DISTINCT FROM NEW.is_moderator THEN
+        PERFORM pg_notify(
+            'moderator_changed',
+            json_build_object('telegram_id', NEW.telegram_id, 'is_moderator', NEW.is_moderator)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_moderator_notify ON users;
+CREATE TRIGGER trg_users_moderator_notify
+    AFTER UPDATE OF is_moderator ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_moderator_changed();
+
+
+-- ============================
+-- 012_moderation_queue_pending_index.sql
+-- ============================
+
+-- Миграция 012: Индекс для постраничного просмотра очереди модерации
+-- Страницы читаются по ключу (created_at, id) только среди заявок в статусе
+-- pending (services.moderation.get_pending_moderation_page); частичный
+-- индекс остаётся маленьким и обслуживает и страницу, и подсчёт заявок.
+
+CREATE INDEX IF NOT EXISTS idx_moderation_queue_pending_created_at_id
+    ON moderation_queue(created_at, id)
+    WHERE status = 'pending';
+
+
+-- ============================
+-- 013_regular_sales_expired_status.sql
+-- ============================
+
+-- Миграция 013: Статус expired для обычных продаж
+-- Планировщик переводит истекшие продажи из active в expired тем же запросом,
+-- которым их находит (services.sale.expire_due_sales), поэтому каждая продажа
+-- обрабатывается один раз, а не каждую минуту.
+
+ALTER TABLE regular_sales DROP CONSTRAINT IF EXISTS regular_sales_status_check;
+ALTER TABLE regular_sales ADD CONSTRAINT regular_sales_status_check
+    CHECK (status IN ('pending', 'active', 'sold', 'cancelled', 'expired'));
+
+-- Продажи, которые уже истекли до миграции, больше не трогаем
+UPDATE regular_sales
+SET status = 'expired'
+WHERE status = 'active' AND expires_at <= NOW();
+
+-- Поиск истекающих продаж смотрит только на активные
+CREATE INDEX IF NOT EXISTS idx_regular_sales_active_expires_at
+    ON regular_sales(expires_at)
+    WHERE status = 'active';
+
+
+-- ============================
+-- 014_notify_user_changes.sql
+-- ============================
+
+-- Миграция 014: Событие NOTIFY при изменении пользователя
+-- Снимки пользователей кэшируются в памяти процесса (services.user);
+-- канал user_changed сообщает всем процессам бота, чей снимок устарел.
+-- Имя и username не отслеживаются: get_or_create_user сверяет их
+-- с каждым обновлением Telegram и сам обновляет снимок.
+
+CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+BEGIN
+    IF (OLD.phone, OLD.contact_info, OLD.publication_credits, OLD.is_moderator, OLD.is_active)
+        IS DISTINCT FROM
+        (NEW.phone, NEW.contact_info, NEW.publication_credits, NEW.is_moderator, NEW.is_active)
+    THEN
+        PERFORM pg_notify(
+            'user_changed',
+            json_build_object('telegram_id', NEW.telegram_id)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_changed_notify ON users;
+CREATE TRIGGER trg_users_changed_notify
+    AFTER UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_changed();
@@ -7,6 +7,7 @@ from .bid import Bid
 from .payment import Payment
 from .moderation import ModerationQueue
 from .sale_interest import SaleInterest
+from .fsm_state import FsmState
 
 __all__ = [
     "User",
@@ -17,5 +18,6 @@ __all__ = [
     "Payment",
     "ModerationQueue",
     "SaleInterest",
+    "FsmState",
 ]
 
@@ -28,10 +28,15 @@ class Auction(Base):
     ends_at = Column(DateTime(timezone=True), nullable=True, index=True)
     finished_at = Column(DateTime(timezone=True), nullable=True)
     channel_message_id = Column(BigInteger, nullable=True)  # ID сообщения в канале
+    # Денормализованные данные о ставках (обновляются тем же запросом, что принимает ставку)
+    bids_count = Column(Integer, default=0, nullable=False)  # Кол-во ставок
+    top_bid_amount = Column(Integer, nullable=True)  # Топовая ставка
+    top_bidder_id = Column(BigInteger, ForeignKey("users.id"), nullable=True)  # Лидер аукциона
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Связи
     product = relationship("Product", back_populates="auction")
     winner = relationship("User", foreign_keys=[winner_id])
+    top_bidder = relationship("User", foreign_keys=[top_bidder_id])
     bids = relationship("Bid", back_populates="auction", order_by="Bid.created_at.desc()")
 
@@ -1,5 +1,5 @@
 """Модель ставки"""
-from sqlalchemy import Column, BigInteger, Integer, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, BigInteger, Integer, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database.connection import Base
@@ -16,6 +16,11 @@ class Bid(Base):
     is_winning = Column(Boolean, default=False, nullable=False)  # Является ли выигрышной
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     
+    # Одна ставка на пользователя в аукционе - повторная ставка поднимает сумму
+    __table_args__ = (
+        Index("uq_bids_auction_user", "auction_id", "user_id", unique=True),
+    )
+    
     # Связи
     auction = relationship("Auction", back_populates="bids")
     user = relationship("User", backref="bids")
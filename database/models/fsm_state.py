@@ -0,0 +1,24 @@
+"""Модель состояния FSM"""
+from sqlalchemy import Column, BigInteger, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from database.connection import Base
+
+
+class FsmState(Base):
+    """Состояние и данные FSM пользователя (общие для всех процессов бота)"""
+    __tablename__ = "fsm_states"
+    
+    bot_id = Column(BigInteger, primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    thread_id = Column(BigInteger, primary_key=True, default=0)  # 0 - без темы
+    destiny = Column(String(100), primary_key=True, default="default")
+    state = Column(String(255), nullable=True)
+    data = Column(JSONB, nullable=False, server_default="{}")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    # Для удаления устаревших записей
+    __table_args__ = (
+        Index("idx_fsm_states_updated_at", "updated_at"),
+    )
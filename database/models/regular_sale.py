@@ -12,6 +12,7 @@ class SaleStatus(str, enum.Enum):
     ACTIVE = "active"  # Активна
     SOLD = "sold"  # Продана
     CANCELLED = "cancelled"  # Отменена
+    EXPIRED = "expired"  # Истёк срок публикации
 
 
 class RegularSale(Base):
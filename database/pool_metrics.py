@@ -0,0 +1,97 @@
+"""Пул соединений с метриками ожидания"""
+import bisect
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Счётчики пула: сколько ждали соединение и сколько раз не дождались.
+
+    Время ожидания собирается в гистограмму с накопительными корзинами,
+    как в Prometheus; занятые соединения берутся из самого пула.
+    """
+
+    # Верхние границы корзин гистограммы ожидания (сек)
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        # Последний элемент - ожидания длиннее последней границы
+        self._bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self._pool: AsyncAdaptedQueuePool | None = None
+
+    def bind(self, pool: AsyncAdaptedQueuePool):
+        """Запомнить пул, из которого читаются текущие размеры"""
+        self._pool = pool
+
+    def observe(self, wait: float):
+        self.checkouts += 1
+        self.wait_sum += wait
+        self.wait_max = max(self.wait_max, wait)
+        self._bucket_counts[bisect.bisect_left(self.BUCKETS, wait)] += 1
+
+    def observe_timeout(self, wait: float):
+        self.timeouts += 1
+        self.wait_max = max(self.wait_max, wait)
+
+    def histogram(self) -> list[tuple[float, int]]:
+        """Накопительная гистограмма [(граница, количество)], последняя граница - inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.BUCKETS + (float("inf"),), self._bucket_counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self) -> dict:
+        """Текущее состояние пула и накопленные счётчики"""
+        pool = self._pool
+        return {
+            "size": pool.size() if pool else 0,
+            "checked_out": pool.checkedout() if pool else 0,
+            "overflow": pool.overflow() if pool else 0,
+            "checked_in": pool.checkedin() if pool else 0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_sum": self.wait_sum,
+            "wait_max": self.wait_max,
+            "wait_avg": self.wait_sum / self.checkouts if self.checkouts else 0.0,
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool, замеряющий время получения соединения.
+
+    В замер входит ожидание свободного соединения, открытие нового, если
+    пул ещё не заполнен, и pre-ping. Таймауты пула считаются отдельно.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_metrics.bind(self)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_metrics.observe_timeout(time.perf_counter() - started)
+            logger.warning(f"Нет свободного соединения в пуле БД: {self.status()}")
+            raise
+        pool_metrics.observe(time.perf_counter() - started)
+        return connection
+
+
+def get_pool_metrics() -> PoolMetrics:
+    """Метрики пула соединений движка database.connection.engine"""
+    return pool_metrics
@@ -1,12 +1,37 @@
 """Сервис для работы с аукционами"""
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func, literal, literal_column, true, case, BigInteger, Boolean, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from database.models.auction import Auction, AuctionStatus
 from database.models.bid import Bid
 from database.models.product import Product
+from database.models.user import User
+from services.deadlines import arm_auction_deadline
 from config import settings
 
+# Шаги быстрых ставок (кнопки "+ 50 000" и "+ 100 000")
+QUICK_BID_INCREMENTS = (50_000, 100_000)
+
+# Причины отказа в ставке
+REASON_NOT_ACTIVE = "Аукцион не найден или не активен"
+REASON_TOO_LOW = "Ставка должна быть выше текущей цены"
+
+
+@dataclass(frozen=True)
+class BidOutcome:
+    """Результат ставки и состояние аукциона после неё"""
+    accepted: bool
+    auction_id: int
+    status: str | None = None
+    current_price: int | None = None
+    ends_at: datetime | None = None
+    bid_id: int | None = None
+    reason: str | None = None  # Причина отказа, если ставка не принята
+    product_title: str | None = None
+    seller_telegram_id: int | None = None
+
 
 async def create_auction(
     session: AsyncSession,
@@ -47,6 +72,7 @@ async def start_auction(
         )
     )
     await session.commit()
+    arm_auction_deadline(auction_id, ends_at)
     
     result = await session.execute(
         select(Auction).where(Auction.id == auction_id)
@@ -54,76 +80,179 @@ async def start_auction(
     return result.scalar_one()
 
 
-async def place_bid(
+async def try_place_bid(
     session: AsyncSession,
     auction_id: int,
     user_id: int,
-    amount: int
-) -> Bid:
-    """Сделать ставку"""
-    # Проверяем, что аукцион активен
-    result = await session.execute(
-        select(Auction).where(
-            Auction.id == auction_id,
-            Auction.status == AuctionStatus.ACTIVE.value
-        )
-    )
-    auction = result.scalar_one_or_none()
-    
-    if not auction:
-        raise ValueError("Аукцион не найден или не активен")
+    amount: int | None = None,
+    increment: int | None = None
+) -> BidOutcome:
+    """Сделать ставку одним атомарным запросом и вернуть результат.
+
+    Сумма задаётся либо явно (amount), либо приращением к текущей цене
+    (increment) - тогда она вычисляется в том же запросе, без гонки.
+    """
+    from services.bid_engine import get_bid_engine
     
-    if amount <= auction.current_price:
-        raise ValueError("Ставка должна быть выше текущей цены")
+    if (amount is None) == (increment is None):
+        raise ValueError("Нужно указать либо сумму ставки, либо приращение")
     
-    # Проверяем, есть ли уже ставка от этого пользователя
-    result = await session.execute(
-        select(Bid).where(
-            Bid.auction_id == auction_id,
-            Bid.user_id == user_id
-        ).order_by(Bid.amount.desc())
-    )
-    existing_bid = result.scalar_one_or_none()
-    
-    if existing_bid:
-        # Если новая ставка выше предыдущей, обновляем существующую
-        if amount > existing_bid.amount:
-            await session.execute(
-                update(Bid)
-                .where(Bid.id == existing_bid.id)
-                .values(amount=amount)
-            )
-            bid = existing_bid
-            bid.amount = amount
-        else:
-            # Если новая ставка не выше, выбрасываем ошибку
-            raise ValueError(f"Ваша новая ставка должна быть выше вашей предыдущей ставки ({existing_bid.amount:,} сум)")
-    else:
-        # Создаем новую ставку
-        bid = Bid(
-            auction_id=auction_id,
-            user_id=user_id,
-            amount=amount
-        )
-        session.add(bid)
+    bid_engine = get_bid_engine()
+    if bid_engine is not None:
+        outcome = await bid_engine.place_bid(auction_id, user_id, amount, increment)
+        if outcome.accepted:
+            arm_auction_deadline(auction_id, outcome.ends_at)
+        return outcome
     
-    # Обновляем текущую цену аукциона и продлеваем время завершения на 2 часа от текущего момента
+    # Продлеваем время завершения на AUCTION_DURATION_HOURS от текущего момента
     # Используем timezone-aware datetime с явным указанием UTC
     now = datetime.now(timezone.utc)
     new_ends_at = now + timedelta(hours=settings.AUCTION_DURATION_HOURS)
     
-    await session.execute(
+    conditions = [
+        Auction.id == auction_id,
+        Auction.status == AuctionStatus.ACTIVE.value
+    ]
+    if increment is not None:
+        new_price = Auction.current_price + increment
+    else:
+        new_price = literal(amount, Integer)
+    conditions.append(Auction.current_price < new_price)
+    
+    # Блокируем строку аукциона, если ставка проходит: конкурентные ставки
+    # выстраиваются в очередь, и после снятия блокировки условие и новая цена
+    # вычисляются заново по последней версии строки
+    locked = (
+        select(Auction.id, new_price.label("price"))
+        .where(*conditions)
+        .with_for_update()
+        .cte("locked")
+    )
+    
+    # Одна строка ставки на пользователя: вставляем или поднимаем сумму.
+    # Вставка это или обновление, решает сам upsert по зафиксированным строкам -
+    # в отличие от EXISTS по снимку запроса, который не видит ставку двойного
+    # нажатия того же пользователя, закоммиченную, пока мы ждали блокировку
+    insert_bid = pg_insert(Bid).from_select(
+        ["auction_id", "user_id", "amount"],
+        select(
+            locked.c.id,
+            literal(user_id, BigInteger),
+            locked.c.price
+        )
+    )
+    upserted = (
+        insert_bid
+        .on_conflict_do_update(
+            index_elements=[Bid.auction_id, Bid.user_id],
+            set_={"amount": insert_bid.excluded.amount}
+        )
+        .returning(
+            Bid.id,
+            Bid.auction_id,
+            Bid.amount,
+            literal_column("(xmax = 0)", Boolean).label("inserted")
+        )
+        .cte("upserted")
+    )
+    
+    # Аукцион обновляется один раз и от результата upsert: первая ставка
+    # пользователя увеличивает счётчик, повторная только поднимает сумму
+    bumped = (
         update(Auction)
-        .where(Auction.id == auction_id)
+        .where(Auction.id == upserted.c.auction_id)
         .values(
-            current_price=amount,
-            ends_at=new_ends_at
+            current_price=upserted.c.amount,
+            ends_at=new_ends_at,
+            bids_count=Auction.bids_count + case((upserted.c.inserted, 1), else_=0),
+            top_bid_amount=upserted.c.amount,
+            top_bidder_id=user_id
         )
+        .returning(Auction.id, Auction.current_price, Auction.ends_at)
+        .cte("bumped")
     )
     
+    # Товар и продавец нужны для уведомлений - берём их тем же запросом
+    result = await session.execute(
+        select(
+            Auction.status,
+            func.coalesce(bumped.c.current_price, Auction.current_price).label("current_price"),
+            func.coalesce(bumped.c.ends_at, Auction.ends_at).label("ends_at"),
+            bumped.c.id.label("bumped_id"),
+            upserted.c.id.label("bid_id"),
+            Product.title.label("product_title"),
+            User.telegram_id.label("seller_telegram_id")
+        )
+        .select_from(Auction)
+        .join(Product, Product.id == Auction.product_id)
+        .join(User, User.id == Product.user_id)
+        .outerjoin(bumped, bumped.c.id == Auction.id)
+        .outerjoin(upserted, true())
+        .where(Auction.id == auction_id)
+    )
+    row = result.first()
+    
+    if row is None:
+        await session.commit()
+        return BidOutcome(
+            accepted=False,
+            auction_id=auction_id,
+            reason=REASON_NOT_ACTIVE
+        )
+    
+    if row.bumped_id is None:
+        # Внешний SELECT видит снимок до ожидания блокировки строки, поэтому
+        # при отказе перечитываем аукцион: новый запрос видит конкурентную ставку,
+        # из-за которой наша не прошла
+        result = await session.execute(
+            select(Auction.status, Auction.current_price, Auction.ends_at)
+            .where(Auction.id == auction_id)
+        )
+        current = result.one()
+        await session.commit()
+        if current.status != AuctionStatus.ACTIVE.value:
+            reason = REASON_NOT_ACTIVE
+        else:
+            reason = REASON_TOO_LOW
+        return BidOutcome(
+            accepted=False,
+            auction_id=auction_id,
+            status=current.status,
+            current_price=current.current_price,
+            ends_at=current.ends_at,
+            reason=reason,
+            product_title=row.product_title,
+            seller_telegram_id=row.seller_telegram_id
+        )
+    
     await session.commit()
-    await session.refresh(bid)
-    return bid
+    
+    # Ставка продлила аукцион - переносим таймер завершения
+    arm_auction_deadline(auction_id, row.ends_at)
+    
+    return BidOutcome(
+        accepted=True,
+        auction_id=auction_id,
+        status=row.status,
+        current_price=row.current_price,
+        ends_at=row.ends_at,
+        bid_id=row.bid_id,
+        product_title=row.product_title,
+        seller_telegram_id=row.seller_telegram_id
+    )
+
+
+async def place_bid(
+    session: AsyncSession,
+    auction_id: int,
+    user_id: int,
+    amount: int
+) -> BidOutcome:
+    """Сделать ставку (ValueError, если ставка не принята)"""
+    outcome = await try_place_bid(session, auction_id, user_id, amount)
+    if not outcome.accepted:
+        raise ValueError(outcome.reason)
+    return outcome
 
 
 async def finish_auction(
@@ -177,6 +306,100 @@ async def finish_auction(
     return result.scalar_one()
 
 
+@dataclass(frozen=True)
+class FinishedAuction:
+    """Аукцион, завершённый пакетным запросом"""
+    auction_id: int
+    winner_id: int | None
+    final_price: int
+    channel_message_id: int | None
+    winning_bid_id: int | None
+
+
+async def finish_expired_auctions(
+    session: AsyncSession,
+    now: datetime,
+    limit: int
+) -> list[FinishedAuction]:
+    """Завершить до limit истекших аукционов одним запросом.
+
+    Победитель каждого аукциона выбирается через DISTINCT ON по bids
+    (максимальная сумма, при равенстве - более ранняя ставка), в том же
+    запросе проставляются winner_id, finished_at и is_winning.
+    SKIP LOCKED не даёт двум процессам завершить один аукцион дважды.
+    """
+    due = (
+        select(Auction.id)
+        .where(
+            Auction.status == AuctionStatus.ACTIVE.value,
+            Auction.ends_at <= now
+        )
+        .order_by(Auction.ends_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    winners = (
+        select(Bid.id, Bid.auction_id, Bid.user_id)
+        .where(Bid.auction_id.in_(select(due.c.id)))
+        .order_by(Bid.auction_id, Bid.amount.desc(), Bid.created_at.asc())
+        .distinct(Bid.auction_id)
+        .cte("winners")
+    )
+    finished = (
+        update(Auction)
+        .where(Auction.id.in_(select(due.c.id)))
+        .values(
+            status=AuctionStatus.FINISHED.value,
+            winner_id=(
+                select(winners.c.user_id)
+                .where(winners.c.auction_id == Auction.id)
+                .scalar_subquery()
+            ),
+            finished_at=now
+        )
+        .returning(
+            Auction.id,
+            Auction.winner_id,
+            Auction.current_price,
+            Auction.channel_message_id
+        )
+        .cte("finished")
+    )
+    marked = (
+        update(Bid)
+        .where(Bid.id.in_(select(winners.c.id)))
+        .values(is_winning=True)
+        .returning(Bid.id, Bid.auction_id)
+        .cte("marked")
+    )
+    
+    result = await session.execute(
+        select(
+            finished.c.id,
+            finished.c.winner_id,
+            finished.c.current_price,
+            finished.c.channel_message_id,
+            marked.c.id.label("winning_bid_id")
+        )
+        .select_from(finished)
+        .outerjoin(marked, marked.c.auction_id == finished.c.id)
+    )
+    rows = result.all()
+    await session.commit()
+    
+    return [
+        FinishedAuction(
+            auction_id=row.id,
+            winner_id=row.winner_id,
+            final_price=row.current_price,
+            channel_message_id=row.channel_message_id,
+            winning_bid_id=row.winning_bid_id
+        )
+        for row in rows
+    ]
+
+
 async def get_active_auctions(session: AsyncSession) -> list[Auction]:
     """Получить активные аукционы"""
     result = await session.execute(
@@ -0,0 +1,434 @@
+"""Движок ставок в памяти: один актор на активный аукцион и пакетная запись в БД"""
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, func, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database.connection import async_session_maker
+from database.models.auction import Auction, AuctionStatus
+from database.models.bid import Bid
+from database.models.product import Product
+from database.models.user import User
+from services.auction import BidOutcome, REASON_NOT_ACTIVE, REASON_TOO_LOW
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _AuctionState:
+    """Авторитетное состояние аукциона в памяти"""
+    auction_id: int
+    status: str | None  # None - аукцион не найден
+    current_price: int = 0
+    ends_at: datetime | None = None
+    leader_id: int | None = None  # users.id лидера
+    bidders: set[int] = field(default_factory=set)  # users.id всех, кто делал ставки
+    product_title: str | None = None
+    seller_telegram_id: int | None = None
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """Привести время из БД к timezone-aware UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class _AuctionActor:
+    """Актор аукциона: принимает ставки строго по очереди"""
+
+    def __init__(self, engine: "BidEngine", auction_id: int, state: _AuctionState | None = None):
+        self.auction_id = auction_id
+        self.state = state
+        self._engine = engine
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, user_id: int, amount: int | None, increment: int | None) -> BidOutcome:
+        """Поставить ставку в очередь актора и дождаться решения"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((user_id, amount, increment, future))
+        return await future
+
+    def stop(self, successor: "_AuctionActor | None" = None):
+        """Остановить актор.
+
+        Ставки, ещё ждущие в очереди, переходят к successor (новому актору
+        того же аукциона), а без него отклоняются - иначе submit() не вернётся.
+        """
+        self._task.cancel()
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            future = item[-1]
+            if future.done():
+                continue
+            if successor is not None:
+                successor._queue.put_nowait(item)
+            else:
+                future.set_result(BidOutcome(
+                    accepted=False,
+                    auction_id=self.auction_id,
+                    status=self.state.status if self.state is not None else None,
+                    reason=REASON_NOT_ACTIVE
+                ))
+
+    async def _run(self):
+        if self.state is None:
+            try:
+                self.state = await self._engine._load_state(self.auction_id)
+            except Exception as e:
+                logger.error(f"Не удалось загрузить аукцион {self.auction_id} в движок ставок: {e}")
+                self._engine._drop_actor(self)
+                while not self._queue.empty():
+                    *_, future = self._queue.get_nowait()
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        if self.state.status != AuctionStatus.ACTIVE.value:
+            # Неактивный аукцион не держим в памяти: после запуска он загрузится заново
+            self._engine._drop_actor(self)
+            while not self._queue.empty():
+                user_id, amount, increment, future = self._queue.get_nowait()
+                if not future.done():
+                    future.set_result(self._decide(user_id, amount, increment))
+            return
+
+        while True:
+            user_id, amount, increment, future = await self._queue.get()
+            if future.done():
+                continue
+            future.set_result(self._decide(user_id, amount, increment))
+
+    def _decide(self, user_id: int, amount: int | None, increment: int | None) -> BidOutcome:
+        """Принять или отклонить ставку (без await - атомарно для event loop)"""
+        state = self.state
+        now = datetime.now(timezone.utc)
+        if increment is not None:
+            amount = state.current_price + increment
+
+        if (
+            state.status != AuctionStatus.ACTIVE.value
+            or (state.ends_at is not None and state.ends_at <= now)
+        ):
+            return BidOutcome(
+                accepted=False,
+                auction_id=state.auction_id,
+                status=state.status,
+                current_price=state.current_price,
+                ends_at=state.ends_at,
+                reason=REASON_NOT_ACTIVE,
+                product_title=state.product_title,
+                seller_telegram_id=state.seller_telegram_id
+            )
+
+        if (increment is not None and increment <= 0) or amount <= state.current_price:
+            return BidOutcome(
+                accepted=False,
+                auction_id=state.auction_id,
+                status=state.status,
+                current_price=state.current_price,
+                ends_at=state.ends_at,
+                reason=REASON_TOO_LOW,
+                product_title=state.product_title,
+                seller_telegram_id=state.seller_telegram_id
+            )
+
+        state.current_price = amount
+        state.ends_at = now + timedelta(hours=settings.AUCTION_DURATION_HOURS)
+        state.leader_id = user_id
+        state.bidders.add(user_id)
+        self._engine._record(state, user_id, amount)
+
+        return BidOutcome(
+            accepted=True,
+            auction_id=state.auction_id,
+            status=state.status,
+            current_price=state.current_price,
+            ends_at=state.ends_at,
+            product_title=state.product_title,
+            seller_telegram_id=state.seller_telegram_id
+        )
+
+
+class BidEngine:
+    """Движок ставок: решения в памяти, запись принятых ставок в БД пакетами"""
+
+    def __init__(self, flush_interval: float, flush_batch: int):
+        self._flush_interval = flush_interval
+        self._flush_batch = flush_batch
+        self._actors: dict[int, _AuctionActor] = {}
+        # (auction_id, user_id) -> последняя принятая сумма
+        self._pending_bids: dict[tuple[int, int], int] = {}
+        # auction_id -> состояние, которое нужно записать в auctions
+        self._dirty: dict[int, _AuctionState] = {}
+        self._flush_wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher_task: asyncio.Task | None = None
+
+    async def start(self):
+        """Восстановить состояние из БД и запустить фоновую запись"""
+        await self.rebuild()
+        self._flusher_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Остановить фоновую запись, актеров и записать оставшиеся ставки"""
+        if self._flusher_task is not None:
+            # Под блокировкой цикл не находится внутри flush: отмена не потеряет пакет
+            async with self._flush_lock:
+                self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+
+        for actor in self._actors.values():
+            actor.stop()
+        self._actors = {}
+
+        await self.flush()
+
+    async def rebuild(self):
+        """Восстановить состояние активных аукционов из таблиц auctions/bids"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                self._state_query()
+                .where(Auction.status == AuctionStatus.ACTIVE.value)
+            )
+            states = {
+                row.id: _AuctionState(
+                    auction_id=row.id,
+                    status=row.status,
+                    current_price=row.current_price,
+                    ends_at=_as_utc(row.ends_at),
+                    product_title=row.title,
+                    seller_telegram_id=row.telegram_id
+                )
+                for row in result.all()
+            }
+
+            if states:
+                result = await session.execute(
+                    select(Bid.auction_id, Bid.user_id, Bid.amount)
+                    .where(Bid.auction_id.in_(list(states)))
+                    .order_by(Bid.auction_id, Bid.amount.asc())
+                )
+                for row in result.all():
+                    state = states[row.auction_id]
+                    state.bidders.add(row.user_id)
+                    # Сортировка по возрастанию: последний - лидер
+                    state.leader_id = row.user_id
+
+        old_actors = self._actors
+        self._actors = {
+            auction_id: _AuctionActor(self, auction_id, state)
+            for auction_id, state in states.items()
+        }
+        for auction_id, actor in old_actors.items():
+            actor.stop(successor=self._actors.get(auction_id))
+        logger.info(f"Движок ставок восстановлен: активных аукционов {len(states)}")
+
+    async def place_bid(
+        self,
+        auction_id: int,
+        user_id: int,
+        amount: int | None = None,
+        increment: int | None = None
+    ) -> BidOutcome:
+        """Сделать ставку через актор аукциона (суммой или приращением)"""
+        actor = self._actors.get(auction_id)
+        if actor is None:
+            actor = _AuctionActor(self, auction_id)
+            self._actors[auction_id] = actor
+        return await actor.submit(user_id, amount, increment)
+
+    def close_expired(self, now: datetime) -> list[int]:
+        """Закрыть приём ставок у аукционов, чьё время в памяти истекло"""
+        closed = []
+        for auction_id, actor in self._actors.items():
+            state = actor.state
+            if (
+                state is not None
+                and state.status == AuctionStatus.ACTIVE.value
+                and state.ends_at is not None
+                and state.ends_at <= now
+            ):
+                state.status = AuctionStatus.FINISHED.value
+                closed.append(auction_id)
+        return closed
+
+    def discard(self, auction_ids: list[int]):
+        """Выгрузить завершённые аукционы из памяти"""
+        for auction_id in auction_ids:
+            actor = self._actors.pop(auction_id, None)
+            if actor is not None:
+                actor.stop()
+
+    async def flush(self):
+        """Записать накопленные ставки в БД одним пакетом"""
+        async with self._flush_lock:
+            if not self._pending_bids and not self._dirty:
+                return
+
+            bids, self._pending_bids = self._pending_bids, {}
+            dirty, self._dirty = self._dirty, {}
+            auctions = [
+                {
+                    "b_id": state.auction_id,
+                    "b_price": state.current_price,
+                    "b_ends_at": state.ends_at,
+                    "b_bids_count": len(state.bidders),
+                    "b_leader_id": state.leader_id,
+                }
+                for state in dirty.values()
+            ]
+
+            try:
+                async with async_session_maker() as session:
+                    if bids:
+                        stmt = pg_insert(Bid).values([
+                            {"auction_id": auction_id, "user_id": user_id, "amount": amount}
+                            for (auction_id, user_id), amount in bids.items()
+                        ])
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=[Bid.auction_id, Bid.user_id],
+                            set_={"amount": func.greatest(Bid.amount, stmt.excluded.amount)}
+                        )
+                        await session.execute(stmt)
+
+                    if auctions:
+                        table = Auction.__table__
+                        await session.execute(
+                            update(table)
+                            .where(table.c.id == bindparam("b_id"))
+                            .values(
+                                current_price=func.greatest(table.c.current_price, bindparam("b_price")),
+                                ends_at=func.greatest(table.c.ends_at, bindparam("b_ends_at")),
+                                bids_count=bindparam("b_bids_count"),
+                                top_bid_amount=bindparam("b_price"),
+                                top_bidder_id=bindparam("b_leader_id")
+                            ),
+                            auctions
+                        )
+
+                    await session.commit()
+            except Exception:
+                # Возвращаем данные в очередь, не затирая более свежие
+                for key, amount in bids.items():
+                    self._pending_bids[key] = max(amount, self._pending_bids.get(key, 0))
+                for auction_id, state in dirty.items():
+                    self._dirty.setdefault(auction_id, state)
+                raise
+
+            logger.debug(f"Движок ставок: записано ставок {len(bids)}, аукционов {len(auctions)}")
+
+    async def _load_state(self, auction_id: int) -> _AuctionState:
+        """Загрузить состояние одного аукциона из БД"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                self._state_query().where(Auction.id == auction_id)
+            )
+            row = result.first()
+            if row is None:
+                return _AuctionState(auction_id=auction_id, status=None)
+
+            result = await session.execute(
+                select(Bid.user_id)
+                .where(Bid.auction_id == auction_id)
+                .order_by(Bid.amount.asc())
+            )
+            bidders = [user_id for (user_id,) in result.all()]
+
+        return _AuctionState(
+            auction_id=auction_id,
+            status=row.status,
+            current_price=row.current_price,
+            ends_at=_as_utc(row.ends_at),
+            leader_id=bidders[-1] if bidders else None,
+            bidders=set(bidders),
+            product_title=row.title,
+            seller_telegram_id=row.telegram_id
+        )
+
+    @staticmethod
+    def _state_query():
+        """Запрос состояния аукциона вместе с товаром и продавцом"""
+        return (
+            select(
+                Auction.id,
+                Auction.status,
+                Auction.current_price,
+                Auction.ends_at,
+                Product.title,
+                User.telegram_id
+            )
+            .join(Product, Product.id == Auction.product_id)
+            .join(User, User.id == Product.user_id)
+        )
+
+    def _record(self, state: _AuctionState, user_id: int, amount: int):
+        """Запомнить принятую ставку для фоновой записи"""
+        self._pending_bids[(state.auction_id, user_id)] = amount
+        self._dirty[state.auction_id] = state
+        if len(self._pending_bids) >= self._flush_batch:
+            self._flush_wakeup.set()
+
+    def _drop_actor(self, actor: _AuctionActor):
+        if self._actors.get(actor.auction_id) is actor:
+            del self._actors[actor.auction_id]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи ставок в БД: {e}")
+
+
+_bid_engine: BidEngine | None = None
+
+
+def get_bid_engine() -> BidEngine | None:
+    """Движок ставок в памяти (None, если включён режим database)"""
+    return _bid_engine
+
+
+async def start_bid_engine() -> BidEngine:
+    """Запустить движок ставок в памяти"""
+    global _bid_engine
+    engine = BidEngine(
+        flush_interval=settings.BID_ENGINE_FLUSH_INTERVAL,
+        flush_batch=settings.BID_ENGINE_FLUSH_BATCH
+    )
+    await engine.start()
+    _bid_engine = engine
+    logger.info("Движок ставок в памяти запущен")
+    return engine
+
+
+async def stop_bid_engine():
+    """Остановить движок ставок и дописать принятые ставки в БД"""
+    global _bid_engine
+    engine, _bid_engine = _bid_engine, None
+    if engine is None:
+        return
+    try:
+        await engine.stop()
+    except Exception as e:
+        logger.critical(
+            f"Движок ставок остановлен без записи в БД: потеряно ставок {len(engine._pending_bids)}, "
+            f"аукционов {len(engine._dirty)}: {e}"
+        )
+        return
+    logger.info("Движок ставок остановлен, принятые ставки записаны")
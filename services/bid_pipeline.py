@@ -0,0 +1,86 @@
+"""Побочные эффекты принятой ставки"""
+import asyncio
+import time
+from typing import Awaitable
+from aiogram import Bot
+from aiogram.types import ReplyKeyboardMarkup
+from services.auction import BidOutcome
+from services.card_updater import notify_auction_changed
+from services.telegram_queue import dispatch, Priority
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BidOutcomePipeline:
+    """Выполняет независимые действия после ставки параллельно.
+
+    Всё нужное (новая цена, товар, продавец) уже есть в BidOutcome,
+    поэтому повторных запросов в БД нет: подтверждение участнику,
+    уведомление продавца и обновление карточки в канале идут одновременно.
+    """
+
+    def __init__(self, bot: Bot):
+        self._bot = bot
+
+    async def run(
+        self,
+        outcome: BidOutcome,
+        bidder_chat_id: int,
+        confirm_text: str,
+        reply_markup: ReplyKeyboardMarkup | None = None,
+        acknowledge: Awaitable | None = None,
+    ) -> dict[str, float]:
+        """Запустить все стадии и вернуть их длительность в миллисекундах"""
+        stages = {
+            "card": self._update_card(outcome),
+            "confirm": dispatch(
+                bidder_chat_id,
+                lambda: self._bot.send_message(
+                    chat_id=bidder_chat_id,
+                    text=confirm_text,
+                    reply_markup=reply_markup
+                ),
+                Priority.HIGH
+            ),
+            "seller": self._notify_seller(outcome),
+        }
+        if acknowledge is not None:
+            # Ответ на callback, чтобы у кнопки пропали "часики"
+            stages["ack"] = acknowledge
+
+        results = await asyncio.gather(
+            *(self._timed(outcome.auction_id, name, stage) for name, stage in stages.items())
+        )
+        timings = dict(results)
+        logger.debug(
+            f"Ставка по аукциону {outcome.auction_id}: "
+            + ", ".join(f"{name}={elapsed:.1f}мс" for name, elapsed in timings.items())
+        )
+        return timings
+
+    async def _timed(self, auction_id: int, name: str, stage: Awaitable) -> tuple[str, float]:
+        started = time.perf_counter()
+        try:
+            await stage
+        except Exception as e:
+            logger.warning(f"Ставка по аукциону {auction_id}: стадия {name} завершилась ошибкой: {e!r}")
+        return name, (time.perf_counter() - started) * 1000
+
+    async def _update_card(self, outcome: BidOutcome):
+        # Правка поста в канале объединяется с соседними ставками в ChannelCardUpdater
+        notify_auction_changed(outcome.auction_id)
+
+    async def _notify_seller(self, outcome: BidOutcome):
+        if not outcome.seller_telegram_id:
+            return
+        text = (
+            "🔔 Новая ставка по вашему лоту!\n\n"
+            f"Товар: {outcome.product_title}\n"
+            f"Сумма ставки: {outcome.current_price:,} сум\n"
+            f"Текущая цена: {outcome.current_price:,} сум"
+        )
+        await dispatch(
+            outcome.seller_telegram_id,
+            lambda: self._bot.send_message(chat_id=outcome.seller_telegram_id, text=text)
+        )
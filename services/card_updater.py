@@ -0,0 +1,210 @@
+"""Объединение обновлений карточек аукционов в канале"""
+import asyncio
+import hashlib
+import time
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from sqlalchemy import select
+from database.connection import async_session_maker
+from database.models.auction import Auction, AuctionStatus
+from database.models.product import Product
+from services.channel import get_active_auction_cards, render_auction_status_text
+from services.telegram_queue import dispatch
+from bot.keyboards.auction import get_auction_channel_keyboard
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelCardUpdater:
+    """Редактирует пост аукциона в канале не чаще одного раза за интервал.
+
+    Сигналы "аукцион изменился" объединяются по посту: пока правка
+    запланирована, новые сигналы ничего не добавляют, а текст строится
+    в момент отправки - всегда по последнему состоянию.
+    """
+
+    def __init__(self, bot: Bot, interval: float):
+        self._bot = bot
+        self._interval = interval
+        # auction_id -> задача запланированной правки
+        self._scheduled: dict[int, asyncio.Task] = {}
+        # auction_id -> время последней правки (time.monotonic)
+        self._last_edit: dict[int, float] = {}
+        # auction_id -> хэш последнего отправленного текста с клавиатурой
+        self._last_hash: dict[int, str] = {}
+        self._refresh_task: asyncio.Task | None = None
+
+    def mark_changed(self, auction_id: int):
+        """Сообщить, что карточку аукциона нужно обновить"""
+        if auction_id in self._scheduled:
+            return
+        last_edit = self._last_edit.get(auction_id)
+        delay = 0.0
+        if last_edit is not None:
+            delay = max(0.0, last_edit + self._interval - time.monotonic())
+        self._scheduled[auction_id] = asyncio.create_task(self._edit_later(auction_id, delay))
+
+    async def _edit_later(self, auction_id: int, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Снимаем отметку до построения текста: изменения, пришедшие во время
+        # правки, запланируют ещё одну
+        self._scheduled.pop(auction_id, None)
+        self._last_edit[auction_id] = time.monotonic()
+        try:
+            await self._edit(auction_id)
+        except TelegramRetryAfter as e:
+            logger.warning(
+                f"Flood control при обновлении карточки аукциона {auction_id}, "
+                f"повтор через {e.retry_after} сек"
+            )
+            self._last_edit[auction_id] = time.monotonic() + e.retry_after
+            self.mark_changed(auction_id)
+        except Exception as e:
+            self._log_edit_error(auction_id, e)
+
+    async def refresh_all(self, window: float) -> int:
+        """Обновить карточки всех активных аукционов, равномерно за window секунд.
+
+        Все карточки загружаются одним запросом, карточки с тем же текстом
+        пропускаются. Возвращает количество запланированных правок.
+        """
+        loaded_at = time.monotonic()
+        async with async_session_maker() as session:
+            cards = await get_active_auction_cards(session)
+
+        active_ids = {auction.id for auction, _ in cards}
+        for auction_id in list(self._last_hash):
+            if auction_id not in active_ids and auction_id not in self._scheduled:
+                self._last_hash.pop(auction_id, None)
+                self._last_edit.pop(auction_id, None)
+
+        changed = [
+            (auction, product) for auction, product in cards
+            if self._last_hash.get(auction.id) != self._digest(
+                render_auction_status_text(auction, product), auction.status
+            )
+        ]
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if changed:
+            self._refresh_task = asyncio.create_task(
+                self._refresh_staggered(changed, window / len(changed), loaded_at)
+            )
+        logger.debug(f"Карточек аукционов: {len(cards)}, к обновлению: {len(changed)}")
+        return len(changed)
+
+    async def _refresh_staggered(
+        self,
+        cards: list[tuple[Auction, Product]],
+        step: float,
+        loaded_at: float
+    ):
+        for index, (auction, product) in enumerate(cards):
+            if index:
+                await asyncio.sleep(step)
+            # После загрузки карточку уже правили по ставке - наши данные старее
+            if auction.id in self._scheduled or self._last_edit.get(auction.id, 0.0) > loaded_at:
+                continue
+            self._last_edit[auction.id] = time.monotonic()
+            try:
+                await self._send_card(
+                    auction.id,
+                    auction.channel_message_id,
+                    auction.status,
+                    render_auction_status_text(auction, product)
+                )
+            except Exception as e:
+                self._log_edit_error(auction.id, e)
+
+    async def _edit(self, auction_id: int):
+        async with async_session_maker() as session:
+            # populate_existing: нужны актуальные цена, срок и счётчик ставок
+            result = await session.execute(
+                select(Auction, Product)
+                .join(Product, Product.id == Auction.product_id)
+                .where(Auction.id == auction_id)
+                .execution_options(populate_existing=True)
+            )
+            row = result.first()
+        if not row:
+            return
+        auction, product = row
+        if not auction.channel_message_id:
+            return
+
+        await self._send_card(
+            auction_id,
+            auction.channel_message_id,
+            auction.status,
+            render_auction_status_text(auction, product)
+        )
+
+    async def _send_card(self, auction_id: int, message_id: int, status: str, status_text: str):
+        """Отредактировать пост, если его текст или клавиатура изменились"""
+        digest = self._digest(status_text, status)
+        if self._last_hash.get(auction_id) == digest:
+            logger.debug(f"Карточка аукциона {auction_id} не изменилась")
+            return
+
+        # Кнопка участия только у активных аукционов
+        keyboard = None
+        if status == AuctionStatus.ACTIVE.value:
+            keyboard = get_auction_channel_keyboard(await self._get_bot_username(), auction_id)
+
+        await dispatch(
+            settings.CHANNEL_ID,
+            lambda: self._bot.edit_message_text(
+                chat_id=settings.CHANNEL_ID,
+                message_id=message_id,
+                text=status_text,
+                reply_markup=keyboard,
+                parse_mode="HTML",
+            )
+        )
+        self._last_hash[auction_id] = digest
+        logger.debug(f"Карточка аукциона {auction_id} обновлена")
+
+    @staticmethod
+    def _digest(status_text: str, status: str) -> str:
+        # Статус входит в хэш: от него зависит наличие кнопки
+        return hashlib.sha1(f"{status}\n{status_text}".encode()).hexdigest()
+
+    @staticmethod
+    def _log_edit_error(auction_id: int, error: Exception):
+        error_msg = str(error).lower()
+        if "message is not modified" in error_msg:
+            logger.debug(f"Карточка аукциона {auction_id} не изменилась")
+        else:
+            logger.warning(f"Не удалось обновить карточку аукциона {auction_id}: {error!r}")
+
+    async def _get_bot_username(self) -> str:
+        # Bot.me() запрашивает get_me один раз и дальше отдаёт кэш
+        bot_info = await self._bot.me()
+        return bot_info.username
+
+
+_card_updater: ChannelCardUpdater | None = None
+
+
+def notify_auction_changed(auction_id: int):
+    """Запланировать обновление карточки аукциона в канале"""
+    if _card_updater is None:
+        logger.debug(f"Обновление карточки аукциона {auction_id} пропущено: сервис не запущен")
+        return
+    _card_updater.mark_changed(auction_id)
+
+
+def get_card_updater() -> ChannelCardUpdater | None:
+    """Сервис обновления карточек (None, если не запущен)"""
+    return _card_updater
+
+
+def start_card_updater(bot: Bot) -> ChannelCardUpdater:
+    """Запустить сервис обновления карточек аукционов"""
+    global _card_updater
+    _card_updater = ChannelCardUpdater(bot, settings.CHANNEL_CARD_EDIT_INTERVAL)
+    logger.info("Сервис обновления карточек аукционов запущен")
+    return _card_updater
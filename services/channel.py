@@ -3,13 +3,14 @@ from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 from database.models.product import Product, ProductType
 from database.models.auction import Auction, AuctionStatus
 from database.models.regular_sale import RegularSale, SaleStatus
 from database.models.user import User
-from database.models.bid import Bid
+from database.connection import db_phase
 from services.auction import start_auction
+from services.telegram_queue import dispatch
 from datetime import datetime, timedelta, timezone
 from config import settings
 import json
@@ -72,32 +73,44 @@ async def get_auction_status_text(
     auction_id: int,
 ) -> str:
     """Построить ПОЛНЫЙ текст аукциона для канала (описание + статус)"""
+    # populate_existing: аукцион мог остаться в сессии с прошлого запроса,
+    # а нам нужны актуальные ends_at, current_price и bids_count
     result = await session.execute(
         select(Auction, Product, User)
         .join(Product, Product.id == Auction.product_id)
         .join(User, Product.user_id == User.id)
         .where(Auction.id == auction_id)
+        .execution_options(populate_existing=True)
     )
     data = result.first()
     if not data:
         return "Аукцион не найден"
     
     auction, product, user = data
-    
-    # Перезагружаем аукцион отдельным запросом для получения актуальных ends_at и current_price
-    # (данные из join могут быть устаревшими)
+    return render_auction_status_text(auction, product)
+
+
+async def get_active_auction_cards(session: AsyncSession) -> list[tuple[Auction, Product]]:
+    """Все активные аукционы с постом в канале вместе с товарами - одним запросом"""
     result = await session.execute(
-        select(Auction).where(Auction.id == auction_id)
+        select(Auction, Product)
+        .join(Product, Product.id == Auction.product_id)
+        .where(
+            Auction.status == AuctionStatus.ACTIVE.value,
+            Auction.channel_message_id.isnot(None)
+        )
+        .order_by(Auction.id)
     )
-    auction = result.scalar_one()
-    
+    return [(auction, product) for auction, product in result.all()]
+
+
+def render_auction_status_text(auction: Auction, product: Product) -> str:
+    """Текст поста аукциона по уже загруженным аукциону и товару"""
+    auction_id = auction.id
     desc_data = _parse_description_fields(product.description or "")
     
-    # Кол-во ставок
-    bids_result = await session.execute(
-        select(func.count(Bid.id)).where(Bid.auction_id == auction_id)
-    )
-    bids_count = bids_result.scalar_one() or 0
+    # Кол-во ставок хранится в самом аукционе
+    bids_count = auction.bids_count or 0
     
     # Проверяем статус аукциона
     is_finished = auction.status == AuctionStatus.FINISHED.value
@@ -208,14 +221,15 @@ async def publish_auction_to_channel(
     product_id: int
 ) -> int:
     """Опубликовать аукцион в канал"""
-    # Получаем товар и аукцион
-    result = await session.execute(
-        select(Product, Auction, User)
-        .join(Auction, Product.id == Auction.product_id)
-        .join(User, Product.user_id == User.id)
-        .where(Product.id == product_id)
-    )
-    data = result.first()
+    # Получаем товар и аукцион; соединение освобождаем до запросов к Telegram
+    async with db_phase(session):
+        result = await session.execute(
+            select(Product, Auction, User)
+            .join(Auction, Product.id == Auction.product_id)
+            .join(User, Product.user_id == User.id)
+            .where(Product.id == product_id)
+        )
+        data = result.first()
     
     if not data:
         raise ValueError("Товар или аукцион не найден")
@@ -250,8 +264,8 @@ async def publish_auction_to_channel(
     photos = json.loads(product.photos) if product.photos else []
     media_group = []
     
-    # Получаем username бота для deep-link
-    bot_info = await bot.get_me()
+    # Получаем username бота для deep-link (Bot.me() кэширует ответ get_me)
+    bot_info = await bot.me()
     bot_username = bot_info.username
     
     # Создаем клавиатуру для ставок - deep-link вместо callback
@@ -302,25 +316,34 @@ async def publish_auction_to_channel(
         
         # Публикуем в канал
         # Если есть фото, отправляем медиа-группу
-        await bot.send_media_group(
-            chat_id=settings.CHANNEL_ID,
-            media=media_group
+        await dispatch(
+            settings.CHANNEL_ID,
+            lambda: bot.send_media_group(
+                chat_id=settings.CHANNEL_ID,
+                media=media_group
+            )
         )
         # Отправляем отдельное сообщение с кнопкой и полным текстом (описание + статус)
-        message = await bot.send_message(
-            chat_id=settings.CHANNEL_ID,
-            text=full_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        message = await dispatch(
+            settings.CHANNEL_ID,
+            lambda: bot.send_message(
+                chat_id=settings.CHANNEL_ID,
+                text=full_text,
+                reply_markup=keyboard,
+                parse_mode="HTML"
+            )
         )
         channel_message_id = message.message_id
     else:
         # Если нет фото, отправляем текстовое сообщение (описание + статус)
-        message = await bot.send_message(
-            chat_id=settings.CHANNEL_ID,
-            text=full_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        message = await dispatch(
+            settings.CHANNEL_ID,
+            lambda: bot.send_message(
+                chat_id=settings.CHANNEL_ID,
+                text=full_text,
+                reply_markup=keyboard,
+                parse_mode="HTML"
+            )
         )
         channel_message_id = message.message_id
     
@@ -336,14 +359,15 @@ async def publish_sale_to_channel(
     product_id: int
 ) -> int:
     """Опубликовать обычную продажу в канал (только первое фото с кнопкой)"""
-    # Получаем товар и продажу
-    result = await session.execute(
-        select(Product, RegularSale, User)
-        .join(RegularSale, Product.id == RegularSale.product_id)
-        .join(User, Product.user_id == User.id)
-        .where(Product.id == product_id)
-    )
-    data = result.first()
+    # Получаем товар и продажу; соединение освобождаем до запросов к Telegram
+    async with db_phase(session):
+        result = await session.execute(
+            select(Product, RegularSale, User)
+            .join(RegularSale, Product.id == RegularSale.product_id)
+            .join(User, Product.user_id == User.id)
+            .where(Product.id == product_id)
+        )
+        data = result.first()
     
     if not data:
         raise ValueError("Товар или продажа не найдены")
@@ -390,21 +414,27 @@ async def publish_sale_to_channel(
             caption_text = caption_text[:1000] + "…"
         
         # Отправляем одно фото с caption и кнопкой
-        message = await bot.send_photo(
-            chat_id=settings.CHANNEL_ID,
-            photo=photos[0],
-            caption=caption_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        message = await dispatch(
+            settings.CHANNEL_ID,
+            lambda: bot.send_photo(
+                chat_id=settings.CHANNEL_ID,
+                photo=photos[0],
+                caption=caption_text,
+                reply_markup=keyboard,
+                parse_mode="HTML"
+            )
         )
         channel_message_id = message.message_id
     else:
         # Если нет фото, отправляем текстовое сообщение
-        message = await bot.send_message(
-            chat_id=settings.CHANNEL_ID,
-            text=text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        message = await dispatch(
+            settings.CHANNEL_ID,
+            lambda: bot.send_message(
+                chat_id=settings.CHANNEL_ID,
+                text=text,
+                reply_markup=keyboard,
+                parse_mode="HTML"
+            )
         )
         channel_message_id = message.message_id
     
@@ -433,13 +463,17 @@ async def publish_sale_to_channel(
     ])
     
     try:
-        await bot.send_message(
-            chat_id=user.telegram_id,
-            text=(
-                f"✅ Ваше объявление '{product.title}' опубликовано!\n\n"
-                f"Когда товар будет продан, нажмите кнопку ниже:"
-            ),
-            reply_markup=seller_keyboard
+        await dispatch(
+            user.telegram_id,
+            lambda: bot.send_message(
+                chat_id=user.telegram_id,
+                text=(
+                    f"✅ Ваше объявление '{product.title}' опубликовано!\n\n"
+                    f"Когда товар будет продан, нажмите кнопку ниже:"
+                ),
+                reply_markup=seller_keyboard,
+                parse_mode=None
+            )
         )
     except Exception as e:
         logger.error(f"Ошибка при отправке кнопки продавцу: {e}")
@@ -531,10 +565,13 @@ async def send_contacts_after_auction(
         )
         
         try:
-            await bot.send_message(
-                chat_id=winner.telegram_id,
-                text=winner_message,
-                parse_mode="HTML"
+            await dispatch(
+                winner.telegram_id,
+                lambda: bot.send_message(
+                    chat_id=winner.telegram_id,
+                    text=winner_message,
+                    parse_mode="HTML"
+                )
             )
             logger.info(f"Контакты продавца отправлены победителю {winner.telegram_id} для аукциона {auction_id}")
         except Exception as e:
@@ -550,10 +587,13 @@ async def send_contacts_after_auction(
         )
         
         try:
-            await bot.send_message(
-                chat_id=seller.telegram_id,
-                text=seller_message,
-                parse_mode="HTML"
+            await dispatch(
+                seller.telegram_id,
+                lambda: bot.send_message(
+                    chat_id=seller.telegram_id,
+                    text=seller_message,
+                    parse_mode="HTML"
+                )
             )
             logger.info(f"Контакты победителя отправлены продавцу {seller.telegram_id} для аукциона {auction_id}")
         except Exception as e:
@@ -0,0 +1,184 @@
+"""Завершение аукционов точно по времени окончания"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+from sqlalchemy import select
+from database.connection import async_session_maker
+from database.models.auction import Auction, AuctionStatus
+from services import pg_events
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(value: datetime) -> float:
+    # Время без зоны в БД считаем UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class AuctionDeadlineScheduler:
+    """Куча таймеров по ends_at: спит ровно до ближайшего окончания аукциона.
+
+    Продление аукциона ставкой просто кладёт в кучу новый срок, устаревшие
+    записи отбрасываются при извлечении. Когда срок наступил, вызывается
+    on_due - оно завершает все истекшие аукционы одним проходом. Если on_due
+    упало, наступившие сроки возвращаются в кучу через retry_delay.
+    """
+
+    def __init__(
+        self,
+        on_due: Callable[[], Awaitable],
+        resync_interval: float,
+        retry_delay: float
+    ):
+        self._on_due = on_due
+        self._resync_interval = resync_interval
+        self._retry_delay = retry_delay
+        self._heap: list[tuple[float, int]] = []
+        # auction_id -> актуальный срок (timestamp)
+        self._deadlines: dict[int, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Загрузить сроки активных аукционов из БД и запустить таймер"""
+        await self.rebuild()
+        self._task = asyncio.create_task(self._run())
+
+    async def rebuild(self):
+        """Дополнить сроки по таблице auctions и пересобрать кучу"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(Auction.id, Auction.ends_at).where(
+                    Auction.status == AuctionStatus.ACTIVE.value,
+                    Auction.ends_at.isnot(None)
+                )
+            )
+            rows = result.all()
+
+        # Пока шёл запрос, arm() мог положить более поздний срок (ставка,
+        # NOTIFY) или аукцион, которого ещё нет в снимке, - сроки сливаем,
+        # а не заменяем. Лишняя запись лишь разбудит таймер впустую:
+        # on_due завершает только действительно истекшие аукционы
+        for row in rows:
+            deadline = _timestamp(row.ends_at)
+            self._deadlines[row.id] = max(self._deadlines.get(row.id, deadline), deadline)
+        self._heap = [(deadline, auction_id) for auction_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        logger.info(f"Таймеры аукционов восстановлены: активных аукционов {len(rows)}")
+
+    def arm(self, auction_id: int, ends_at: datetime):
+        """Запланировать (или перенести) завершение аукциона"""
+        deadline = _timestamp(ends_at)
+        if self._deadlines.get(auction_id) == deadline:
+            return
+        self._deadlines[auction_id] = deadline
+        heapq.heappush(self._heap, (deadline, auction_id))
+        # Будим цикл, только если новый срок стал ближайшим
+        if self._heap[0] == (deadline, auction_id):
+            self._wakeup.set()
+
+    def _next_deadline(self) -> float | None:
+        """Ближайший актуальный срок, устаревшие записи выбрасываются"""
+        while self._heap:
+            deadline, auction_id = self._heap[0]
+            if self._deadlines.get(auction_id) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: float) -> list[int]:
+        due = []
+        while True:
+            deadline = self._next_deadline()
+            if deadline is None or deadline > now:
+                return due
+            _, auction_id = heapq.heappop(self._heap)
+            del self._deadlines[auction_id]
+            due.append(auction_id)
+
+    def _retry(self, auction_ids: list[int]):
+        """Вернуть в кучу сроки, которые не удалось обработать"""
+        retry_at = time.time() + self._retry_delay
+        for auction_id in auction_ids:
+            # Если аукцион за это время продлили, новый срок уже в куче
+            if auction_id in self._deadlines:
+                continue
+            self._deadlines[auction_id] = retry_at
+            heapq.heappush(self._heap, (retry_at, auction_id))
+
+    async def _run(self):
+        last_resync = time.monotonic()
+        while True:
+            deadline = self._next_deadline()
+            # Дальше интервала сверки не спим: она подхватывает аукционы,
+            # которые продлили или запустили другие процессы
+            timeout = self._resync_interval - (time.monotonic() - last_resync)
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.time())
+
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            try:
+                if time.monotonic() - last_resync >= self._resync_interval:
+                    last_resync = time.monotonic()
+                    await self.rebuild()
+                    continue
+
+                due = self._pop_due(time.time())
+                if due:
+                    logger.debug(f"Наступил срок аукционов: {due}")
+                    try:
+                        await self._on_due()
+                    except Exception:
+                        self._retry(due)
+                        raise
+            except Exception as e:
+                logger.error(f"Ошибка в таймере аукционов: {e}")
+
+
+_deadline_scheduler: AuctionDeadlineScheduler | None = None
+
+
+def arm_auction_deadline(auction_id: int, ends_at: datetime | None):
+    """Сообщить таймеру новый срок окончания аукциона"""
+    if _deadline_scheduler is None or ends_at is None:
+        return
+    _deadline_scheduler.arm(auction_id, ends_at)
+
+
+def _on_auction_event(payload: dict):
+    arm_auction_deadline(
+        payload["auction_id"],
+        datetime.fromtimestamp(payload["ends_at"], tz=timezone.utc)
+    )
+
+
+async def start_deadline_scheduler(
+    on_due: Callable[[], Awaitable],
+    resync_interval: float,
+    retry_delay: float
+) -> AuctionDeadlineScheduler:
+    """Запустить таймер завершения аукционов"""
+    global _deadline_scheduler
+    scheduler = AuctionDeadlineScheduler(on_due, resync_interval, retry_delay)
+    await scheduler.start()
+    _deadline_scheduler = scheduler
+    
+    # Аукционы, запущенные или продлённые другими процессами, приходят через NOTIFY
+    pg_events.subscribe(pg_events.AUCTION_STARTED, _on_auction_event)
+    pg_events.subscribe(pg_events.AUCTION_EXTENDED, _on_auction_event)
+    pg_events.on_reconnect(scheduler.rebuild)
+    logger.info("Таймер завершения аукционов запущен")
+    return scheduler
@@ -0,0 +1,322 @@
+"""Метрики обработчиков, запросов к БД и к Telegram в формате Prometheus"""
+import time
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from aiohttp import web
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин: длительности (сек) и количества запросов на одно обновление
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: dict) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in pairs.items()) + "}"
+
+
+class Counter:
+    """Счётчик с одной (необязательной) меткой"""
+
+    def __init__(self, name: str, documentation: str, label: str | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values: dict[str, float] = {}
+
+    def inc(self, label_value: str = "", amount: float = 1.0):
+        self._values[label_value] = self._values.get(label_value, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_value, value in sorted(self._values.items()):
+            labels = {self.label: label_value} if self.label else {}
+            lines.append(f"{self.name}{_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с одной (необязательной) меткой"""
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, label: str | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label = label
+        # значение метки -> [счётчики корзин (последняя - +Inf), сумма, количество]
+        self._series: dict[str, list] = {}
+
+    def observe(self, value: float, label_value: str = ""):
+        series = self._series.get(label_value)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self._series[label_value] = series
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total, count) in sorted(self._series.items()):
+            labels = {self.label: label_value} if self.label else {}
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+HANDLER_DURATION = Histogram(
+    "bot_handler_duration_seconds", "Время обработки обновления", LATENCY_BUCKETS, "handler"
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Обновления, завершившиеся исключением", "handler"
+)
+HANDLER_DB_STATEMENTS = Histogram(
+    "bot_handler_db_statements", "Запросов к БД на одно обновление", COUNT_BUCKETS, "handler"
+)
+HANDLER_DB_SECONDS = Counter(
+    "bot_handler_db_seconds_total", "Время запросов к БД при обработке обновлений", "handler"
+)
+HANDLER_TELEGRAM_CALLS = Histogram(
+    "bot_handler_telegram_calls", "Запросов к Bot API на одно обновление", COUNT_BUCKETS, "handler"
+)
+HANDLER_TELEGRAM_SECONDS = Counter(
+    "bot_handler_telegram_seconds_total", "Время запросов к Bot API при обработке обновлений", "handler"
+)
+DB_STATEMENT_DURATION = Histogram(
+    "bot_db_statement_duration_seconds", "Время выполнения запроса к БД", LATENCY_BUCKETS
+)
+TELEGRAM_REQUEST_DURATION = Histogram(
+    "bot_telegram_request_duration_seconds", "Время запроса к Bot API", LATENCY_BUCKETS, "method"
+)
+TELEGRAM_REQUEST_ERRORS = Counter(
+    "bot_telegram_request_errors_total", "Запросы к Bot API, завершившиеся ошибкой", "method"
+)
+
+_METRICS = (
+    HANDLER_DURATION,
+    HANDLER_ERRORS,
+    HANDLER_DB_STATEMENTS,
+    HANDLER_DB_SECONDS,
+    HANDLER_TELEGRAM_CALLS,
+    HANDLER_TELEGRAM_SECONDS,
+    DB_STATEMENT_DURATION,
+    TELEGRAM_REQUEST_DURATION,
+    TELEGRAM_REQUEST_ERRORS,
+)
+
+
+@dataclass
+class UpdateStats:
+    """Счётчики одного обновления: куда оно ходило и сколько это стоило"""
+    handler: str
+    db_statements: int = 0
+    db_time: float = 0.0
+    telegram_calls: int = 0
+    telegram_time: float = 0.0
+
+
+# Обновление, которое сейчас обрабатывается в этой задаче (и в её дочерних)
+_current_update: ContextVar[UpdateStats | None] = ContextVar("current_update", default=None)
+
+
+def current_update() -> UpdateStats | None:
+    return _current_update.get()
+
+
+def begin_update(stats: UpdateStats) -> Token:
+    """Начать учёт обновления в текущем контексте"""
+    return _current_update.set(stats)
+
+
+def end_update(token: Token, stats: UpdateStats, duration: float, failed: bool):
+    """Записать итоги обновления в метрики"""
+    _current_update.reset(token)
+    HANDLER_DURATION.observe(duration, stats.handler)
+    HANDLER_DB_STATEMENTS.observe(stats.db_statements, stats.handler)
+    HANDLER_DB_SECONDS.inc(stats.handler, stats.db_time)
+    HANDLER_TELEGRAM_CALLS.observe(stats.telegram_calls, stats.handler)
+    HANDLER_TELEGRAM_SECONDS.inc(stats.handler, stats.telegram_time)
+    if failed:
+        HANDLER_ERRORS.inc(stats.handler)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    DB_STATEMENT_DURATION.observe(elapsed)
+    stats = _current_update.get()
+    if stats is not None:
+        stats.db_statements += 1
+        stats.db_time += elapsed
+
+
+def install_db_metrics(engine: AsyncEngine):
+    """Считать запросы движка к БД (в том числе по обновлениям)"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Middleware сессии Bot: время и число запросов к Bot API по методам"""
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            method_name = type(method).__name__
+            TELEGRAM_REQUEST_DURATION.observe(elapsed, method_name)
+            if failed:
+                TELEGRAM_REQUEST_ERRORS.inc(method_name)
+            stats = _current_update.get()
+            if stats is not None:
+                stats.telegram_calls += 1
+                stats.telegram_time += elapsed
+
+
+def _gauge(name: str, documentation: str, values: dict) -> list[str]:
+    """Gauge: values - {метки (tuple пар) или (): значение}"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in values.items():
+        lines.append(f"{name}{_labels(dict(labels))} {value}")
+    return lines
+
+
+def _pool_lines() -> list[str]:
+    from database.pool_metrics import get_pool_metrics
+
+    metrics = get_pool_metrics()
+    snapshot = metrics.snapshot()
+    lines = _gauge(
+        "bot_db_pool_connections",
+        "Соединения пула БД",
+        {
+            (("state", "checked_out"),): snapshot["checked_out"],
+            (("state", "checked_in"),): snapshot["checked_in"],
+            (("state", "overflow"),): snapshot["overflow"],
+        },
+    )
+    lines += [
+        "# HELP bot_db_pool_wait_seconds Ожидание соединения из пула БД",
+        "# TYPE bot_db_pool_wait_seconds histogram",
+    ]
+    for bound, count in metrics.histogram():
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'bot_db_pool_wait_seconds_bucket{{le="{le}"}} {count}')
+    lines.append(f"bot_db_pool_wait_seconds_sum {snapshot['wait_sum']}")
+    lines.append(f"bot_db_pool_wait_seconds_count {snapshot['checkouts']}")
+    lines += [
+        "# HELP bot_db_pool_timeouts_total Таймауты ожидания соединения из пула БД",
+        "# TYPE bot_db_pool_timeouts_total counter",
+        f"bot_db_pool_timeouts_total {snapshot['timeouts']}",
+    ]
+    return lines
+
+
+def _send_queue_lines() -> list[str]:
+    from services.telegram_queue import get_send_queue
+
+    send_queue = get_send_queue()
+    if send_queue is None:
+        return []
+    stats = send_queue.stats()
+    lines = _gauge(
+        "bot_send_queue_depth",
+        "Запросов в очереди отправки в Telegram",
+        {(("priority", priority),): count for priority, count in stats["depth"].items()},
+    )
+    lines += _gauge("bot_send_queue_in_flight", "Запросов к Telegram в полёте", {(): stats["in_flight"]})
+    lines += _gauge(
+        "bot_send_queue_jobs",
+        "Итоги очереди отправки с момента запуска",
+        {
+            (("result", "sent"),): stats["sent"],
+            (("result", "retried"),): stats["retried"],
+            (("result", "failed"),): stats["failed"],
+        },
+    )
+    lines += _gauge(
+        "bot_send_queue_latency_ms",
+        "Задержка доставки через очередь по последним запросам",
+        {(("quantile", key),): value for key, value in stats["latency_ms"].items()},
+    )
+    return lines
+
+
+_database_middleware = None
+
+
+def track_database_middleware(middleware):
+    """Отдавать в /metrics счётчики DatabaseMiddleware диспетчера"""
+    global _database_middleware
+    _database_middleware = middleware
+
+
+def _database_middleware_lines() -> list[str]:
+    if _database_middleware is None:
+        return []
+    stats = _database_middleware.stats()
+    return [
+        "# HELP bot_session_updates_total Обновления, получившие сессию БД",
+        "# TYPE bot_session_updates_total counter",
+        f"bot_session_updates_total {stats['updates']}",
+        "# HELP bot_session_db_updates_total Обновления, обработчик которых обратился к БД",
+        "# TYPE bot_session_db_updates_total counter",
+        f"bot_session_db_updates_total {stats['db_updates']}",
+    ]
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines: list[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    lines += _pool_lines()
+    lines += _database_middleware_lines()
+    lines += _send_queue_lines()
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server() -> web.AppRunner:
+    """Запустить HTTP-сервер с /metrics"""
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.METRICS_HOST, settings.METRICS_PORT)
+    await site.start()
+    logger.info(f"Метрики доступны на http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics")
+    return runner
@@ -1,10 +1,15 @@
 """Сервис модерации"""
+from dataclasses import dataclass
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func, tuple_
 from database.models.moderation import ModerationQueue, ModerationStatus
 from database.models.auction import Auction, AuctionStatus
 from database.models.regular_sale import RegularSale, SaleStatus
-from datetime import datetime
+from database.models.product import Product
+from database.models.user import User
+from datetime import datetime, timedelta, timezone
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 async def add_to_moderation(
@@ -118,3 +123,77 @@ async def get_pending_moderations(session: AsyncSession) -> list[ModerationQueue
     )
     return list(result.scalars().all())
 
+
+
+@dataclass
+class ModerationPage:
+    """Страница очереди модерации: (заявка, товар, продавец) по порядку поступления"""
+    items: list[tuple[ModerationQueue, Product, User]]
+    total: int
+    has_prev: bool
+    has_next: bool
+
+
+def moderation_cursor(moderation: ModerationQueue) -> str:
+    """Позиция заявки в очереди для callback_data: <created_at в мкс>.<id>"""
+    micros = (moderation.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{moderation.id}"
+
+
+def parse_moderation_cursor(cursor: str) -> tuple[datetime, int]:
+    """Разобрать позицию из moderation_cursor (ValueError, если она испорчена)"""
+    micros, moderation_id = cursor.split(".")
+    return _EPOCH + timedelta(microseconds=int(micros)), int(moderation_id)
+
+
+async def get_pending_moderation_page(
+    session: AsyncSession,
+    limit: int,
+    after: tuple[datetime, int] | None = None,
+    before: tuple[datetime, int] | None = None
+) -> ModerationPage:
+    """Страница заявок на модерации по ключу (created_at, id).
+
+    Без курсоров - первая страница, after - следующая за позицией,
+    before - предыдущая. Товар и продавец приходят тем же запросом,
+    общее число заявок - подзапросом в нём же, так что стоимость не
+    зависит от длины очереди (индекс из миграции 012).
+    """
+    is_pending = ModerationQueue.status == ModerationStatus.PENDING.value
+    key = tuple_(ModerationQueue.created_at, ModerationQueue.id)
+    total = (
+        select(func.count())
+        .select_from(ModerationQueue)
+        .where(is_pending)
+        .scalar_subquery()
+    )
+    query = (
+        select(ModerationQueue, Product, User, total.label("total"))
+        .join(Product, Product.id == ModerationQueue.product_id)
+        .join(User, User.id == Product.user_id)
+        .where(is_pending)
+        # Лишняя строка показывает, есть ли что-то дальше в направлении чтения
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(key < tuple_(*before)).order_by(
+            ModerationQueue.created_at.desc(), ModerationQueue.id.desc()
+        )
+    else:
+        if after is not None:
+            query = query.where(key > tuple_(*after))
+        query = query.order_by(ModerationQueue.created_at.asc(), ModerationQueue.id.asc())
+
+    result = await session.execute(query)
+    rows = result.all()
+
+    if not rows and (after is not None or before is not None):
+        # Заявки вокруг курсора уже разобрали - показываем начало очереди
+        return await get_pending_moderation_page(session, limit)
+
+    has_more = len(rows) > limit
+    items = [(row[0], row[1], row[2]) for row in rows[:limit]]
+    if before is not None:
+        items.reverse()
+        return ModerationPage(items, rows[0].total if rows else 0, has_prev=has_more, has_next=True)
+    return ModerationPage(items, rows[0].total if rows else 0, has_prev=after is not None, has_next=has_more)
@@ -9,13 +9,19 @@ from config import settings
 from aiogram import Bot
 from database.models.user import User
 from sqlalchemy import select
+from services.telegram_queue import dispatch, Priority
+from services import pg_events
+from services.roles import get_role_registry
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def check_and_notify_pending_moderations(bot: Bot):
-    """Проверить и уведомить админов о непромодерированных товарах"""
+async def check_and_notify_pending_moderations(bot: Bot) -> int:
+    """Проверить и уведомить админов о непромодерированных товарах.
+
+    Возвращает количество товаров на модерации.
+    """
     async with async_session_maker() as session:
         # Получаем количество непромодерированных товаров
         result = await session.execute(
@@ -26,7 +32,7 @@ async def check_and_notify_pending_moderations(bot: Bot):
         pending_count = result.scalar() or 0
         
         if pending_count == 0:
-            return
+            return 0
         
         # Формируем сообщение
         text = (
@@ -39,55 +45,80 @@ async def check_and_notify_pending_moderations(bot: Bot):
         # Получаем всех админов и модераторов
         admin_ids = list(settings.admin_ids_list)
         
-        # Добавляем модераторов из БД
-        async with async_session_maker() as mod_session:
-            result = await mod_session.execute(
-                select(User.telegram_id).where(User.is_moderator == True)
-            )
-            moderator_ids = [row[0] for row in result.all()]
+        # Добавляем модераторов из реестра ролей (или из БД, если он не запущен)
+        registry = get_role_registry()
+        if registry is not None:
+            moderator_ids = list(registry.moderator_ids())
+        else:
+            async with async_session_maker() as mod_session:
+                result = await mod_session.execute(
+                    select(User.telegram_id).where(User.is_moderator == True)
+                )
+                moderator_ids = [row[0] for row in result.all()]
         
         from bot.keyboards.admin import get_admin_keyboard, get_moderator_keyboard
         
-        # Отправляем админам
-        for admin_id in admin_ids:
+        async def send_reminder(chat_id: int, keyboard, role: str):
             try:
-                await bot.send_message(
-                    admin_id,
-                    text,
-                    parse_mode="HTML",
-                    reply_markup=get_admin_keyboard()
+                await dispatch(
+                    chat_id,
+                    lambda: bot.send_message(
+                        chat_id,
+                        text,
+                        parse_mode="HTML",
+                        reply_markup=keyboard
+                    ),
+                    Priority.BULK
                 )
             except Exception as e:
-                logger.error(f"Ошибка отправки напоминания админу {admin_id}: {e}")
+                logger.error(f"Ошибка отправки напоминания {role} {chat_id}: {e}")
         
-        # Отправляем модераторам
-        for moderator_id in moderator_ids:
-            try:
-                await bot.send_message(
-                    moderator_id,
-                    text,
-                    parse_mode="HTML",
-                    reply_markup=get_moderator_keyboard()
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки напоминания модератору {moderator_id}: {e}")
+        # Напоминания ставятся в очередь отправки разом и идут после срочных сообщений
+        await asyncio.gather(
+            *(send_reminder(admin_id, get_admin_keyboard(), "админу") for admin_id in admin_ids),
+            *(send_reminder(moderator_id, get_moderator_keyboard(), "модератору") for moderator_id in moderator_ids)
+        )
+        return pending_count
+
+
+# Интервал напоминаний о модерации (сек)
+REMINDER_INTERVAL = 2 * 60 * 60
+
+# Выставляется событием moderation_enqueued из БД
+_moderation_enqueued = asyncio.Event()
 
 
 async def notification_scheduler(bot: Bot):
     """Планировщик напоминаний о модерации"""
     while True:
+        pending_count = None
         try:
             # Проверяем каждые 2 часа
-            await check_and_notify_pending_moderations(bot)
+            pending_count = await check_and_notify_pending_moderations(bot)
         except Exception as e:
             logger.error(f"Ошибка в планировщике напоминаний: {e}")
         
+        if pending_count == 0:
+            # Очередь пуста: ждём события о новом товаре, а не опрашиваем БД.
+            # Первое напоминание - через интервал после постановки на модерацию,
+            # само уведомление о товаре админы уже получили при публикации
+            _moderation_enqueued.clear()
+            try:
+                await asyncio.wait_for(_moderation_enqueued.wait(), timeout=REMINDER_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+        
         # Ждем 2 часа
-        await asyncio.sleep(2 * 60 * 60)
+        await asyncio.sleep(REMINDER_INTERVAL)
+
+
+def _on_moderation_enqueued(payload: dict):
+    _moderation_enqueued.set()
 
 
 def start_notification_scheduler(bot: Bot):
     """Запустить планировщик напоминаний"""
+    pg_events.subscribe(pg_events.MODERATION_ENQUEUED, _on_moderation_enqueued)
     asyncio.create_task(notification_scheduler(bot))
     logger.info("Планировщик напоминаний о модерации запущен")
 
@@ -0,0 +1,109 @@
+"""События Postgres LISTEN/NOTIFY для фоновых задач"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable
+import asyncpg
+from sqlalchemy.engine import make_url
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Каналы, в которые пишут триггеры из миграций 009_pg_notify_events.sql,
+# 011_notify_moderator_changes.sql и 014_notify_user_changes.sql
+AUCTION_STARTED = "auction_started"
+AUCTION_EXTENDED = "auction_extended"
+MODERATION_ENQUEUED = "moderation_enqueued"
+MODERATOR_CHANGED = "moderator_changed"
+USER_CHANGED = "user_changed"
+
+# Пауза перед переподключением слушателя (сек)
+_RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
+_handlers: dict[str, list[Callable[[dict], Any]]] = {}
+_reconnect_callbacks: list[Callable[[], Awaitable]] = []
+
+
+def subscribe(channel: str, handler: Callable[[dict], Any]):
+    """Подписаться на канал (handler получает разобранный JSON payload)"""
+    _handlers.setdefault(channel, []).append(handler)
+
+
+def on_reconnect(callback: Callable[[], Awaitable]):
+    """Вызвать callback после переподключения: события за время разрыва потеряны"""
+    _reconnect_callbacks.append(callback)
+
+
+class PgEventListener:
+    """Слушает NOTIFY на отдельном соединении asyncpg (не из пула SQLAlchemy)"""
+
+    def __init__(self, dsn: str):
+        self._dsn = dsn
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Запустить слушателя"""
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        attempt = 0
+        connected_before = False
+        while True:
+            try:
+                connection = await asyncpg.connect(self._dsn)
+            except Exception as e:
+                delay = _RECONNECT_DELAYS[min(attempt, len(_RECONNECT_DELAYS) - 1)]
+                attempt += 1
+                logger.error(f"Слушатель событий БД не подключился: {e}, повтор через {delay} сек")
+                await asyncio.sleep(delay)
+                continue
+
+            attempt = 0
+            terminated = asyncio.Event()
+            connection.add_termination_listener(lambda _: terminated.set())
+            try:
+                for channel in _handlers:
+                    await connection.add_listener(channel, self._dispatch)
+                logger.info(f"Слушатель событий БД подключён: {', '.join(_handlers)}")
+
+                if connected_before:
+                    for callback in _reconnect_callbacks:
+                        try:
+                            await callback()
+                        except Exception as e:
+                            logger.error(f"Ошибка восстановления после переподключения к БД: {e}")
+                connected_before = True
+
+                await terminated.wait()
+                logger.warning("Соединение слушателя событий БД потеряно")
+            except Exception as e:
+                logger.error(f"Ошибка слушателя событий БД: {e}")
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(_RECONNECT_DELAYS[0])
+
+    def _dispatch(self, connection, pid: int, channel: str, payload: str):
+        try:
+            data = json.loads(payload) if payload else {}
+        except ValueError:
+            logger.warning(f"Некорректное событие {channel}: {payload!r}")
+            return
+        for handler in _handlers.get(channel, []):
+            try:
+                handler(data)
+            except Exception as e:
+                logger.error(f"Ошибка обработки события {channel}: {e}")
+
+
+_listener: PgEventListener | None = None
+
+
+def start_pg_listener() -> PgEventListener:
+    """Запустить слушателя событий БД (после регистрации подписчиков)"""
+    global _listener
+    # asyncpg принимает обычный postgresql:// DSN без драйвера SQLAlchemy
+    dsn = make_url(settings.database_url).set(drivername="postgresql")
+    _listener = PgEventListener(dsn.render_as_string(hide_password=False))
+    _listener.start()
+    return _listener
@@ -0,0 +1,100 @@
+"""Реестр ролей: админы из настроек и модераторы из БД в памяти процесса"""
+import asyncio
+from sqlalchemy import select
+from database.connection import async_session_maker
+from database.models.user import User
+from services import pg_events
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RoleRegistry:
+    """Проверка ролей без запросов к БД.
+
+    Админы задаются в ADMIN_USER_IDS и не меняются во время работы,
+    модераторы загружаются из users при старте. Смена роли в этом процессе
+    сразу применяется через set_moderator, из других процессов приходит
+    через NOTIFY, а периодическая сверка подбирает всё, что было пропущено.
+    """
+
+    def __init__(self, admin_ids: frozenset[int], resync_interval: float):
+        self.admin_ids = admin_ids
+        self._resync_interval = resync_interval
+        self._moderator_ids: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Загрузить модераторов и запустить периодическую сверку"""
+        await self.reload()
+        self._task = asyncio.create_task(self._resync_loop())
+
+    async def reload(self):
+        """Перечитать модераторов из БД"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(User.telegram_id).where(User.is_moderator == True)
+            )
+            self._moderator_ids = set(result.scalars().all())
+        logger.debug(f"Реестр ролей обновлён: модераторов {len(self._moderator_ids)}")
+
+    def is_admin(self, telegram_id: int) -> bool:
+        return telegram_id in self.admin_ids
+
+    def is_moderator(self, telegram_id: int) -> bool:
+        return telegram_id in self._moderator_ids
+
+    def is_admin_or_moderator(self, telegram_id: int) -> bool:
+        return telegram_id in self.admin_ids or telegram_id in self._moderator_ids
+
+    def moderator_ids(self) -> frozenset[int]:
+        """Снимок текущих модераторов"""
+        return frozenset(self._moderator_ids)
+
+    def set_moderator(self, telegram_id: int, is_moderator: bool):
+        """Применить смену роли (после commit в users)"""
+        if is_moderator:
+            self._moderator_ids.add(telegram_id)
+        else:
+            self._moderator_ids.discard(telegram_id)
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(self._resync_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Ошибка сверки реестра ролей: {e}")
+
+
+_role_registry: RoleRegistry | None = None
+
+
+def get_role_registry() -> RoleRegistry | None:
+    """Реестр ролей (None, пока он не запущен)"""
+    return _role_registry
+
+
+def set_moderator_role(telegram_id: int, is_moderator: bool):
+    """Сообщить реестру о смене роли модератора"""
+    if _role_registry is not None:
+        _role_registry.set_moderator(telegram_id, is_moderator)
+
+
+def _on_moderator_changed(payload: dict):
+    set_moderator_role(payload["telegram_id"], bool(payload["is_moderator"]))
+
+
+async def start_role_registry() -> RoleRegistry:
+    """Запустить реестр ролей"""
+    global _role_registry
+    registry = RoleRegistry(frozenset(settings.admin_ids_list), settings.ROLES_RESYNC_INTERVAL)
+    await registry.start()
+    _role_registry = registry
+
+    # Роли, изменённые другими процессами, приходят через NOTIFY
+    pg_events.subscribe(pg_events.MODERATOR_CHANGED, _on_moderator_changed)
+    pg_events.on_reconnect(registry.reload)
+    logger.info("Реестр ролей запущен")
+    return registry
@@ -0,0 +1,46 @@
+"""Сервис обычных продаж"""
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from database.models.regular_sale import RegularSale, SaleStatus
+
+
+@dataclass(frozen=True)
+class ExpiredSale:
+    """Продажа, переведённая в статус expired"""
+    sale_id: int
+    channel_message_id: int | None
+
+
+async def expire_due_sales(
+    session: AsyncSession,
+    now: datetime,
+    limit: int
+) -> list[ExpiredSale]:
+    """Перевести до limit истекших активных продаж в expired одним запросом.
+
+    Возвращаются только продажи, которые истекли именно сейчас: повторно
+    они под условие status = 'active' уже не попадут. SKIP LOCKED не даёт
+    двум процессам обработать одну продажу дважды.
+    """
+    due = (
+        select(RegularSale.id)
+        .where(
+            RegularSale.status == SaleStatus.ACTIVE.value,
+            RegularSale.expires_at <= now
+        )
+        .order_by(RegularSale.expires_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(RegularSale)
+        .where(RegularSale.id.in_(due))
+        .values(status=SaleStatus.EXPIRED.value)
+        .returning(RegularSale.id, RegularSale.channel_message_id)
+    )
+    expired = [ExpiredSale(row.id, row.channel_message_id) for row in result.all()]
+    await session.commit()
+    return expired
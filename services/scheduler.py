@@ -1,186 +1,146 @@
 """Планировщик задач для завершения аукционов"""
 import asyncio
 from datetime import datetime, timezone, timedelta
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from database.connection import async_session_maker
-from database.models.auction import Auction, AuctionStatus
-from database.models.regular_sale import RegularSale, SaleStatus
-from services.auction import finish_auction, get_active_auctions
-from services.channel import get_auction_status_text, send_contacts_after_auction
+from services.auction import finish_expired_auctions, FinishedAuction
+from services.sale import expire_due_sales, ExpiredSale
+from services.bid_engine import get_bid_engine
+from services.channel import send_contacts_after_auction
+from services.card_updater import notify_auction_changed, get_card_updater
+from services.deadlines import start_deadline_scheduler
+from services.telegram_queue import dispatch, Priority
 from config import settings
 from aiogram import Bot
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 async def check_and_finish_auctions(bot: Bot):
-    """Проверить и завершить истекшие аукционы"""
-    async with async_session_maker() as session:
-        now = datetime.now(timezone.utc)
-        
-        result = await session.execute(
-            select(Auction).where(
-                Auction.status == AuctionStatus.ACTIVE.value,
-                Auction.ends_at <= now
-            )
-        )
-        expired_auctions = result.scalars().all()
-        
-        for auction in expired_auctions:
-            try:
-                # Сохраняем ID сообщения перед завершением
-                channel_message_id = auction.channel_message_id
-                
-                finished_auction = await finish_auction(session, auction.id)
-                logger.info(f"Аукцион {auction.id} завершен. Победитель: {finished_auction.winner_id}")
-                
-                # Обновляем сообщение в канале
-                if channel_message_id:
-                    try:
-                        status_text = await get_auction_status_text(session, finished_auction.id)
-                        await bot.edit_message_text(
-                            chat_id=settings.CHANNEL_ID,
-                            message_id=channel_message_id,
-                            text=status_text,
-                            reply_markup=None,  # Убираем кнопку для завершенных аукционов
-                            parse_mode="HTML",
-                        )
-                        logger.info(f"Сообщение в канале обновлено для аукциона {finished_auction.id}")
-                    except Exception as e:
-                        logger.error(f"Ошибка при обновлении сообщения в канале для аукциона {finished_auction.id}: {e}")
-                
-                # Сразу после завершения аукциона отправляем контакты победителю и продавцу
-                try:
-                    await send_contacts_after_auction(bot, session, finished_auction.id)
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке контактов для аукциона {finished_auction.id}: {e}")
-            
-            except Exception as e:
-                logger.error(f"Ошибка при завершении аукциона {auction.id}: {e}")
+    """Проверить и завершить истекшие аукционы.
+
+    Ошибка БД пробрасывается наружу, чтобы таймер повторил завершение.
+    """
+    now = datetime.now(timezone.utc)
+    
+    # В режиме движка ставок в памяти сначала закрываем приём ставок
+    # у истекших аукционов и дописываем принятые ставки в БД
+    bid_engine = get_bid_engine()
+    if bid_engine is not None:
+        closed_ids = bid_engine.close_expired(now)
+        try:
+            await bid_engine.flush()
+        except Exception as e:
+            logger.error(f"Не удалось записать ставки перед завершением аукционов: {e}")
+            raise
+    
+    # Завершаем пачками одним запросом, пока есть истекшие аукционы
+    finished_auctions: list[FinishedAuction] = []
+    error: Exception | None = None
+    while True:
+        try:
+            async with async_session_maker() as session:
+                batch = await finish_expired_auctions(session, now, settings.AUCTION_FINISH_BATCH)
+        except Exception as e:
+            logger.error(f"Ошибка при завершении аукционов: {e}")
+            error = e
+            break
+        finished_auctions.extend(batch)
+        if len(batch) < settings.AUCTION_FINISH_BATCH:
+            break
+    
+    for finished in finished_auctions:
+        logger.info(f"Аукцион {finished.auction_id} завершен. Победитель: {finished.winner_id}")
+    
+    if bid_engine is not None:
+        bid_engine.discard(closed_ids)
+    
+    # Побочные действия (карточка в канале, контакты) - параллельно, с ограничением
+    semaphore = asyncio.Semaphore(settings.AUCTION_FINISH_CONCURRENCY)
+    await asyncio.gather(
+        *(_after_auction_finished(bot, finished, semaphore) for finished in finished_auctions)
+    )
+    
+    # Уже завершённые аукционы обработаны, остальные таймер повторит
+    if error is not None:
+        raise error
+
+
+async def _after_auction_finished(bot: Bot, finished: FinishedAuction, semaphore: asyncio.Semaphore):
+    """Обновить карточку и отправить контакты по завершённому аукциону"""
+    # Обновляем сообщение в канале (кнопка у завершенных аукционов убирается)
+    if finished.channel_message_id:
+        notify_auction_changed(finished.auction_id)
+    
+    # Сразу после завершения аукциона отправляем контакты победителю и продавцу
+    async with semaphore:
+        try:
+            async with async_session_maker() as session:
+                await send_contacts_after_auction(bot, session, finished.auction_id)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке контактов для аукциона {finished.auction_id}: {e}")
 
 
 async def check_and_expire_sales(bot: Bot):
-    """Проверить и удалить кнопку у истекших обычных продаж (24 часа)"""
-    async with async_session_maker() as session:
-        now = datetime.now(timezone.utc)
-        
-        result = await session.execute(
-            select(RegularSale).where(
-                RegularSale.status == SaleStatus.ACTIVE.value,
-                RegularSale.expires_at <= now,
-                RegularSale.expires_at.isnot(None),
-                RegularSale.channel_message_id.isnot(None)
-            )
+    """Перевести истекшие обычные продажи (24 часа) в expired и убрать кнопку"""
+    now = datetime.now(timezone.utc)
+    
+    # Переводим пачками, пока есть истекшие продажи
+    expired_sales: list[ExpiredSale] = []
+    while True:
+        try:
+            async with async_session_maker() as session:
+                batch = await expire_due_sales(session, now, settings.SALE_EXPIRE_BATCH)
+        except Exception as e:
+            logger.error(f"Ошибка при завершении истекших продаж: {e}")
+            break
+        expired_sales.extend(batch)
+        if len(batch) < settings.SALE_EXPIRE_BATCH:
+            break
+    
+    # В Telegram идут только продажи, истекшие в этом проходе
+    await asyncio.gather(
+        *(_remove_sale_button(bot, sale) for sale in expired_sales if sale.channel_message_id)
+    )
+
+
+async def _remove_sale_button(bot: Bot, sale: ExpiredSale):
+    """Убрать кнопку из сообщения истекшей продажи, не меняя текст"""
+    try:
+        await dispatch(
+            settings.CHANNEL_ID,
+            lambda: bot.edit_message_reply_markup(
+                chat_id=settings.CHANNEL_ID,
+                message_id=sale.channel_message_id,
+                reply_markup=None  # Убираем кнопку
+            ),
+            Priority.BULK
         )
-        expired_sales = result.scalars().all()
-        
-        for sale in expired_sales:
-            try:
-                channel_message_id = sale.channel_message_id
-                
-                if channel_message_id:
-                    try:
-                        # Убираем кнопку из сообщения, не меняя текст
-                        await bot.edit_message_reply_markup(
-                            chat_id=settings.CHANNEL_ID,
-                            message_id=channel_message_id,
-                            reply_markup=None  # Убираем кнопку
-                        )
-                        logger.info(f"Кнопка удалена для продажи {sale.id} (истекло 24 часа)")
-                    except Exception as e:
-                        error_msg = str(e).lower()
-                        # Игнорируем ошибки, если сообщение уже изменено или удалено
-                        if "message to edit not found" in error_msg or "message is not modified" in error_msg:
-                            logger.debug(f"Сообщение для продажи {sale.id} не найдено или уже изменено")
-                        else:
-                            logger.warning(f"Ошибка при удалении кнопки для продажи {sale.id}: {e}")
-            
-            except Exception as e:
-                logger.error(f"Ошибка при обработке истекшей продажи {sale.id}: {e}")
+        logger.info(f"Кнопка удалена для продажи {sale.sale_id} (истекло 24 часа)")
+    except Exception as e:
+        error_msg = str(e).lower()
+        # Игнорируем ошибки, если сообщение уже изменено или удалено
+        if "message to edit not found" in error_msg or "message is not modified" in error_msg:
+            logger.debug(f"Сообщение для продажи {sale.sale_id} не найдено или уже изменено")
+        else:
+            logger.warning(f"Ошибка при удалении кнопки для продажи {sale.sale_id}: {e}")
 
 
 async def update_active_auctions_messages(bot: Bot):
     """Обновить сообщения в канале для всех активных аукционов"""
-    async with async_session_maker() as session:
-        try:
-            active_auctions = await get_active_auctions(session)
-            
-            if not active_auctions:
-                logger.debug("Нет активных аукционов для обновления")
-                return
-            
-            logger.info(f"Начинаю обновление сообщений для {len(active_auctions)} активных аукционов")
-            updated_count = 0
-            
-            for auction in active_auctions:
-                if not auction.channel_message_id:
-                    continue
-                
-                # Обновляем данные аукциона из базы, чтобы получить актуальные ends_at и current_price
-                await session.refresh(auction)
-                
-                try:
-                    # Получаем обновленный текст
-                    status_text = await get_auction_status_text(session, auction.id)
-                    
-                    # Логируем информацию для отладки
-                    now = datetime.now(timezone.utc)
-                    time_info = ""
-                    if auction.ends_at:
-                        if auction.ends_at.tzinfo is None:
-                            ends_at = auction.ends_at.replace(tzinfo=timezone.utc)
-                        else:
-                            ends_at = auction.ends_at.astimezone(timezone.utc)
-                        delta = ends_at - now
-                        hours = int(delta.total_seconds()) // 3600
-                        minutes = (int(delta.total_seconds()) % 3600) // 60
-                        time_info = f"ends_at={ends_at}, now={now}, осталось={hours}ч {minutes}м"
-                    else:
-                        time_info = "ends_at=None"
-                    
-                    logger.debug(f"Аукцион {auction.id}: {time_info}")
-                    logger.debug(f"Аукцион {auction.id}: длина текста={len(status_text)}")
-                    
-                    # Создаем клавиатуру только для активных аукционов
-                    bot_info = await bot.get_me()
-                    bot_username = bot_info.username
-                    deep_link_url = f"https://t.me/{bot_username}?start=auction_{auction.id}"
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [
-                            InlineKeyboardButton(
-                                text="Участвовать в аукционе",
-                                url=deep_link_url
-                            )
-                        ]
-                    ])
-                    
-                    # Обновляем сообщение в канале
-                    await bot.edit_message_text(
-                        chat_id=settings.CHANNEL_ID,
-                        message_id=auction.channel_message_id,
-                        text=status_text,
-                        reply_markup=keyboard,
-                        parse_mode="HTML",
-                    )
-                    updated_count += 1
-                    logger.info(f"Сообщение обновлено для аукциона {auction.id}")
-                except Exception as e:
-                    error_msg = str(e).lower()
-                    # Игнорируем ошибку "message is not modified"
-                    if "message is not modified" in error_msg:
-                        logger.debug(f"Сообщение для аукциона {auction.id} не изменилось (это нормально)")
-                    else:
-                        logger.warning(
-                            f"Не удалось обновить сообщение для аукциона {auction.id}: {e!r}"
-                        )
-                        logger.debug(f"Текст сообщения (первые 200 символов): {status_text[:200]}")
-            
-            logger.info(f"Обновление завершено: обновлено {updated_count} из {len(active_auctions)} аукционов")
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении сообщений аукционов: {e}")
+    card_updater = get_card_updater()
+    if card_updater is None:
+        logger.debug("Сервис обновления карточек не запущен")
+        return
+    
+    try:
+        # Неизменившиеся карточки пропускаются, остальные правятся равномерно за окно
+        queued_count = await card_updater.refresh_all(settings.CHANNEL_CARD_REFRESH_WINDOW)
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении сообщений аукционов: {e}")
+        return
+    
+    logger.info(f"Запланировано обновление {queued_count} карточек аукционов")
 
 
 async def scheduler_loop(bot: Bot):
@@ -190,9 +150,7 @@ async def scheduler_loop(bot: Bot):
     
     while True:
         try:
-            # Проверяем завершенные аукционы каждую минуту
-            await check_and_finish_auctions(bot)
-            
+            # Аукционы завершает таймер по ends_at (services.deadlines)
             # Проверяем истекшие обычные продажи каждую минуту
             await check_and_expire_sales(bot)
             
@@ -211,8 +169,13 @@ async def scheduler_loop(bot: Bot):
         await asyncio.sleep(60)
 
 
-def start_scheduler(bot: Bot):
+async def start_scheduler(bot: Bot):
     """Запустить планировщик"""
+    await start_deadline_scheduler(
+        lambda: check_and_finish_auctions(bot),
+        settings.AUCTION_DEADLINE_RESYNC_INTERVAL,
+        settings.AUCTION_DEADLINE_RETRY_DELAY
+    )
     asyncio.create_task(scheduler_loop(bot))
     logger.info("Планировщик аукционов запущен")
 
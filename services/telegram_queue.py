@@ -0,0 +1,350 @@
+"""Очередь исходящих запросов к Telegram с ограничением частоты"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable
+from aiogram.exceptions import TelegramRetryAfter
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Как часто забывать простаивающие чаты (сек)
+_PRUNE_INTERVAL = 60.0
+
+
+class Priority(IntEnum):
+    """Приоритет исходящего сообщения (меньше - раньше)"""
+    HIGH = 0  # Ответы на действия пользователя: подтверждение ставки
+    NORMAL = 1  # Уведомления продавцам, публикации, карточки в канале
+    BULK = 2  # Массовые напоминания
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена"""
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        """Забрать токен (вызывать, когда delay() вернул 0)"""
+        self._refill(now)
+        self._tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    chat_key: str = field(compare=False)
+    call: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    # Контекст отправителя: запрос учитывается в метриках его обновления
+    context: contextvars.Context = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class _ChatLane:
+    """Очередь одного чата: в полёте не больше одного запроса, порядок сохраняется"""
+
+    def __init__(self, key: str, bucket: TokenBucket):
+        self.key = key
+        self.bucket = bucket
+        self.pending: list[_Job] = []  # куча по (priority, seq)
+        self.busy = False
+        self.scheduled = False  # чат уже в очереди готовых или ждёт таймера
+        self.paused_until = 0.0  # пауза после TelegramRetryAfter
+
+    def ready_in(self, now: float) -> float:
+        return max(self.paused_until - now, self.bucket.delay(now))
+
+
+class TelegramSendQueue:
+    """Центральная очередь отправки в Telegram.
+
+    Соблюдает общий лимит бота и лимит на каждый чат (корзины токенов),
+    при TelegramRetryAfter ставит запрос на повтор после паузы, а не теряет его.
+    Между чатами первым уходит запрос с более высоким приоритетом,
+    внутри одного чата запросы одного приоритета идут по порядку.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        private_chat_rate: float,
+        group_chat_rate: float,
+        chat_burst: int,
+        workers: int,
+        max_retries: int
+    ):
+        self._global = TokenBucket(global_rate, max(1.0, global_rate))
+        self._private_chat_rate = private_chat_rate
+        self._group_chat_rate = group_chat_rate
+        self._chat_burst = chat_burst
+        self._max_retries = max_retries
+        self._slots = asyncio.Semaphore(workers)
+        self._seq = itertools.count()
+        self._lanes: dict[str, _ChatLane] = {}
+        # Куча готовых к отправке чатов: (priority, seq, chat_key)
+        self._ready: list[tuple[int, int, str]] = []
+        self._ready_event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._last_prune = time.monotonic()
+
+        self._depth = {priority: 0 for priority in Priority}
+        self._in_flight = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        # Время от постановки в очередь до успешной отправки (сек)
+        self._latencies: deque[float] = deque(maxlen=1000)
+
+    def start(self):
+        """Запустить диспетчер очереди"""
+        self._task = asyncio.create_task(self._dispatch_loop())
+
+    def submit(
+        self,
+        chat_id: int | str,
+        call: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.NORMAL
+    ) -> asyncio.Future:
+        """Поставить запрос в очередь.
+
+        call - функция без аргументов, создающая запрос (например,
+        lambda: bot.send_message(...)): при повторе запрос создаётся заново.
+        """
+        now = time.monotonic()
+        if now - self._last_prune > _PRUNE_INTERVAL:
+            self._prune_idle_lanes(now)
+        key = str(chat_id)
+        job = _Job(
+            priority=int(priority),
+            seq=next(self._seq),
+            chat_key=key,
+            call=call,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=now,
+            context=contextvars.copy_context()
+        )
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = _ChatLane(key, self._new_chat_bucket(key))
+            self._lanes[key] = lane
+        heapq.heappush(lane.pending, job)
+        self._depth[Priority(job.priority)] += 1
+        if not lane.busy and not lane.scheduled:
+            self._activate(lane)
+        return job.future
+
+    async def send(
+        self,
+        chat_id: int | str,
+        call: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.NORMAL
+    ) -> Any:
+        """Отправить запрос через очередь и дождаться результата"""
+        return await self.submit(chat_id, call, priority)
+
+    def stats(self) -> dict:
+        """Глубина очереди по приоритетам и задержка доставки"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        return {
+            "depth": {priority.name.lower(): count for priority, count in self._depth.items()},
+            "in_flight": self._in_flight,
+            "chats": len(self._lanes),
+            "sent": self._sent,
+            "retried": self._retried,
+            "failed": self._failed,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            },
+        }
+
+    def _prune_idle_lanes(self, now: float):
+        """Забыть чаты без запросов, у которых лимит полностью восстановился"""
+        self._last_prune = now
+        idle = [
+            key for key, lane in self._lanes.items()
+            if not lane.pending and not lane.busy and not lane.scheduled
+            and lane.paused_until <= now and lane.bucket.is_full(now)
+        ]
+        for key in idle:
+            del self._lanes[key]
+
+    def _new_chat_bucket(self, key: str) -> TokenBucket:
+        # Отрицательный id или @username - группа или канал, у них лимит ниже
+        if key.startswith(("-", "@")):
+            return TokenBucket(self._group_chat_rate, self._chat_burst)
+        return TokenBucket(self._private_chat_rate, self._chat_burst)
+
+    def _activate(self, lane: _ChatLane):
+        """Поставить чат в очередь готовых сразу или по таймеру"""
+        lane.scheduled = True
+        wait = lane.ready_in(time.monotonic())
+        if wait > 0:
+            asyncio.get_running_loop().call_later(wait, self._on_lane_timer, lane)
+            return
+        head = lane.pending[0]
+        heapq.heappush(self._ready, (head.priority, head.seq, lane.key))
+        self._ready_event.set()
+
+    def _on_lane_timer(self, lane: _ChatLane):
+        lane.scheduled = False
+        if lane.pending and not lane.busy:
+            self._activate(lane)
+
+    async def _dispatch_loop(self):
+        while True:
+            while not self._ready:
+                self._ready_event.clear()
+                await self._ready_event.wait()
+
+            _, _, key = heapq.heappop(self._ready)
+            lane = self._lanes[key]
+            lane.scheduled = False
+
+            # Общий лимит бота: ждём токен, не отпуская выбранный чат
+            wait = self._global.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._slots.acquire()
+
+            now = time.monotonic()
+            self._global.take(now)
+            lane.bucket.take(now)
+            lane.busy = True
+            job = heapq.heappop(lane.pending)
+            self._depth[Priority(job.priority)] -= 1
+            self._in_flight += 1
+            asyncio.create_task(self._execute(lane, job), context=job.context)
+
+    async def _execute(self, lane: _ChatLane, job: _Job):
+        try:
+            result = await job.call()
+        except TelegramRetryAfter as e:
+            job.attempts += 1
+            lane.paused_until = time.monotonic() + e.retry_after
+            if job.attempts <= self._max_retries:
+                logger.warning(
+                    f"Flood control для чата {lane.key}: повтор через {e.retry_after} сек "
+                    f"(попытка {job.attempts})"
+                )
+                self._retried += 1
+                heapq.heappush(lane.pending, job)
+                self._depth[Priority(job.priority)] += 1
+            else:
+                logger.error(f"Запрос в чат {lane.key} отброшен после {job.attempts} попыток flood control")
+                self._failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self._failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._sent += 1
+            self._latencies.append(time.monotonic() - job.enqueued_at)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            lane.busy = False
+            if lane.pending:
+                self._activate(lane)
+
+
+_send_queue: TelegramSendQueue | None = None
+
+
+def get_send_queue() -> TelegramSendQueue | None:
+    """Очередь отправки (None, если не запущена)"""
+    return _send_queue
+
+
+async def dispatch(
+    chat_id: int | str,
+    call: Callable[[], Awaitable[Any]],
+    priority: Priority = Priority.NORMAL
+) -> Any:
+    """Выполнить запрос к Telegram через очередь отправки.
+
+    Если очередь не запущена (скрипты, тесты), запрос выполняется сразу.
+    """
+    if _send_queue is None:
+        return await call()
+    return await _send_queue.send(chat_id, call, priority)
+
+
+async def broadcast(
+    chat_ids: list[int],
+    send: Callable[[int], Awaitable[Any]],
+    concurrency: int
+) -> int:
+    """Выполнить send(chat_id) для всех получателей параллельно.
+
+    Одновременно идёт не больше concurrency отправок, ошибка одного
+    получателя не мешает остальным. Возвращает число успешных отправок.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send_one(chat_id: int) -> bool:
+        async with semaphore:
+            try:
+                await send(chat_id)
+                return True
+            except Exception as e:
+                logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
+                return False
+
+    results = await asyncio.gather(*(send_one(chat_id) for chat_id in dict.fromkeys(chat_ids)))
+    return sum(results)
+
+
+def start_send_queue() -> TelegramSendQueue:
+    """Запустить очередь исходящих запросов к Telegram"""
+    global _send_queue
+    _send_queue = TelegramSendQueue(
+        global_rate=settings.TELEGRAM_GLOBAL_RATE,
+        private_chat_rate=settings.TELEGRAM_PRIVATE_CHAT_RATE,
+        group_chat_rate=settings.TELEGRAM_GROUP_CHAT_RATE,
+        chat_burst=settings.TELEGRAM_CHAT_BURST,
+        workers=settings.TELEGRAM_SEND_WORKERS,
+        max_retries=settings.TELEGRAM_SEND_MAX_RETRIES
+    )
+    _send_queue.start()
+    logger.info("Очередь отправки в Telegram запущена")
+    return _send_queue
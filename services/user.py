@@ -1,7 +1,112 @@
 """Сервис для работы с пользователями"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, union_all, exists, or_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from database.models.user import User
+from services import pg_events
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Компактный снимок пользователя для обработчиков"""
+    id: int
+    telegram_id: int
+    username: str | None
+    first_name: str | None
+    last_name: str | None
+    phone: str | None
+    contact_info: str | None
+    publication_credits: int
+    is_moderator: bool
+    is_active: bool
+
+
+# Колонки users, из которых строится UserSnapshot
+_SNAPSHOT_COLUMNS = (
+    User.id,
+    User.telegram_id,
+    User.username,
+    User.first_name,
+    User.last_name,
+    User.phone,
+    User.contact_info,
+    User.publication_credits,
+    User.is_moderator,
+    User.is_active,
+)
+
+
+def _snapshot(row) -> UserSnapshot:
+    return UserSnapshot(**{column.key: getattr(row, column.key) for column in _SNAPSHOT_COLUMNS})
+
+
+class _UserCache:
+    """LRU-кэш снимков пользователей по telegram_id с временем жизни"""
+
+    def __init__(self, size: int, ttl: float):
+        self._size = size
+        self._ttl = ttl
+        # telegram_id -> (истекает в time.monotonic, снимок)
+        self._items: OrderedDict[int, tuple[float, UserSnapshot]] = OrderedDict()
+
+    def get(self, telegram_id: int) -> UserSnapshot | None:
+        item = self._items.get(telegram_id)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._items[telegram_id]
+            return None
+        self._items.move_to_end(telegram_id)
+        return item[1]
+
+    def put(self, user: UserSnapshot):
+        if self._ttl <= 0:
+            return
+        self._items[user.telegram_id] = (time.monotonic() + self._ttl, user)
+        self._items.move_to_end(user.telegram_id)
+        while len(self._items) > self._size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id: int):
+        self._items.pop(telegram_id, None)
+
+    def clear(self):
+        self._items.clear()
+
+
+_user_cache = _UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+def invalidate_user(telegram_id: int):
+    """Сбросить кэш пользователя после изменения его строки в users"""
+    _user_cache.invalidate(telegram_id)
+
+
+def _on_user_changed(payload: dict):
+    invalidate_user(payload["telegram_id"])
+
+
+async def _clear_user_cache():
+    _user_cache.clear()
+
+
+def start_user_cache_sync():
+    """Сбрасывать кэш по изменениям пользователей в других процессах.
+
+    Без слушателя NOTIFY (PG_EVENTS_ENABLED=False) снимок на других
+    процессах устаревает до USER_CACHE_TTL.
+    """
+    pg_events.subscribe(pg_events.USER_CHANGED, _on_user_changed)
+    # События за время разрыва соединения потеряны - сбрасываем всё
+    pg_events.on_reconnect(_clear_user_cache)
+    logger.info("Синхронизация кэша пользователей запущена")
 
 
 async def get_or_create_user(
@@ -10,31 +115,110 @@ async def get_or_create_user(
     username: str = None,
     first_name: str = None,
     last_name: str = None
-) -> User:
-    """Получить или создать пользователя"""
+) -> UserSnapshot:
+    """Получить или создать пользователя.
+
+    Повторные обращения обслуживаются из кэша. Промах - один запрос:
+    INSERT ... ON CONFLICT DO UPDATE, который пишет только при изменении
+    профиля, а без изменений возвращает существующую строку.
+    """
+    cached = _user_cache.get(telegram_id)
+    if cached is not None and (cached.username, cached.first_name, cached.last_name) == (
+        username, first_name, last_name
+    ):
+        return cached
+
+    insert_user = pg_insert(User).values(
+        telegram_id=telegram_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name
+    )
+    upserted = (
+        insert_user
+        .on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={
+                "username": insert_user.excluded.username,
+                "first_name": insert_user.excluded.first_name,
+                "last_name": insert_user.excluded.last_name,
+                "updated_at": func.now(),
+            },
+            where=or_(
+                User.username.is_distinct_from(insert_user.excluded.username),
+                User.first_name.is_distinct_from(insert_user.excluded.first_name),
+                User.last_name.is_distinct_from(insert_user.excluded.last_name),
+            )
+        )
+        .returning(*_SNAPSHOT_COLUMNS)
+        .cte("upserted")
+    )
+    # Если профиль не изменился, ON CONFLICT ничего не пишет и не возвращает -
+    # тогда берём строку как есть
     result = await session.execute(
-        select(User).where(User.telegram_id == telegram_id)
+        union_all(
+            select(upserted),
+            select(*_SNAPSHOT_COLUMNS).where(
+                User.telegram_id == telegram_id,
+                ~exists(select(upserted.c.id))
+            )
+        )
     )
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        user = User(
-            telegram_id=telegram_id,
-            username=username,
-            first_name=first_name,
-            last_name=last_name
+    row = result.first()
+    if row is None:
+        # Строку одновременно вставил параллельный запрос - её видно только новому снимку
+        result = await session.execute(
+            select(*_SNAPSHOT_COLUMNS).where(User.telegram_id == telegram_id)
         )
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-    else:
-        # Обновляем данные, если изменились
-        if username != user.username or first_name != user.first_name:
-            user.username = username
-            user.first_name = first_name
-            user.last_name = last_name
-            await session.commit()
-    
+        row = result.one()
+    user = _snapshot(row)
+    await session.commit()
+
+    _user_cache.put(user)
+    return user
+
+
+async def set_user_phone(
+    session: AsyncSession,
+    telegram_id: int,
+    phone: str
+) -> UserSnapshot | None:
+    """Сохранить телефон пользователя"""
+    result = await session.execute(
+        update(User)
+        .where(User.telegram_id == telegram_id)
+        .values(phone=phone)
+        .returning(*_SNAPSHOT_COLUMNS)
+    )
+    row = result.first()
+    await session.commit()
+
+    if row is None:
+        invalidate_user(telegram_id)
+        return None
+    user = _snapshot(row)
+    _user_cache.put(user)
+    return user
+
+
+async def consume_publication_credit(
+    session: AsyncSession,
+    user_id: int
+) -> UserSnapshot | None:
+    """Списать одну доступную публикацию (None, если списывать нечего)"""
+    result = await session.execute(
+        update(User)
+        .where(User.id == user_id, User.publication_credits > 0)
+        .values(publication_credits=User.publication_credits - 1)
+        .returning(*_SNAPSHOT_COLUMNS)
+    )
+    row = result.first()
+    await session.commit()
+
+    if row is None:
+        return None
+    user = _snapshot(row)
+    _user_cache.put(user)
     return user
 
 
@@ -55,5 +239,5 @@ async def update_user_balance(
     user.balance += amount
     await session.commit()
     await session.refresh(user)
+    invalidate_user(user.telegram_id)
     return user
-
@@ -0,0 +1 @@
+"""Инструменты разработчика: профилирование и нагрузочные проверки бота"""
@@ -0,0 +1,253 @@
+"""Бюджет запросов к Bot API по сценариям.
+
+Прогоняет типовые обновления через настоящие роутеры бота с фальшивым
+Bot API (tools.fake_bot) и сравнивает число запросов с бюджетом
+сценария. Работает без сети и без БД: сервисный слой подменяется
+заранее заданными ответами. Код выхода 1, если хоть один сценарий
+вышел за бюджет, поэтому команду можно ставить в CI:
+
+    python -m tools.api_budget
+    python -m tools.api_budget --scenario quick_bid --latency 0.1 --json
+
+Настройки читаются из .env, как у бота, но в Telegram и в БД ничего
+не уходит.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Awaitable, Callable
+from unittest.mock import AsyncMock, patch
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from config import settings
+from database.models.moderation import ModerationQueue, ModerationStatus
+from database.models.product import Product
+from database.models.user import User
+from services.auction import BidOutcome
+from services.moderation import ModerationPage
+from services.user import UserSnapshot
+from tools.fake_bot import RecordingSession, callback_update, create_fake_bot, summarize
+
+BIDDER_ID = 700000001
+SELLER_ID = 700000002
+MODERATOR_IDS = [700000101, 700000102, 700000103]
+PHOTOS_PER_PRODUCT = 3
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Сценарий: одно или несколько обновлений и допустимое число запросов"""
+    name: str
+    description: str
+    budget: int
+    run: Callable[[Bot, Dispatcher], Awaitable[None]]
+
+
+SCENARIOS: dict[str, Scenario] = {}
+
+
+def scenario(name: str, budget: int):
+    """Зарегистрировать сценарий; описание берётся из docstring"""
+    def register(func):
+        SCENARIOS[name] = Scenario(name, func.__doc__ or "", budget, func)
+        return func
+    return register
+
+
+def _user_snapshot(telegram_id: int) -> UserSnapshot:
+    return UserSnapshot(
+        id=telegram_id,
+        telegram_id=telegram_id,
+        username=f"user{telegram_id}",
+        first_name="Test",
+        last_name=None,
+        phone="+998900000000",
+        contact_info=None,
+        publication_credits=0,
+        is_moderator=False,
+        is_active=True,
+    )
+
+
+def _pending_product(product_id: int) -> tuple[ModerationQueue, Product, User]:
+    seller = User(id=product_id, telegram_id=SELLER_ID, username="seller")
+    product = Product(
+        id=product_id,
+        user_id=seller.id,
+        title=f"Букет #{product_id}",
+        product_type="flowers",
+        description="Свежие розы, 25 шт.",
+        photos=json.dumps([f"photo-{product_id}-{i}" for i in range(PHOTOS_PER_PRODUCT)]),
+        price=150_000,
+        contact_info="@seller",
+    )
+    moderation = ModerationQueue(
+        id=product_id,
+        product_id=product_id,
+        user_id=seller.id,
+        status=ModerationStatus.PENDING.value,
+        created_at=datetime.now(timezone.utc),
+    )
+    return moderation, product, seller
+
+
+class _RowSession:
+    """Сессия для кода вне диспетчера: любой запрос возвращает одну строку"""
+
+    def __init__(self, row):
+        self._row = row
+
+    async def execute(self, statement):
+        return SimpleNamespace(first=lambda: self._row)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def _accepted_bid() -> BidOutcome:
+    return BidOutcome(
+        accepted=True,
+        auction_id=1,
+        status="active",
+        current_price=200_000,
+        product_title="Букет роз",
+        seller_telegram_id=SELLER_ID,
+    )
+
+
+def _patch_bidding(outcome: BidOutcome):
+    return (
+        patch("bot.handlers.auction.get_or_create_user", AsyncMock(return_value=_user_snapshot(BIDDER_ID))),
+        patch("bot.handlers.auction.try_place_bid", AsyncMock(return_value=outcome)),
+    )
+
+
+@scenario("quick_bid", budget=3)
+async def quick_bid(bot: Bot, dp: Dispatcher):
+    """Быстрая ставка: ответ на callback, подтверждение участнику, уведомление продавца"""
+    user_patch, bid_patch = _patch_bidding(_accepted_bid())
+    with user_patch, bid_patch:
+        await dp.feed_update(bot, callback_update(BIDDER_ID, "bid:quick:1:50000"))
+
+
+@scenario("amount_bid", budget=3)
+async def amount_bid(bot: Bot, dp: Dispatcher):
+    """Ставка на сумму с кнопки: то же, что быстрая ставка"""
+    user_patch, bid_patch = _patch_bidding(_accepted_bid())
+    with user_patch, bid_patch:
+        await dp.feed_update(bot, callback_update(BIDDER_ID, "bid:amount:1:200000"))
+
+
+@scenario("rejected_bid", budget=1)
+async def rejected_bid(bot: Bot, dp: Dispatcher):
+    """Отклонённая ставка: только всплывающий ответ на callback"""
+    outcome = BidOutcome(accepted=False, auction_id=1, reason="Ставка должна быть выше текущей цены")
+    user_patch, bid_patch = _patch_bidding(outcome)
+    with user_patch, bid_patch:
+        await dp.feed_update(bot, callback_update(BIDDER_ID, "bid:quick:1:50000"))
+
+
+@scenario("custom_bid_prompt", budget=2)
+async def custom_bid_prompt(bot: Bot, dp: Dispatcher):
+    """Запрос своей суммы: подсказка в личку и ответ на callback"""
+    await dp.feed_update(bot, callback_update(BIDDER_ID, "bid:custom:1"))
+
+
+@scenario("moderation_page", budget=8)
+async def moderation_page(bot: Bot, dp: Dispatcher):
+    """Страница модерации из 3 товаров по 3 фото: альбом и текст на товар, навигация, ответ"""
+    page = ModerationPage(
+        items=[_pending_product(product_id) for product_id in (11, 12, 13)],
+        total=7,
+        has_prev=True,
+        has_next=True,
+    )
+    with patch("bot.handlers.admin.is_admin_or_moderator", AsyncMock(return_value=True)), \
+            patch("bot.handlers.moderation.get_pending_moderation_page", AsyncMock(return_value=page)):
+        await dp.feed_update(bot, callback_update(MODERATOR_IDS[0], "moderation_page:2:a:0.10"))
+
+
+@scenario("moderation_fanout", budget=2 * len(set(settings.admin_ids_list) | set(MODERATOR_IDS)))
+async def moderation_fanout(bot: Bot, dp: Dispatcher):
+    """Рассылка нового товара админам и модераторам: альбом и текст каждому"""
+    from bot.handlers.moderation import send_moderation_notification
+
+    _, product, seller = _pending_product(21)
+    with patch("bot.handlers.moderation._moderator_ids", AsyncMock(return_value=list(MODERATOR_IDS))):
+        await send_moderation_notification(bot, _RowSession((product, seller)), product.id)
+
+
+async def run_scenarios(names: list[str], latency: float, jitter: float) -> list[dict]:
+    """Прогнать сценарии и вернуть отчёт по каждому"""
+    from bot.main import create_dispatcher
+
+    bot = create_fake_bot(latency, jitter)
+    session: RecordingSession = bot.session
+    dp = create_dispatcher(MemoryStorage())
+    report = []
+    for name in names:
+        current = SCENARIOS[name]
+        session.reset()
+        started = time.perf_counter()
+        await current.run(bot, dp)
+        elapsed = time.perf_counter() - started
+        calls = session.reset()
+        summary = summarize(calls)
+        report.append({
+            "scenario": name,
+            "description": current.description,
+            "budget": current.budget,
+            "ok": summary["calls"] <= current.budget,
+            "wall_time": elapsed,
+            **summary,
+        })
+    return report
+
+
+def _print_report(report: list[dict]):
+    for item in report:
+        mark = "OK  " if item["ok"] else "FAIL"
+        methods = ", ".join(f"{method}×{count}" for method, count in item["by_method"].items())
+        print(
+            f"{mark} {item['scenario']:<20} {item['calls']:>3}/{item['budget']:<3} "
+            f"{item['payload_bytes']:>6} B  {item['wall_time'] * 1000:>7.1f} мс  {methods}"
+        )
+        if not item["ok"]:
+            print(f"     {item['description']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бюджет запросов к Bot API по сценариям")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Сценарий (можно несколько); по умолчанию все")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа Bot API (сек)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке (сек)")
+    parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+    parser.add_argument("--list", action="store_true", help="Показать сценарии и бюджеты")
+    args = parser.parse_args()
+
+    if args.list:
+        for item in SCENARIOS.values():
+            print(f"{item.name:<20} ≤{item.budget:<3} {item.description}")
+        return 0
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_scenarios(args.scenario or list(SCENARIOS), args.latency, args.jitter))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report)
+    return 0 if all(item["ok"] for item in report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
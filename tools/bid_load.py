@@ -0,0 +1,406 @@
+"""Нагрузочный тест ставок: много участников торгуются за один лот.
+
+N участников одновременно делают ставки через настоящий диспетчер бота
+(кнопка быстрой ставки и ввод своей суммы сообщением) против PostgreSQL
+из .env и фальшивого Bot API (tools.fake_bot). Отчёт в JSON: пропускная
+способность, p50/p95/p99 задержки ставки, аномалии (цена пошла назад,
+потерянные ставки) и ожидание соединения из пула - прогоны разных
+версий можно сравнивать между собой.
+
+Тест создаёт своих пользователей, товар и аукцион и в конце удаляет
+их (--keep оставляет). Запускайте только на локальной или тестовой базе:
+
+    python -m tools.bid_load --bidders 200 --bids 5 --output run.json
+
+Код выхода 1, если найдены аномалии.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from aiogram import Bot, Dispatcher
+from sqlalchemy import delete, func, select
+from config import settings
+from database.connection import async_session_maker, engine
+from database.models.auction import Auction, AuctionStatus
+from database.models.bid import Bid
+from database.models.product import Product
+from database.models.user import User
+from database.pool_metrics import get_pool_metrics
+from services.auction import BidOutcome, QUICK_BID_INCREMENTS
+from services.user import get_or_create_user
+from tools.fake_bot import RecordingSession, callback_update, create_fake_bot, message_update, summarize
+
+# Telegram ID тестовых пользователей: продавец, затем участники подряд
+SELLER_TELEGRAM_ID = 990_000_000
+BIDDER_TELEGRAM_BASE = SELLER_TELEGRAM_ID + 1
+
+logger = logging.getLogger(__name__)
+
+
+class _BidRecorder:
+    """Обёртка над try_place_bid: запоминает результат каждой ставки участника.
+
+    Ставки одного участника идут последовательно, поэтому список его
+    результатов упорядочен по времени.
+    """
+
+    def __init__(self, place_bid):
+        self._place_bid = place_bid
+        self.outcomes: dict[int, list[BidOutcome]] = defaultdict(list)
+        self.errors = 0
+
+    async def __call__(self, session, auction_id, user_id, amount=None, increment=None):
+        try:
+            outcome = await self._place_bid(session, auction_id, user_id, amount=amount, increment=increment)
+        except Exception:
+            self.errors += 1
+            raise
+        self.outcomes[user_id].append(outcome)
+        return outcome
+
+    def last_price(self, user_id: int, default: int) -> int:
+        outcomes = self.outcomes.get(user_id)
+        if not outcomes or outcomes[-1].current_price is None:
+            return default
+        return outcomes[-1].current_price
+
+
+class PoolSampler:
+    """Пиковая и средняя занятость пула за время прогона"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.samples = 0
+        self.checked_out_sum = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def mean_checked_out(self) -> float:
+        return self.checked_out_sum / self.samples if self.samples else 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        metrics = get_pool_metrics()
+        while True:
+            snapshot = metrics.snapshot()
+            self.peak_checked_out = max(self.peak_checked_out, snapshot["checked_out"])
+            self.peak_overflow = max(self.peak_overflow, snapshot["overflow"])
+            self.samples += 1
+            self.checked_out_sum += snapshot["checked_out"]
+            await asyncio.sleep(self.interval)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Перцентиль p (0..1) отсортированного списка"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _create_lot(bidders: int, start_price: int) -> tuple[int, int, dict[int, int]]:
+    """Создать продавца, участников и активный аукцион.
+
+    Возвращает id аукциона, id товара и {id пользователя: номер участника}.
+    """
+    async with async_session_maker() as session:
+        seller = await get_or_create_user(session, SELLER_TELEGRAM_ID, "load_seller", "Seller")
+        user_ids = {}
+        for index in range(bidders):
+            user = await get_or_create_user(
+                session, BIDDER_TELEGRAM_BASE + index, f"load_bidder_{index}", "Bidder"
+            )
+            user_ids[user.id] = index
+
+        now = datetime.now(timezone.utc)
+        product = Product(
+            user_id=seller.id,
+            title="Нагрузочный тест ставок",
+            product_type="other",
+            price=start_price
+        )
+        session.add(product)
+        await session.flush()
+        auction = Auction(
+            product_id=product.id,
+            start_price=start_price,
+            current_price=start_price,
+            status=AuctionStatus.ACTIVE.value,
+            started_at=now,
+            ends_at=now + timedelta(hours=settings.AUCTION_DURATION_HOURS)
+        )
+        session.add(auction)
+        await session.commit()
+        return auction.id, product.id, user_ids
+
+
+async def _final_state(auction_id: int) -> dict:
+    """Состояние аукциона и его ставок в БД после прогона"""
+    async with async_session_maker() as session:
+        auction = (await session.execute(
+            select(Auction.current_price, Auction.top_bid_amount, Auction.bids_count)
+            .where(Auction.id == auction_id)
+        )).one()
+        bids = (await session.execute(
+            select(func.max(Bid.amount), func.count(Bid.id)).where(Bid.auction_id == auction_id)
+        )).one()
+    return {
+        "current_price": auction.current_price,
+        "top_bid_amount": auction.top_bid_amount,
+        "bids_count": auction.bids_count,
+        "max_bid_amount": bids[0],
+        "bid_rows": bids[1],
+    }
+
+
+async def _cleanup(auction_id: int, product_id: int, bidders: int):
+    """Удалить всё, что создал тест"""
+    async with async_session_maker() as session:
+        await session.execute(delete(Bid).where(Bid.auction_id == auction_id))
+        await session.execute(delete(Auction).where(Auction.id == auction_id))
+        await session.execute(delete(Product).where(Product.id == product_id))
+        await session.execute(
+            delete(User).where(User.telegram_id.between(SELLER_TELEGRAM_ID, BIDDER_TELEGRAM_BASE + bidders - 1))
+        )
+        await session.commit()
+
+
+def _find_anomalies(
+    recorder: _BidRecorder,
+    final: dict,
+    start_price: int,
+    increment: int,
+    quick_only: bool
+) -> dict:
+    """Сверить результаты ставок между собой и с итоговым состоянием БД"""
+    backwards = 0
+    accepted_prices = []
+    accepted_bidders = set()
+    for user_id, outcomes in recorder.outcomes.items():
+        seen = [outcome.current_price for outcome in outcomes if outcome.current_price is not None]
+        backwards += sum(1 for previous, current in zip(seen, seen[1:]) if current < previous)
+        for outcome in outcomes:
+            if outcome.accepted:
+                accepted_prices.append(outcome.current_price)
+                accepted_bidders.add(user_id)
+
+    anomalies = {
+        # Участник увидел цену ниже той, что видел раньше
+        "price_backwards": backwards,
+        # Две принятые ставки с одной и той же итоговой ценой - одна из них потеряна
+        "duplicate_accepted_prices": sum(
+            count - 1 for count in Counter(accepted_prices).values() if count > 1
+        ),
+        "final_price_mismatch": int(final["current_price"] != max(accepted_prices, default=start_price)),
+        "top_bid_mismatch": int(bool(accepted_prices) and final["top_bid_amount"] != final["current_price"]),
+        "bid_rows_mismatch": int(
+            final["bid_rows"] != len(accepted_bidders)
+            or (bool(accepted_prices) and final["max_bid_amount"] != final["current_price"])
+        ),
+        "bids_count_mismatch": int(final["bids_count"] != len(accepted_bidders)),
+    }
+    if quick_only:
+        # Каждая принятая быстрая ставка поднимает цену ровно на increment
+        expected = start_price + increment * len(accepted_prices)
+        anomalies["lost_increments"] = (expected - final["current_price"]) // increment
+    return anomalies
+
+
+async def _bidder(
+    index: int,
+    user_id: int,
+    bot: Bot,
+    dp: Dispatcher,
+    auction_id: int,
+    args: argparse.Namespace,
+    recorder: _BidRecorder,
+    latencies: list[float],
+    go: asyncio.Event
+) -> int:
+    """Один участник: args.bids ставок подряд; возвращает число сбоев диспетчера"""
+    telegram_id = BIDDER_TELEGRAM_BASE + index
+    username = f"load_bidder_{index}"
+    rnd = random.Random(args.seed + index)
+    failures = 0
+    await go.wait()
+    for _ in range(args.bids):
+        if args.think:
+            await asyncio.sleep(rnd.uniform(0, args.think))
+        try:
+            if rnd.random() < args.custom_ratio:
+                # Своя сумма: кнопка, затем сообщение с суммой чуть выше последней увиденной цены
+                await dp.feed_update(bot, callback_update(telegram_id, f"bid:custom:{auction_id}", username, "Bidder"))
+                amount = recorder.last_price(user_id, args.start_price) + args.increment
+                update = message_update(telegram_id, str(amount), username, "Bidder")
+            else:
+                update = callback_update(
+                    telegram_id, f"bid:quick:{auction_id}:{args.increment}", username, "Bidder"
+                )
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            failures += 1
+            logger.error(f"Участник {index}: {e!r}")
+    return failures
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Прогнать тест и вернуть отчёт"""
+    import bot.handlers.auction as auction_handlers
+    from bot.main import create_dispatcher
+
+    auction_id, product_id, user_ids = await _create_lot(args.bidders, args.start_price)
+    try:
+        bid_engine = None
+        if settings.BID_ENGINE_MODE == "memory":
+            from services.bid_engine import start_bid_engine
+            bid_engine = await start_bid_engine()
+        if args.send_queue:
+            from services.telegram_queue import start_send_queue
+            start_send_queue()
+
+        bot = create_fake_bot(args.api_latency)
+        session: RecordingSession = bot.session
+        dp = create_dispatcher()
+        recorder = _BidRecorder(auction_handlers.try_place_bid)
+        auction_handlers.try_place_bid = recorder
+
+        pool = get_pool_metrics()
+        pool_before = pool.snapshot()
+        histogram_before = pool.histogram()
+        sampler = PoolSampler()
+        latencies: list[float] = []
+        go = asyncio.Event()
+        bidders = [
+            asyncio.create_task(
+                _bidder(index, user_id, bot, dp, auction_id, args, recorder, latencies, go)
+            )
+            for user_id, index in user_ids.items()
+        ]
+
+        sampler.start()
+        started = time.perf_counter()
+        go.set()
+        failures = sum(await asyncio.gather(*bidders))
+        duration = time.perf_counter() - started
+        await sampler.stop()
+
+        if bid_engine is not None:
+            await bid_engine.flush()
+        final = await _final_state(auction_id)
+        pool_after = pool.snapshot()
+    finally:
+        if not args.keep:
+            await _cleanup(auction_id, product_id, args.bidders)
+
+    outcomes = [outcome for user_outcomes in recorder.outcomes.values() for outcome in user_outcomes]
+    accepted = sum(1 for outcome in outcomes if outcome.accepted)
+    checkouts = pool_after["checkouts"] - pool_before["checkouts"]
+    wait_sum = pool_after["wait_sum"] - pool_before["wait_sum"]
+    wait_histogram = {
+        ("+Inf" if bound == float("inf") else str(bound)): after - before
+        for (bound, before), (_, after) in zip(histogram_before, pool.histogram())
+    }
+    latencies.sort()
+
+    return {
+        "config": {
+            "bidders": args.bidders,
+            "bids_per_bidder": args.bids,
+            "increment": args.increment,
+            "start_price": args.start_price,
+            "custom_ratio": args.custom_ratio,
+            "think": args.think,
+            "api_latency": args.api_latency,
+            "send_queue": args.send_queue,
+            "bid_engine_mode": settings.BID_ENGINE_MODE,
+            "db_pool_size": settings.DB_POOL_SIZE,
+            "db_pool_max_overflow": settings.DB_POOL_MAX_OVERFLOW,
+        },
+        "duration": duration,
+        "bids": {
+            "sent": len(latencies),
+            "accepted": accepted,
+            "rejected": len(outcomes) - accepted,
+            "errors": recorder.errors + failures,
+        },
+        "throughput": len(latencies) / duration if duration else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000 if latencies else 0.0,
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        },
+        "anomalies": _find_anomalies(
+            recorder, final, args.start_price, args.increment, quick_only=args.custom_ratio == 0
+        ),
+        "final": final,
+        "pool": {
+            "checkouts": checkouts,
+            "timeouts": pool_after["timeouts"] - pool_before["timeouts"],
+            "wait_avg_ms": wait_sum / checkouts * 1000 if checkouts else 0.0,
+            "wait_max_ms": pool_after["wait_max"] * 1000,
+            "peak_checked_out": sampler.peak_checked_out,
+            "peak_overflow": sampler.peak_overflow,
+            "wait_histogram": wait_histogram,
+        },
+        "telegram": summarize(session.reset()),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест ставок на один лот")
+    parser.add_argument("--bidders", type=int, default=100, help="Участников одновременно")
+    parser.add_argument("--bids", type=int, default=5, help="Ставок на участника")
+    parser.add_argument("--increment", type=int, default=50_000, choices=QUICK_BID_INCREMENTS,
+                        help="Шаг быстрой ставки (сум)")
+    parser.add_argument("--start-price", type=int, default=100_000, help="Стартовая цена лота (сум)")
+    parser.add_argument("--custom-ratio", type=float, default=0.0,
+                        help="Доля ставок своей суммой (кнопка и сообщение), 0..1")
+    parser.add_argument("--think", type=float, default=0.0, help="Пауза участника перед ставкой, до (сек)")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Задержка ответа Bot API (сек)")
+    parser.add_argument("--send-queue", action="store_true",
+                        help="Отправлять через очередь с лимитами Telegram, как в боте")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно случайных решений участников")
+    parser.add_argument("--keep", action="store_true", help="Не удалять созданные данные")
+    parser.add_argument("--output", help="Файл для отчёта JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    async def run_and_dispose() -> dict:
+        try:
+            return await run(args)
+        finally:
+            await engine.dispose()
+
+    report = asyncio.run(run_and_dispose())
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any(report["anomalies"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Фальшивый Bot API: записывает исходящие запросы вместо отправки в Telegram"""
+import asyncio
+import itertools
+import json
+import random
+import time
+import typing
+from collections import Counter
+from dataclasses import dataclass
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message, Update, User
+
+# Токен фальшивого бота: запросы всё равно никуда не уходят
+FAKE_BOT_TOKEN = "123456789:fake-bot-token"
+
+_update_ids = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class ApiCall:
+    """Один запрос к Bot API"""
+    method: str
+    chat_id: int | str | None
+    payload_bytes: int
+    latency: float  # Смоделированная задержка ответа (сек)
+
+
+class RecordingSession(BaseSession):
+    """Сессия Bot, которая отвечает сама и записывает каждый запрос.
+
+    Ответ строится по типу результата метода (Message, список Message,
+    User, True), задержка моделируется asyncio.sleep: latency плюс
+    случайная добавка до jitter. Размер запроса считается по тем же
+    полям формы, что отправила бы AiohttpSession.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: list[ApiCall] = []
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        self.calls.append(
+            ApiCall(
+                method=method.__api_method__,
+                chat_id=getattr(method, "chat_id", None),
+                payload_bytes=self._payload_size(bot, method),
+                latency=delay,
+            )
+        )
+        content = json.dumps({"ok": True, "result": self._fake_result(bot, method)})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError("Фальшивый Bot API не отдаёт файлы")
+        yield b""
+
+    async def close(self):
+        pass
+
+    def reset(self) -> list[ApiCall]:
+        """Вернуть записанные запросы и начать запись заново"""
+        calls, self.calls = self.calls, []
+        return calls
+
+    def _payload_size(self, bot: Bot, method: TelegramMethod) -> int:
+        files: dict = {}
+        size = 0
+        for key, value in method.model_dump(warnings=False).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if value:
+                size += len(key) + len(str(value).encode())
+        return size
+
+    def _fake_message(self, chat_id) -> dict:
+        chat_id = chat_id if isinstance(chat_id, int) else -1000000000000
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "channel"},
+        }
+
+    def _fake_result(self, bot: Bot, method: TelegramMethod):
+        returning = method.__returning__
+        options = typing.get_args(returning) if typing.get_origin(returning) is typing.Union else (returning,)
+        chat_id = getattr(method, "chat_id", None)
+        if typing.get_origin(returning) is list and typing.get_args(returning)[0] is Message:
+            return [self._fake_message(chat_id) for _ in getattr(method, "media", ())]
+        if Message in options and chat_id is not None:
+            return self._fake_message(chat_id)
+        if User in options:
+            return {"id": bot.id, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if bool in options:
+            return True
+        raise NotImplementedError(f"Фальшивый Bot API не умеет отвечать на {method.__api_method__}")
+
+
+def create_fake_bot(latency: float = 0.0, jitter: float = 0.0) -> Bot:
+    """Bot с RecordingSession и теми же настройками по умолчанию, что у create_bot"""
+    return Bot(
+        token=FAKE_BOT_TOKEN,
+        session=RecordingSession(latency, jitter),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+
+def summarize(calls: list[ApiCall]) -> dict:
+    """Сводка по запросам: количество и объём по методам, суммарная задержка"""
+    by_method = Counter(call.method for call in calls)
+    return {
+        "calls": len(calls),
+        "payload_bytes": sum(call.payload_bytes for call in calls),
+        "latency": sum(call.latency for call in calls),
+        "by_method": dict(sorted(by_method.items())),
+    }
+
+
+def _from_user(user_id: int, username: str | None, first_name: str) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": first_name, "username": username}
+
+
+def _private_message(user_id: int, text: str, sender: dict | None = None) -> dict:
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "text": text,
+    }
+    if sender is not None:
+        message["from"] = sender
+    return message
+
+
+def callback_update(user_id: int, data: str, username: str | None = None, first_name: str = "Test") -> Update:
+    """Нажатие inline-кнопки в личке с ботом"""
+    update_id = next(_update_ids)
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _from_user(user_id, username, first_name),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": _private_message(user_id, "…"),
+        },
+    })
+
+
+def message_update(user_id: int, text: str, username: str | None = None, first_name: str = "Test") -> Update:
+    """Текстовое сообщение пользователя в личке с ботом"""
+    return Update.model_validate({
+        "update_id": next(_update_ids),
+        "message": _private_message(user_id, text, _from_user(user_id, username, first_name)),
+    })
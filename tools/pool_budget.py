@@ -0,0 +1,492 @@
+"""Занятость пула БД во время запросов к Bot API по сценариям.
+
+Прогоняет обработчики ставки, подтверждения публикации и одобрения
+модератором через настоящий диспетчер с медленным фальшивым Bot API
+(tools.fake_bot). Вместо БД - сессия, которая, как AsyncSession, берёт
+соединение из модели пула на первом запросе и возвращает его на
+commit/rollback/close, а на запросы отвечает заранее заданными
+объектами. Сервисы из одного сложного запроса (upsert пользователя,
+ставка, списание публикации) подменяются заглушками с той же границей
+транзакции: один запрос и commit. Остальной код - настоящий.
+
+Сценарий не проходит, если хоть один запрос к Telegram ушёл, пока его
+же обработчик держал соединение, или если пик занятых соединений во
+время запросов к Telegram выше --max-checked-out. Работает без сети
+и без БД, код выхода 1 при провале:
+
+    python -m tools.pool_budget
+    python -m tools.pool_budget --scenario confirm_publication --flows 50 --json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import sys
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Awaitable, Callable
+from unittest.mock import patch
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from config import settings
+from database.models.auction import Auction, AuctionStatus
+from database.models.moderation import ModerationQueue, ModerationStatus
+from database.models.product import Product
+from database.models.user import User
+from services.auction import BidOutcome
+from services.user import UserSnapshot
+from tools.fake_bot import create_fake_bot, callback_update, summarize
+
+SELLER_ID = 700000002
+MODERATOR_ID = 700000101
+# Telegram ID участников сценария: у каждого потока свой пользователь
+FLOW_USER_BASE = 700100000
+PRODUCT_ID = 31
+AUCTION_ID = 1
+
+
+class _Flow:
+    """Соединения, которые держит один обработчик вместе со своими фоновыми задачами"""
+
+    def __init__(self):
+        self.connections = 0
+
+
+_current_flow: ContextVar[_Flow | None] = ContextVar("pool_budget_flow", default=None)
+
+
+class _PoolModel:
+    """Счётчики занятых соединений и запросов к Telegram"""
+
+    def __init__(self):
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.api_calls = 0
+        # Запросы к Telegram, во время которых свой обработчик держал соединение
+        self.held_api_calls = 0
+        # Пик занятых соединений в момент запроса к Telegram
+        self.peak_during_api = 0
+
+    def checkout(self):
+        self.checked_out += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def checkin(self):
+        self.checked_out -= 1
+
+
+class _PoolProbe(BaseRequestMiddleware):
+    """Middleware сессии Bot: занятость пула в момент каждого запроса"""
+
+    def __init__(self, pool: _PoolModel):
+        self._pool = pool
+
+    async def __call__(self, make_request, bot, method):
+        pool = self._pool
+        pool.api_calls += 1
+        pool.peak_during_api = max(pool.peak_during_api, pool.checked_out)
+        flow = _current_flow.get()
+        if flow is not None and flow.connections:
+            pool.held_api_calls += 1
+            logging.getLogger(__name__).debug(f"{method.__api_method__} при занятом соединении")
+        return await make_request(bot, method)
+
+
+class _Result:
+    """Результат запроса в объёме, который нужен обработчикам и сервисам"""
+
+    def __init__(self, rows: list[tuple]):
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+    def one(self):
+        return self._rows[0]
+
+    def all(self):
+        return list(self._rows)
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+    def scalar_one(self):
+        return self._rows[0][0]
+
+    def scalar_one_or_none(self):
+        return self.scalar()
+
+    def scalars(self):
+        values = [row[0] for row in self._rows]
+        return SimpleNamespace(all=lambda: values, first=lambda: values[0] if values else None)
+
+
+class _PoolSession:
+    """AsyncSession без БД с автоначалом транзакции, как у SQLAlchemy.
+
+    Соединение берётся из пула на первом запросе (execute, flush, refresh)
+    и возвращается на commit, rollback или close. SELECT отвечает объектами
+    из world по сущностям запроса, остальные запросы строк не возвращают.
+    """
+
+    _ids = itertools.count(1000)
+
+    def __init__(self, pool: _PoolModel, world: dict, db_latency: float):
+        self._pool = pool
+        self._world = world
+        self._db_latency = db_latency
+        self._holder: _Flow | None = None
+        self._connected = False
+        self._new: list = []
+        # LazySession подписывается на after_begin у sync_session
+        self.sync_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def execute(self, statement, *args, **kwargs) -> _Result:
+        await self._begin()
+        return _Result(self._respond(statement))
+
+    def add(self, instance):
+        self._new.append(instance)
+
+    def add_all(self, instances):
+        self._new.extend(instances)
+
+    async def flush(self):
+        if not self._new:
+            return
+        await self._begin()
+        for instance in self._new:
+            if getattr(instance, "id", None) is None:
+                instance.id = next(self._ids)
+        self._new.clear()
+
+    async def refresh(self, instance):
+        await self._begin()
+
+    async def commit(self):
+        await self.flush()
+        self._release()
+
+    async def rollback(self):
+        self._new.clear()
+        self._release()
+
+    async def close(self):
+        self._release()
+
+    async def _begin(self):
+        if not self._connected:
+            self._connected = True
+            self._pool.checkout()
+            self._holder = _current_flow.get()
+            if self._holder is not None:
+                self._holder.connections += 1
+        if self._db_latency:
+            await asyncio.sleep(self._db_latency)
+
+    def _release(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._pool.checkin()
+        if self._holder is not None:
+            self._holder.connections -= 1
+            self._holder = None
+
+    def _respond(self, statement) -> list[tuple]:
+        if not isinstance(statement, Select):
+            return []
+        row = []
+        for description in statement.column_descriptions:
+            entity = description.get("entity")
+            instance = self._world.get(entity)
+            if instance is None:
+                return []
+            if description["expr"] is entity:
+                row.append(instance)
+            else:
+                row.append(getattr(instance, description["name"]))
+        return [tuple(row)]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Сценарий: подготовка мира и обновление одного потока"""
+    name: str
+    description: str
+    world: Callable[[], dict]
+    run: Callable[[Bot, Dispatcher, int], Awaitable[None]]
+
+
+SCENARIOS: dict[str, Scenario] = {}
+
+
+def scenario(name: str, world: Callable[[], dict]):
+    """Зарегистрировать сценарий; описание берётся из docstring"""
+    def register(func):
+        SCENARIOS[name] = Scenario(name, func.__doc__ or "", world, func)
+        return func
+    return register
+
+
+def _user_snapshot(telegram_id: int) -> UserSnapshot:
+    return UserSnapshot(
+        id=telegram_id,
+        telegram_id=telegram_id,
+        username=f"user{telegram_id}",
+        first_name="Test",
+        last_name=None,
+        phone="+998900000000",
+        contact_info=None,
+        publication_credits=1,
+        is_moderator=False,
+        is_active=True,
+    )
+
+
+def _world(moderation_status: str | None) -> dict:
+    """Товар с аукционом, модератор и (если задано) заявка на модерацию"""
+    moderator = User(id=2, telegram_id=MODERATOR_ID, username="moderator", is_moderator=True)
+    product = Product(
+        id=PRODUCT_ID,
+        user_id=moderator.id,
+        title="Букет роз",
+        product_type="flowers",
+        description="Город: Ташкент\nСвежесть: сегодня",
+        photos=json.dumps([f"photo-{PRODUCT_ID}-{i}" for i in range(3)]),
+        price=150_000,
+        contact_info="@seller",
+    )
+    auction = Auction(
+        id=AUCTION_ID,
+        product_id=PRODUCT_ID,
+        start_price=150_000,
+        current_price=150_000,
+        status=AuctionStatus.PENDING.value,
+        bids_count=0,
+    )
+    world = {User: moderator, Product: product, Auction: auction}
+    if moderation_status is not None:
+        world[ModerationQueue] = ModerationQueue(
+            id=PRODUCT_ID,
+            product_id=PRODUCT_ID,
+            user_id=moderator.id,
+            status=moderation_status,
+        )
+    return world
+
+
+async def _get_or_create_user(session, telegram_id, *args, **kwargs) -> UserSnapshot:
+    """Заглушка upsert пользователя: один запрос и commit"""
+    await session.execute(select(User).where(User.telegram_id == telegram_id))
+    await session.commit()
+    return _user_snapshot(telegram_id)
+
+
+async def _consume_publication_credit(session, user_id) -> UserSnapshot:
+    """Заглушка списания публикации: один запрос и commit"""
+    await session.execute(select(User).where(User.id == user_id))
+    await session.commit()
+    return _user_snapshot(user_id)
+
+
+async def _try_place_bid(session, auction_id, user_id, amount=None, increment=None) -> BidOutcome:
+    """Заглушка ставки: один запрос и commit, ставка всегда принята"""
+    await session.execute(select(Auction).where(Auction.id == auction_id))
+    await session.commit()
+    return BidOutcome(
+        accepted=True,
+        auction_id=auction_id,
+        status=AuctionStatus.ACTIVE.value,
+        current_price=200_000,
+        product_title="Букет роз",
+        seller_telegram_id=SELLER_ID,
+    )
+
+
+@scenario("quick_bid", world=lambda: _world(None))
+async def quick_bid(bot: Bot, dp: Dispatcher, user_id: int):
+    """Быстрая ставка: ответ на callback, подтверждение участнику, уведомление продавца"""
+    await dp.feed_update(bot, callback_update(user_id, f"bid:quick:{AUCTION_ID}:50000"))
+
+
+@scenario("confirm_publication", world=lambda: _world(None))
+async def confirm_publication(bot: Bot, dp: Dispatcher, user_id: int):
+    """Подтверждение аукциона: товар, аукцион и заявка в БД, ответ автору, рассылка модераторам"""
+    from bot.handlers.publication import PublicationStates
+
+    context = dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+    await context.set_state(PublicationStates.confirming)
+    await context.set_data({
+        "title": "Букет роз",
+        "product_type": "flowers",
+        "price": 150_000,
+        "publication_type": "auction",
+        "photos": [f"photo-{user_id}-{i}" for i in range(3)],
+        "contact_info": "@seller",
+    })
+    await dp.feed_update(bot, callback_update(user_id, "publication:confirm"))
+
+
+@scenario("moderation_approve", world=lambda: _world(ModerationStatus.PENDING.value))
+async def moderation_approve(bot: Bot, dp: Dispatcher, user_id: int):
+    """Одобрение модератором: заявка в БД, публикация аукциона в канал, правка карточки"""
+    await dp.feed_update(bot, callback_update(MODERATOR_ID, f"moderation:approve:{PRODUCT_ID}"))
+
+
+class _ErrorCounter(logging.Handler):
+    """Ошибки, которые обработчики поймали и только записали в лог"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+async def _run_scenario(
+    dp: Dispatcher,
+    current: Scenario,
+    flows: int,
+    rate: float,
+    latency: float,
+    db_latency: float,
+    max_checked_out: int
+) -> dict:
+    import bot.handlers.moderation as moderation_handlers
+
+    pool = _PoolModel()
+    world = current.world()
+    bot = create_fake_bot(latency)
+    bot.session.middleware(_PoolProbe(pool))
+    errors = _ErrorCounter()
+    logging.getLogger().addHandler(errors)
+
+    def session_maker():
+        return _PoolSession(pool, world, db_latency)
+
+    async def flow(index: int) -> int:
+        _current_flow.set(_Flow())
+        try:
+            await current.run(bot, dp, FLOW_USER_BASE + index)
+        except Exception as e:
+            logging.getLogger(__name__).debug(f"Поток {index}: {e!r}")
+            return 1
+        return 0
+
+    patches = (
+        patch("bot.middlewares.database.async_session_maker", session_maker),
+        patch("bot.middlewares.database.event", SimpleNamespace(listen=lambda *args, **kwargs: None)),
+        patch("bot.handlers.moderation.async_session_maker", session_maker),
+        patch("bot.handlers.auction.get_or_create_user", _get_or_create_user),
+        patch("bot.handlers.auction.try_place_bid", _try_place_bid),
+        patch("bot.handlers.publication.get_or_create_user", _get_or_create_user),
+        patch("bot.handlers.publication.consume_publication_credit", _consume_publication_credit),
+    )
+    try:
+        for item in patches:
+            item.start()
+        tasks = []
+        # Потоки приходят равномерно с частотой rate, а не все разом
+        for index in range(flows):
+            tasks.append(asyncio.create_task(flow(index)))
+            await asyncio.sleep(1 / rate)
+        failures = sum(await asyncio.gather(*tasks))
+        # Рассылки, запущенные обработчиками в фоне
+        while moderation_handlers._background_tasks:
+            await asyncio.gather(*list(moderation_handlers._background_tasks))
+    finally:
+        for item in reversed(patches):
+            item.stop()
+        logging.getLogger().removeHandler(errors)
+
+    failures += errors.count
+    return {
+        "scenario": current.name,
+        "description": current.description,
+        "flows": flows,
+        "failures": failures,
+        "api_calls": pool.api_calls,
+        "held_api_calls": pool.held_api_calls,
+        "peak_checked_out": pool.peak_checked_out,
+        "peak_during_api": pool.peak_during_api,
+        "max_checked_out": max_checked_out,
+        "ok": failures == 0 and pool.held_api_calls == 0 and pool.peak_during_api <= max_checked_out,
+        "telegram": summarize(bot.session.reset()),
+    }
+
+
+async def run_scenarios(
+    names: list[str],
+    flows: int,
+    rate: float,
+    latency: float,
+    db_latency: float,
+    max_checked_out: int
+) -> list[dict]:
+    """Прогнать сценарии и вернуть отчёт по каждому"""
+    from bot.main import create_dispatcher
+
+    dp = create_dispatcher(MemoryStorage())
+    return [
+        await _run_scenario(dp, SCENARIOS[name], flows, rate, latency, db_latency, max_checked_out)
+        for name in names
+    ]
+
+
+def _print_report(report: list[dict]):
+    for item in report:
+        mark = "OK  " if item["ok"] else "FAIL"
+        print(
+            f"{mark} {item['scenario']:<20} пик в запросах к API {item['peak_during_api']}/{item['max_checked_out']}  "
+            f"запросов при занятом соединении {item['held_api_calls']}/{item['api_calls']}  "
+            f"ошибок {item['failures']}"
+        )
+        if not item["ok"]:
+            print(f"     {item['description']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Занятость пула БД во время запросов к Bot API")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Сценарий (можно несколько); по умолчанию все")
+    parser.add_argument("--flows", type=int, default=30, help="Обновлений на сценарий")
+    parser.add_argument("--rate", type=float, default=100.0, help="Новых обновлений в секунду")
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка ответа Bot API (сек)")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Задержка запроса к БД (сек)")
+    parser.add_argument("--max-checked-out", type=int, default=10,
+                        help="Допустимый пик занятых соединений во время запросов к API")
+    parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_scenarios(
+        args.scenario or list(SCENARIOS),
+        args.flows,
+        args.rate,
+        args.latency,
+        args.db_latency,
+        args.max_checked_out
+    ))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report)
+    return 0 if all(item["ok"] for item in report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
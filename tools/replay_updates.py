@@ -0,0 +1,199 @@
+"""Воспроизведение записанных обновлений Telegram.
+
+Читает файлы gzip JSONL, записанные bot.middlewares.update_recorder
+(UPDATE_RECORD_PATH), и подаёт обновления в диспетчер бота
+(bot.main.create_dispatcher): с исходными интервалами, ускоренными
+в N раз (--speed N) или без пауз (--max). Так можно повторить
+настоящую форму нагрузки - разошедшийся пост в канале, всплеск ставок
+перед закрытием - и посмотреть, как справляется стек обработчиков.
+
+Bot API фальшивый (tools.fake_bot), а БД и хранилище FSM берутся из
+.env: обработчики пишут в базу как настоящие, поэтому запускайте
+только на тестовой базе. Фоновые планировщики (завершение аукционов,
+напоминания) не запускаются - воспроизводится только работа по
+входящим обновлениям.
+
+    python -m tools.replay_updates updates.jsonl.gz --speed 10
+    python -m tools.replay_updates updates.jsonl.gz --max --concurrency 200 --output replay.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Iterator
+from aiogram.types import Update
+from config import settings
+from database.connection import engine
+from database.pool_metrics import get_pool_metrics
+from tools.bid_load import percentile
+from tools.fake_bot import RecordingSession, create_fake_bot, summarize
+
+logger = logging.getLogger(__name__)
+
+
+def read_records(paths: list[str]) -> Iterator[dict]:
+    """Записи из файлов по порядку; оборванный конец файла пропускается"""
+    for path in paths:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            # Запись прервалась вместе с процессом бота: всё до обрыва читается
+            logger.warning(f"{path}: файл оборван ({e}), воспроизводится до места обрыва")
+
+
+async def _start_services(bot, send_queue: bool):
+    """Сервисы, через которые обработчики работают в боте (как в bot.main)"""
+    from services.roles import start_role_registry
+    from services.card_updater import start_card_updater
+
+    await start_role_registry()
+    if send_queue:
+        from services.telegram_queue import start_send_queue
+        start_send_queue()
+    if settings.BID_ENGINE_MODE == "memory":
+        from services.bid_engine import start_bid_engine
+        await start_bid_engine()
+    start_card_updater(bot)
+
+
+def _latency_summary(values: list[float]) -> dict:
+    values.sort()
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50) * 1000,
+        "p95": percentile(values, 0.95) * 1000,
+        "p99": percentile(values, 0.99) * 1000,
+        "max": values[-1] * 1000 if values else 0.0,
+    }
+
+
+async def replay(args: argparse.Namespace) -> dict:
+    """Воспроизвести файлы и вернуть отчёт"""
+    from bot.main import create_dispatcher
+
+    bot = create_fake_bot(args.api_latency)
+    session: RecordingSession = bot.session
+    await _start_services(bot, args.send_queue)
+    dp = create_dispatcher()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    tasks: set[asyncio.Task] = set()
+
+    async def handle(update: Update):
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors[update.event_type] += 1
+            logger.warning(f"Обновление {update.update_id}: {e!r}")
+        finally:
+            latencies[update.event_type].append(time.perf_counter() - started)
+            semaphore.release()
+
+    pool = get_pool_metrics()
+    pool_before = pool.snapshot()
+    first_ts = last_ts = None
+    # Насколько подача отставала от расписания записи (сек)
+    max_lag = 0.0
+    fed = 0
+    started = time.perf_counter()
+    for record in read_records(args.files):
+        if args.limit and fed >= args.limit:
+            break
+        if first_ts is None:
+            first_ts = record["ts"]
+        last_ts = record["ts"]
+        if not args.max:
+            delay = started + (record["ts"] - first_ts) / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        await semaphore.acquire()
+        task = asyncio.create_task(handle(Update.model_validate(record["update"])))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        fed += 1
+    await asyncio.gather(*list(tasks))
+    duration = time.perf_counter() - started
+    pool_after = pool.snapshot()
+
+    checkouts = pool_after["checkouts"] - pool_before["checkouts"]
+    wait_sum = pool_after["wait_sum"] - pool_before["wait_sum"]
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "config": {
+            "files": args.files,
+            "speed": "max" if args.max else args.speed,
+            "concurrency": args.concurrency,
+            "api_latency": args.api_latency,
+            "send_queue": args.send_queue,
+            "bid_engine_mode": settings.BID_ENGINE_MODE,
+            "fsm_storage": settings.FSM_STORAGE,
+            "db_pool_size": settings.DB_POOL_SIZE,
+            "db_pool_max_overflow": settings.DB_POOL_MAX_OVERFLOW,
+        },
+        "updates": {"fed": fed, "errors": sum(errors.values()), "errors_by_type": dict(errors)},
+        "recorded_span": (last_ts - first_ts) if first_ts is not None else 0.0,
+        "duration": duration,
+        "throughput": fed / duration if duration else 0.0,
+        "max_schedule_lag_ms": max_lag * 1000,
+        "latency_ms": _latency_summary(all_latencies),
+        "latency_ms_by_type": {
+            event_type: _latency_summary(values) for event_type, values in sorted(latencies.items())
+        },
+        "pool": {
+            "checkouts": checkouts,
+            "timeouts": pool_after["timeouts"] - pool_before["timeouts"],
+            "wait_avg_ms": wait_sum / checkouts * 1000 if checkouts else 0.0,
+            "wait_max_ms": pool_after["wait_max"] * 1000,
+        },
+        "telegram": summarize(session.reset()),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений Telegram")
+    parser.add_argument("files", nargs="+", help="Файлы gzip JSONL из UPDATE_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение относительно записи (1 - как было)")
+    parser.add_argument("--max", action="store_true", help="Подавать без пауз, насколько хватит сил")
+    parser.add_argument("--concurrency", type=int, default=100, help="Обновлений в обработке одновременно")
+    parser.add_argument("--limit", type=int, default=0, help="Воспроизвести только первые N обновлений")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Задержка ответа Bot API (сек)")
+    parser.add_argument("--send-queue", action="store_true",
+                        help="Отправлять через очередь с лимитами Telegram, как в боте")
+    parser.add_argument("--output", help="Файл для отчёта JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed должен быть больше 0")
+
+    logging.basicConfig(level=logging.WARNING)
+
+    async def run_and_dispose() -> dict:
+        try:
+            return await replay(args)
+        finally:
+            await engine.dispose()
+
+    report = asyncio.run(run_and_dispose())
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Занятость пула БД при медленном Bot API.
+
+Запускает поток публикаций против PostgreSQL из .env и фальшивого Bot API
+(tools.fake_bot) с заданной задержкой ответа: чётные - рассылка карточки
+модераторам (send_moderation_notification), нечётные - публикация аукциона
+в канал (publish_auction_to_channel). Оба пути читают БД в короткой фазе
+db_phase и отпускают соединение до запросов к Telegram, поэтому занятость
+пула не должна расти вместе с задержкой API. Если соединение держится
+через сетевые вызовы, пик упирается в DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW
+и появляются ожидания и таймауты пула.
+
+Тест создаёт своих пользователей, товары и аукционы и в конце удаляет
+их (--keep оставляет). Запускайте только на локальной или тестовой базе:
+
+    python -m tools.slow_api_pool --flows 200 --rate 50 --api-latency 0.5
+
+Код выхода 1, если пик занятых соединений выше --max-checked-out или
+были таймауты пула.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from sqlalchemy import delete, update
+from config import settings
+from database.connection import async_session_maker, engine
+from database.models.auction import Auction, AuctionStatus
+from database.models.product import Product
+from database.models.user import User
+from database.pool_metrics import get_pool_metrics
+from services.user import get_or_create_user
+from tools.bid_load import PoolSampler, percentile
+from tools.fake_bot import RecordingSession, create_fake_bot, summarize
+
+# Telegram ID тестовых пользователей: продавец, затем модераторы подряд
+SELLER_TELEGRAM_ID = 980_000_000
+MODERATOR_TELEGRAM_BASE = SELLER_TELEGRAM_ID + 1
+PHOTOS_PER_PRODUCT = 3
+
+logger = logging.getLogger(__name__)
+
+
+async def _create_products(flows: int, moderators: int) -> list[int]:
+    """Создать продавца, модераторов и по товару с аукционом на каждую публикацию"""
+    async with async_session_maker() as session:
+        seller = await get_or_create_user(session, SELLER_TELEGRAM_ID, "pool_seller", "Seller")
+        for index in range(moderators):
+            await get_or_create_user(session, MODERATOR_TELEGRAM_BASE + index, f"pool_moderator_{index}", "Moderator")
+        await session.execute(
+            update(User)
+            .where(User.telegram_id.between(MODERATOR_TELEGRAM_BASE, MODERATOR_TELEGRAM_BASE + moderators - 1))
+            .values(is_moderator=True)
+        )
+
+        products = [
+            Product(
+                user_id=seller.id,
+                title=f"Проверка пула #{index}",
+                product_type="flowers",
+                description="Город: Ташкент\nСвежесть: сегодня",
+                photos=json.dumps([f"pool-photo-{index}-{i}" for i in range(PHOTOS_PER_PRODUCT)]),
+                price=100_000,
+                contact_info="@pool_seller"
+            )
+            for index in range(flows)
+        ]
+        session.add_all(products)
+        await session.flush()
+        session.add_all([
+            Auction(
+                product_id=product.id,
+                start_price=product.price,
+                current_price=product.price,
+                status=AuctionStatus.PENDING.value
+            )
+            for product in products
+        ])
+        await session.commit()
+        return [product.id for product in products]
+
+
+async def _cleanup(product_ids: list[int], moderators: int):
+    """Удалить всё, что создал тест"""
+    async with async_session_maker() as session:
+        await session.execute(delete(Auction).where(Auction.product_id.in_(product_ids)))
+        await session.execute(delete(Product).where(Product.id.in_(product_ids)))
+        await session.execute(
+            delete(User).where(User.telegram_id.between(SELLER_TELEGRAM_ID, MODERATOR_TELEGRAM_BASE + moderators - 1))
+        )
+        await session.commit()
+
+
+async def _flow(index: int, product_id: int, bot, durations: list[float]) -> int:
+    """Одна публикация со своей сессией, как у обработчика; возвращает число сбоев"""
+    from bot.handlers.moderation import send_moderation_notification
+    from services.channel import publish_auction_to_channel
+
+    started = time.perf_counter()
+    try:
+        async with async_session_maker() as session:
+            if index % 2 == 0:
+                await send_moderation_notification(bot, session, product_id)
+            else:
+                await publish_auction_to_channel(bot, session, product_id)
+    except Exception as e:
+        logger.error(f"Публикация {index}: {e!r}")
+        return 1
+    durations.append(time.perf_counter() - started)
+    return 0
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Прогнать сценарий и вернуть отчёт"""
+    product_ids = await _create_products(args.flows, args.moderators)
+    try:
+        if args.send_queue:
+            from services.telegram_queue import start_send_queue
+            start_send_queue()
+
+        bot = create_fake_bot(args.api_latency, args.api_jitter)
+        session: RecordingSession = bot.session
+
+        pool = get_pool_metrics()
+        pool_before = pool.snapshot()
+        sampler = PoolSampler()
+        durations: list[float] = []
+        flows = []
+
+        sampler.start()
+        started = time.perf_counter()
+        # Публикации приходят равномерно с частотой rate, а не все разом
+        for index, product_id in enumerate(product_ids):
+            flows.append(asyncio.create_task(_flow(index, product_id, bot, durations)))
+            await asyncio.sleep(1 / args.rate)
+        failures = sum(await asyncio.gather(*flows))
+        duration = time.perf_counter() - started
+        await sampler.stop()
+        pool_after = pool.snapshot()
+    finally:
+        if not args.keep:
+            await _cleanup(product_ids, args.moderators)
+
+    checkouts = pool_after["checkouts"] - pool_before["checkouts"]
+    wait_sum = pool_after["wait_sum"] - pool_before["wait_sum"]
+    durations.sort()
+
+    report = {
+        "config": {
+            "flows": args.flows,
+            "rate": args.rate,
+            "moderators": args.moderators,
+            "api_latency": args.api_latency,
+            "api_jitter": args.api_jitter,
+            "send_queue": args.send_queue,
+            "db_pool_size": settings.DB_POOL_SIZE,
+            "db_pool_max_overflow": settings.DB_POOL_MAX_OVERFLOW,
+            "max_checked_out": args.max_checked_out,
+        },
+        "duration": duration,
+        "flows": {
+            "completed": len(durations),
+            "failed": failures,
+        },
+        "flow_ms": {
+            "p50": percentile(durations, 0.50) * 1000,
+            "p95": percentile(durations, 0.95) * 1000,
+            "max": durations[-1] * 1000 if durations else 0.0,
+        },
+        "pool": {
+            "checkouts": checkouts,
+            "timeouts": pool_after["timeouts"] - pool_before["timeouts"],
+            "wait_avg_ms": wait_sum / checkouts * 1000 if checkouts else 0.0,
+            "wait_max_ms": pool_after["wait_max"] * 1000,
+            "peak_checked_out": sampler.peak_checked_out,
+            "mean_checked_out": sampler.mean_checked_out,
+            "peak_overflow": sampler.peak_overflow,
+        },
+        "telegram": summarize(session.reset()),
+    }
+    report["passed"] = (
+        failures == 0
+        and report["pool"]["timeouts"] == 0
+        and sampler.peak_checked_out <= args.max_checked_out
+    )
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Занятость пула БД при медленном Bot API")
+    parser.add_argument("--flows", type=int, default=200, help="Публикаций за прогон")
+    parser.add_argument("--rate", type=float, default=50.0, help="Новых публикаций в секунду")
+    parser.add_argument("--moderators", type=int, default=3, help="Модераторов, получающих карточку")
+    parser.add_argument("--api-latency", type=float, default=0.5, help="Задержка ответа Bot API (сек)")
+    parser.add_argument("--api-jitter", type=float, default=0.1, help="Случайная добавка к задержке, до (сек)")
+    parser.add_argument("--max-checked-out", type=int, default=5,
+                        help="Допустимый пик занятых соединений пула")
+    parser.add_argument("--send-queue", action="store_true",
+                        help="Отправлять через очередь с лимитами Telegram, как в боте")
+    parser.add_argument("--keep", action="store_true", help="Не удалять созданные данные")
+    parser.add_argument("--output", help="Файл для отчёта JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    async def run_and_dispose() -> dict:
+        try:
+            return await run(args)
+        finally:
+            await engine.dispose()
+
+    report = asyncio.run(run_and_dispose())
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())